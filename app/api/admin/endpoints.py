@@ -0,0 +1,49 @@
+# app/api/admin/endpoints.py
+import asyncio
+import hmac
+import os
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from app.core.config import ADMIN_TOKEN, PROFILE_MAX_SECONDS
+from app.core.logging import logger
+from app.core.profiler import ProfilerBusyError, sampling_profiler
+
+router = APIRouter()
+
+
+def require_admin(request: Request):
+    """
+    Check the `Authorization: Bearer <ADMIN_TOKEN>` header. Admin endpoints do
+    not exist (404) unless ADMIN_TOKEN is set.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(request: Request,
+                  seconds: float = Query(10, gt=0, description="Sampling duration"),
+                  include_idle: bool = Query(False, description="Keep samples of blocked threads")):
+    """
+    Sample the Python stacks of this worker for `seconds` and return them in
+    folded format (`frame;frame;... count` per line), ready for flamegraph.pl
+    or speedscope. With several workers, only the worker that answers is profiled.
+    """
+    require_admin(request)
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=422, detail=f"seconds must be at most {PROFILE_MAX_SECONDS:g}")
+
+    logger.info(f"Profiling worker {os.getpid()} for {seconds:g}s")
+    try:
+        # On a plain thread, not the inference pool that is being profiled
+        stacks = await asyncio.to_thread(sampling_profiler.profile, seconds, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return PlainTextResponse(stacks, headers={"X-Profiled-Pid": str(os.getpid())})
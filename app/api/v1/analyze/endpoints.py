@@ -0,0 +1,177 @@
+# app/api/v1/analyze/endpoints.py
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from app.api.v1.analyze.schemas import AnalyzeOptions, AnalyzeRequest
+from app.api.v1.uploads import image_upload_openapi, read_image_upload
+from app.services.model_manager import model_manager
+from app.services.inference_executor import inference_executor, ExecutorSaturatedError
+from app.services.inference_workers import InferenceWorkersUnavailableError
+from app.core.scheduling import DeadlineExceededError
+from app.services.inference_cache import inference_cache, image_digest, make_cache_key
+from app.utils.helper import decode_bytes_for_inference, decode_bytes_to_image, ImageDecodeError
+from app.services.cascade import run_cascade
+from app.services.tiling import run_tiled
+from app.api.v1.license_plate_detector.utils import (
+    LABEL_MAPPING as PLATE_LABEL_MAPPING, PLATE_CLASS_IDS, VEHICLE_CLASS_IDS)
+from app.api.v1.vehicle_damage_detection.utils import damage_class_ids
+from app.core.metrics import observe_detections, observe_image, stage
+from app.api.v1.responses import compact_precision, compact_response, wants_compact
+from app.utils.detections import arrays_to_compact, arrays_to_detections, scale_boxes, select_labels
+from app.core.logging import log_http_exception, logger
+
+router = APIRouter()
+
+# The plate model detects both plates and vehicles, so one pass serves both groups
+yolo_scheduler = model_manager.get_vehicle_licence_scheduler()
+vehicle_damage_scheduler = model_manager.get_vehicle_damage_scheduler()
+
+
+@router.post("/analyze", openapi_extra=image_upload_openapi(AnalyzeRequest, AnalyzeOptions))
+async def analyze(request: Request):
+    try:
+        # Read and validate the body before taking a slot, so that slow uploads do not hold one
+        image_bytes, req = await read_image_upload(
+            request, AnalyzeRequest, AnalyzeOptions)
+        if not (req.detect_plates or req.detect_vehicles or req.detect_damage):
+            raise HTTPException(
+                status_code=422, detail="At least one detection group must be selected")
+
+        with inference_executor.admit():
+            if req.mode == "cascade":
+                plate_arrays, damage_arrays = await _analyze_cascade(image_bytes, req)
+            elif req.mode == "tiled":
+                plate_arrays, damage_arrays = await _analyze_tiled(image_bytes, req)
+            else:
+                plate_arrays, damage_arrays = await _analyze_full(image_bytes, req)
+
+            compact = wants_compact(request)
+            precision = compact_precision(request) if compact else None
+
+            def render(group, arrays, class_ids, label_mapping):
+                arrays = select_labels(arrays, class_ids)
+                observe_detections(group, len(arrays[0]))
+                if compact:
+                    return arrays_to_compact(arrays, label_mapping, precision)
+                return arrays_to_detections(arrays, label_mapping)
+
+            response = {}
+            with stage("postprocess"):
+                if req.detect_plates:
+                    response["plates"] = render(
+                        "plates", plate_arrays, PLATE_CLASS_IDS, PLATE_LABEL_MAPPING)
+                if req.detect_vehicles:
+                    response["vehicles"] = render(
+                        "vehicles", plate_arrays, VEHICLE_CLASS_IDS, PLATE_LABEL_MAPPING)
+                if req.detect_damage:
+                    damage_labels = model_manager.get_vehicle_damage_labels()
+                    response["damage"] = render(
+                        "damage", damage_arrays, damage_class_ids(damage_labels), damage_labels)
+
+            if compact:
+                return compact_response(response)
+            return response
+
+    except (ExecutorSaturatedError, InferenceWorkersUnavailableError) as busy:
+        raise HTTPException(
+            status_code=503, detail=str(busy),
+            headers={"Retry-After": str(busy.retry_after)})
+
+    except DeadlineExceededError as expired:
+        raise HTTPException(status_code=504, detail=str(expired))
+
+    except ImageDecodeError as invalid:
+        raise HTTPException(status_code=422, detail=str(invalid))
+
+    except RequestValidationError:
+        raise
+
+    except HTTPException as http_exception:
+        log_http_exception(http_exception)
+        raise http_exception
+
+    except Exception as e:
+        logger.exception(
+            f"Error occurred during image analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _analyze_full(image_bytes: bytes, req: AnalyzeOptions):
+    """
+    Run the selected models on the whole image, sharing one decode and the
+    inference cache with the single-model endpoints.
+    """
+    digest = await inference_executor.run(image_digest, image_bytes)
+
+    # Decode at most once, and only if some model misses the cache
+    decoded = None
+
+    async def decode():
+        with stage("decode"):
+            image, scale = await inference_executor.run(decode_bytes_for_inference, image_bytes)
+        observe_image(image, scale)
+        return image, scale
+
+    def decode_once():
+        nonlocal decoded
+        if decoded is None:
+            decoded = asyncio.ensure_future(decode())
+        return decoded
+
+    async def run_model(scheduler):
+        async def predict():
+            image, scale = await decode_once()
+            with stage("inference"):
+                arrays = await scheduler.submit(image)
+            return scale_boxes(arrays, scale)
+
+        cache_key = make_cache_key(digest, scheduler.model_id)
+        return await inference_cache.get_or_compute(cache_key, predict)
+
+    # Run the selected models concurrently
+    run_plate_model = req.detect_plates or req.detect_vehicles
+    return await asyncio.gather(
+        run_model(yolo_scheduler) if run_plate_model else _skipped(),
+        run_model(vehicle_damage_scheduler) if req.detect_damage else _skipped(),
+    )
+
+
+async def _analyze_cascade(image_bytes: bytes, req: AnalyzeOptions):
+    """
+    Find vehicles on a downscaled image, then plates and damage on
+    full-resolution vehicle crops.
+    """
+    # The crops need the full resolution, so no reduced-scale decode here
+    image = await _decode_full(image_bytes)
+    damage_labels = await model_manager.load_labels("vehicle_damage") if req.detect_damage else None
+    with stage("inference"):
+        return await run_cascade(
+            image, yolo_scheduler,
+            plate_class_ids=PLATE_CLASS_IDS if req.detect_plates else None,
+            vehicle_class_ids=VEHICLE_CLASS_IDS,
+            damage_scheduler=vehicle_damage_scheduler if req.detect_damage else None,
+            damage_class_ids=damage_class_ids(damage_labels) if req.detect_damage else None)
+
+
+async def _analyze_tiled(image_bytes: bytes, req: AnalyzeOptions):
+    """
+    Run the selected models on overlapping full-resolution tiles.
+    """
+    image = await _decode_full(image_bytes)
+    run_plate_model = req.detect_plates or req.detect_vehicles
+    with stage("inference"):
+        return await asyncio.gather(
+            run_tiled(image, yolo_scheduler) if run_plate_model else _skipped(),
+            run_tiled(image, vehicle_damage_scheduler) if req.detect_damage else _skipped(),
+        )
+
+
+async def _decode_full(image_bytes: bytes):
+    with stage("decode"):
+        image, _, _ = await inference_executor.run(decode_bytes_to_image, image_bytes)
+    observe_image(image, (1.0, 1.0))
+    return image
+
+
+async def _skipped():
+    return None
@@ -0,0 +1,24 @@
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class AnalyzeOptions(BaseModel):
+    origin: str = Field(..., description="The origin source of the API call")
+    deadline_ms: Optional[int] = Field(
+        None, ge=1, description="Deadline in milliseconds after the request arrives. Images the model "
+                                "has not run by then are dropped and the request fails with 504")
+    detect_plates: bool = Field(
+        True, description="Run license plate detection")
+    detect_vehicles: bool = Field(
+        True, description="Run vehicle detection")
+    detect_damage: bool = Field(
+        True, description="Run vehicle damage detection")
+    mode: Literal["full", "cascade", "tiled"] = Field(
+        "full", description="'full': every model on the whole image. 'cascade': vehicles on a "
+                            "downscaled image, then plates and damage on full-resolution vehicle "
+                            "crops. 'tiled': every model on overlapping full-resolution tiles, "
+                            "for very large images")
+
+
+class AnalyzeRequest(AnalyzeOptions):
+    image: str = Field(..., description="Base64 encoded image")
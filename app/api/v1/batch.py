@@ -0,0 +1,180 @@
+# app/api/v1/batch.py
+import asyncio
+from contextlib import ExitStack
+from typing import Awaitable, Callable, Optional, Type
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError
+from starlette.responses import StreamingResponse
+import orjson
+from app.api.v1.responses import compact_precision, compact_response, wants_compact
+from app.core.logging import logger
+from app.core.metrics import observe_image_bytes, stage
+from app.core.scheduling import DeadlineExceededError, apply_request_options
+from app.services.inference_executor import inference_executor, ExecutorSaturatedError
+from app.services.inference_workers import InferenceWorkersUnavailableError
+from app.utils.helper import decode_base64_to_bytes, ImageDecodeError
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Detect one image: takes the encoded image and the compact precision (None
+# for the default format), returns the response content or raises HTTPException
+DetectFunction = Callable[[bytes, Optional[int]], Awaitable[dict]]
+
+
+class BatchImage(BaseModel):
+    id: str = Field(..., description="Client-supplied identifier, echoed in the result")
+    image: str = Field(..., description="Base64 encoded image")
+
+
+async def read_batch_request(request: Request, batch_request_model: Type[BaseModel]) -> BaseModel:
+    """
+    Parse and validate a JSON batch request (options plus an `images` list).
+    """
+    content_type = request.headers.get("content-type", "application/json").lower()
+    if not content_type.startswith("application/json"):
+        raise HTTPException(
+            status_code=415, detail=f"Unsupported content type: {content_type}")
+
+    try:
+        req = batch_request_model.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    ids = [item.id for item in req.images]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=422, detail="Image ids must be unique within a batch")
+    apply_request_options(req)
+    return req
+
+
+async def run_batch(request: Request, batch_request_model: Type[BaseModel],
+                    detect: DetectFunction, task: str):
+    """
+    Run `detect` on every image of a batch request.
+
+    All images are decoded in parallel on the inference executor and submitted
+    to the batching scheduler together, so they run as real model batches. The
+    batch takes one in-flight slot per image. Results are returned in request
+    order as `{"results": [...]}`, or with `stream: true` as one NDJSON line
+    per image in completion order.
+    Args:
+        request (Request): The incoming request.
+        batch_request_model: The batch request schema.
+        detect: Per-image detection, as used by the single-image endpoint.
+        task (str): Human readable name of the detection, for logging.
+    """
+    try:
+        req = await read_batch_request(request, batch_request_model)
+        precision = compact_precision(request) if wants_compact(request) else None
+        weight = len(req.images)
+
+        if req.stream:
+            # Take the slots of the whole stream before answering 200, so that
+            # a busy server rejects it with 503 instead of failing lines
+            slots = ExitStack()
+            slots.enter_context(inference_executor.admit(weight))
+            return AdmittedStreamingResponse(
+                _stream_results(req.images, detect, precision, task), slots,
+                media_type=NDJSON_MEDIA_TYPE)
+
+        with inference_executor.admit(weight):
+            results = await asyncio.gather(
+                *(_detect_item(item, detect, precision, task) for item in req.images))
+
+        content = {"results": results}
+        return compact_response(content) if precision is not None else content
+
+    except (ExecutorSaturatedError, InferenceWorkersUnavailableError) as busy:
+        raise HTTPException(
+            status_code=503, detail=str(busy),
+            headers={"Retry-After": str(busy.retry_after)})
+
+    except (RequestValidationError, HTTPException):
+        raise
+
+    except Exception as e:
+        logger.exception(f"Error occurred during batch {task}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _detect_item(item: BatchImage, detect: DetectFunction,
+                       precision: Optional[int], task: str) -> dict:
+    # Failures are reported per image, so one bad photo does not fail the batch
+    try:
+        with stage("read"):
+            image_bytes = await inference_executor.run(decode_base64_to_bytes, item.image)
+        observe_image_bytes(len(image_bytes))
+        return {"id": item.id, "status": 200, **await detect(image_bytes, precision)}
+    except HTTPException as e:
+        return {"id": item.id, "status": e.status_code, "detail": e.detail}
+    except DeadlineExceededError as e:
+        return {"id": item.id, "status": 504, "detail": str(e)}
+    except InferenceWorkersUnavailableError as e:
+        return {"id": item.id, "status": 503, "detail": str(e)}
+    except ImageDecodeError as e:
+        return {"id": item.id, "status": 422, "detail": str(e)}
+    except Exception as e:
+        logger.exception(f"Error occurred during {task} of image {item.id}: {e}")
+        return {"id": item.id, "status": 500, "detail": str(e)}
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streaming response that holds in-flight slots (`slots`, an ExitStack)
+    until it is done, including when the client disconnects before the
+    body is read.
+    """
+
+    def __init__(self, content, slots: ExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slots = slots
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slots.close()
+
+
+async def _stream_results(images: list, detect: DetectFunction, precision: Optional[int], task: str):
+    tasks = [asyncio.ensure_future(_detect_item(item, detect, precision, task))
+             for item in images]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield _ndjson_line(await next_result)
+    finally:
+        # Client went away: stop work that nobody will read
+        for pending in tasks:
+            pending.cancel()
+
+
+def _ndjson_line(content: dict) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+
+def batch_openapi(batch_request_model: Type[BaseModel]) -> dict:
+    """
+    OpenAPI description of the request body accepted by `run_batch`.
+    """
+    schema = batch_request_model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": _inline_refs(schema, schema.pop("$defs", {}))},
+            },
+        }
+    }
+
+
+def _inline_refs(schema, definitions: dict):
+    # Local "#/$defs/..." references do not resolve inside the OpenAPI document
+    if isinstance(schema, dict):
+        ref = schema.get("$ref", "")
+        if ref.startswith("#/$defs/"):
+            return _inline_refs(definitions[ref.rsplit("/", 1)[-1]], definitions)
+        return {key: _inline_refs(value, definitions) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [_inline_refs(value, definitions) for value in schema]
+    return schema
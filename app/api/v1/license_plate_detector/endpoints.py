@@ -1,42 +1,102 @@
 # app/api/v1/license_plate_detector/endpoint.py
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Request
-from app.api.v1.license_plate_detector.schemas import LicensePlateDetectorRequest
+from fastapi.exceptions import RequestValidationError
+from app.api.v1.license_plate_detector.schemas import (
+    LicensePlateDetectorBatchRequest, LicensePlateDetectorOptions, LicensePlateDetectorRequest)
+from app.api.v1.batch import batch_openapi, run_batch
+from app.api.v1.uploads import image_upload_openapi, read_image_upload
 from app.services.model_manager import model_manager
-from app.utils.helper import decode_base64_to_image
-from app.api.v1.license_plate_detector.utils import process_image_with_model
+from app.services.inference_executor import inference_executor, ExecutorSaturatedError
+from app.services.inference_workers import InferenceWorkersUnavailableError
+from app.core.scheduling import DeadlineExceededError
+from app.services.inference_cache import inference_cache, image_digest, make_cache_key
+from app.utils.helper import decode_bytes_for_inference, ImageDecodeError
+from app.utils.detections import scale_boxes, select_labels
+from app.api.v1.license_plate_detector.utils import PLATE_CLASS_IDS, format_result, format_result_compact
+from app.core.metrics import observe_detections, observe_image, stage
+from app.api.v1.responses import compact_precision, compact_response, wants_compact
 import time
-from app.core.logging import logger
+from app.core.logging import log_http_exception, logger
 
 router = APIRouter()
 
-# Get the YOLO model from the ModelManager
-yolo_model = model_manager.get_vehicle_licence_model()
+# Get the batching scheduler for the YOLO model from the ModelManager
+yolo_scheduler = model_manager.get_vehicle_licence_scheduler()
 
 
-@router.post("/license-plate-detector")
-async def license_plate_detector(req: LicensePlateDetectorRequest, request: Request):
+@router.post("/license-plate-detector", openapi_extra=image_upload_openapi(LicensePlateDetectorRequest, LicensePlateDetectorOptions))
+async def license_plate_detector(request: Request):
     try:
-        if "," in req.image:
-            req.image = req.image.split(",")[1]
+        # Read the body before taking a slot, so that slow uploads do not hold one
+        image_bytes, req = await read_image_upload(
+            request, LicensePlateDetectorRequest, LicensePlateDetectorOptions)
 
-        image, _, _ = decode_base64_to_image(req.image)
-        detections = process_image_with_model(image, yolo_model)
+        precision = compact_precision(request) if wants_compact(request) else None
+        with inference_executor.admit():
+            content = await _detect(image_bytes, precision)
+        return compact_response(content) if precision is not None else content
 
-        # Filter only for license plate
-        plate_detections = [
-            d for d in detections["detections"] if d["label"] == "Vehicle Plate"]
+    except (ExecutorSaturatedError, InferenceWorkersUnavailableError) as busy:
+        raise HTTPException(
+            status_code=503, detail=str(busy),
+            headers={"Retry-After": str(busy.retry_after)})
 
-        if not plate_detections:
-            raise HTTPException(
-                status_code=404, detail="License plate not found")
+    except DeadlineExceededError as expired:
+        raise HTTPException(status_code=504, detail=str(expired))
 
-        return {"detections": plate_detections}
+    except ImageDecodeError as invalid:
+        raise HTTPException(status_code=422, detail=str(invalid))
+
+    except RequestValidationError:
+        raise
 
     except HTTPException as http_exception:
-        logger.error(f"HTTPException: {http_exception.detail}", exc_info=True)
+        log_http_exception(http_exception)
         raise http_exception
 
     except Exception as e:
-        logger.error(
-            f"Error occurred during license plate detection: {e}", exc_info=True)
+        logger.exception(
+            f"Error occurred during license plate detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/license-plate-detector/batch", openapi_extra=batch_openapi(LicensePlateDetectorBatchRequest))
+async def license_plate_detector_batch(request: Request):
+    return await run_batch(request, LicensePlateDetectorBatchRequest, _detect, "license plate detection")
+
+
+async def _detect(image_bytes: bytes, precision: Optional[int]) -> dict:
+    """
+    Detect on one encoded image and return the response content (compact
+    when `precision` is given). Shared by the single image and batch endpoints.
+    """
+    # Identical images are served from the cache; concurrent duplicates share one inference
+    digest = await inference_executor.run(image_digest, image_bytes)
+    cache_key = make_cache_key(digest, yolo_scheduler.model_id)
+    arrays = await inference_cache.get_or_compute(
+        cache_key, lambda: _predict(image_bytes))
+
+    with stage("postprocess"):
+        # Filter only for license plate
+        plate_arrays = select_labels(arrays, PLATE_CLASS_IDS)
+        observe_detections("plates", len(plate_arrays[0]))
+
+        if not len(plate_arrays[0]):
+            raise HTTPException(
+                status_code=404, detail="License plate not found")
+
+        if precision is not None:
+            return {"detections": format_result_compact(
+                plate_arrays, precision)}
+
+        return format_result(plate_arrays)
+
+
+async def _predict(image_bytes: bytes):
+    with stage("decode"):
+        image, scale = await inference_executor.run(decode_bytes_for_inference, image_bytes)
+    observe_image(image, scale)
+    with stage("inference"):
+        arrays = await yolo_scheduler.submit(image)
+    return scale_boxes(arrays, scale)
@@ -1,6 +1,23 @@
+from typing import List, Optional
 from pydantic import BaseModel, Field
+from app.api.v1.batch import BatchImage
+from app.core.config import BATCH_REQUEST_MAX_IMAGES
 
 
-class LicensePlateDetectorRequest(BaseModel):
-    image: str = Field(..., description="Base64 encoded image")
+class LicensePlateDetectorOptions(BaseModel):
     origin: str = Field(..., description="The origin source of the API call")
+    deadline_ms: Optional[int] = Field(
+        None, ge=1, description="Deadline in milliseconds after the request arrives. Images the model "
+                                "has not run by then are dropped and the request fails with 504")
+
+
+class LicensePlateDetectorRequest(LicensePlateDetectorOptions):
+    image: str = Field(..., description="Base64 encoded image")
+
+
+class LicensePlateDetectorBatchRequest(LicensePlateDetectorOptions):
+    images: List[BatchImage] = Field(
+        ..., min_length=1, max_length=BATCH_REQUEST_MAX_IMAGES,
+        description="Images to process, each with a client-supplied id")
+    stream: bool = Field(
+        False, description="Stream one NDJSON line per image as soon as it is ready")
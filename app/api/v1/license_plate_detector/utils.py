@@ -1,5 +1,11 @@
 # app/api/v1/license_plate_detector/utils.py
 import numpy as np
+from app.utils.detections import DetectionArrays, arrays_to_compact, arrays_to_detections, result_to_arrays
+
+# Define label mapping
+LABEL_MAPPING = {0: "Vehicle Plate", 1: "Vehicle"}
+PLATE_CLASS_IDS = (0,)
+VEHICLE_CLASS_IDS = (1,)
 
 
 def process_image_with_model(image: np.ndarray, model) -> dict:
@@ -12,38 +18,31 @@ def process_image_with_model(image: np.ndarray, model) -> dict:
     dict: A dictionary containing the detections with labels, confidences, and bounding boxes.
     """
 
-    # Define label mapping
-    label_mapping = {0: "Vehicle Plate", 1: "Vehicle"}
-
     # Run inference
     results = model.predict(image)
 
-    # Extract bounding box coordinates, confidences, and labels
-    boxes = results[0].boxes.xyxy
-    confs = results[0].boxes.conf
-    labels = results[0].boxes.cls
-
-    # Move the results to CPU if they are on GPU
-    if boxes.is_cuda:
-        boxes = boxes.cpu()
-    if confs.is_cuda:
-        confs = confs.cpu()
-    if labels.is_cuda:
-        labels = labels.cpu()
-
-    # Convert to numpy arrays
-    boxes = boxes.numpy()
-    confs = confs.numpy()
-    labels = labels.numpy()
-
-    # Format bounding boxes into a JSON-compatible format
-    detections = [
-        {
-            "label": label_mapping.get(int(labels[i]), "Unknown"),
-            "confidence": float(confs[i]),
-            "box": boxes[i].tolist()  # Convert to list for JSON serialization
-        }
-        for i in range(len(boxes))
-    ]
-
-    return {"detections": detections}
+    return format_result(result_to_arrays(results[0]))
+
+
+def format_result(arrays: DetectionArrays) -> dict:
+    """
+    Format the detection arrays of one image into the detections returned by the API.
+    Args:
+    arrays (DetectionArrays): Boxes, confidences and class ids for one image.
+    Returns:
+    dict: A dictionary containing the detections with labels, confidences, and bounding boxes.
+    """
+
+    return {"detections": arrays_to_detections(arrays, LABEL_MAPPING)}
+
+
+def format_result_compact(arrays: DetectionArrays, precision: int) -> dict:
+    """
+    Format the detection arrays of one image as parallel label/confidence/box arrays.
+    Args:
+    arrays (DetectionArrays): Boxes, confidences and class ids for one image.
+    precision (int): Number of decimals kept for box coordinates.
+    Returns:
+    dict: The compact detections.
+    """
+    return arrays_to_compact(arrays, LABEL_MAPPING, precision)
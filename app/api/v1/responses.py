@@ -0,0 +1,62 @@
+# app/api/v1/responses.py
+from typing import Any
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+import orjson
+from app.core.metrics import stage
+
+COMPACT_MEDIA_TYPE = "application/vnd.vehicle-vision.compact+json"
+DEFAULT_COMPACT_PRECISION = 2
+MAX_COMPACT_PRECISION = 6
+
+
+class CompactJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, serializing NumPy arrays natively.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class TimedJSONResponse(JSONResponse):
+    """
+    The default JSON response, with its rendering timed as the "serialize" stage.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            return super().render(content)
+
+
+def wants_compact(request: Request) -> bool:
+    """
+    Clients opt in to the compact format with `?format=compact` or by sending
+    `Accept: application/vnd.vehicle-vision.compact+json`.
+    """
+    if request.query_params.get("format") == "compact":
+        return True
+    return COMPACT_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def compact_precision(request: Request) -> int:
+    """
+    Number of decimals for box coordinates, from `?precision=` (default 2).
+    """
+    value = request.query_params.get("precision")
+    if value is None:
+        return DEFAULT_COMPACT_PRECISION
+    try:
+        precision = int(value)
+    except ValueError:
+        precision = -1
+    if not 0 <= precision <= MAX_COMPACT_PRECISION:
+        raise HTTPException(
+            status_code=422,
+            detail=f"precision must be an integer between 0 and {MAX_COMPACT_PRECISION}")
+    return precision
+
+
+def compact_response(content: dict) -> CompactJSONResponse:
+    return CompactJSONResponse(content, media_type=COMPACT_MEDIA_TYPE)
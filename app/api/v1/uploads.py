@@ -0,0 +1,186 @@
+# app/api/v1/uploads.py
+import os
+import shutil
+import tempfile
+from typing import Tuple, Type
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from app.core.config import VIDEO_MAX_UPLOAD_MB
+from app.core.metrics import observe_image_bytes, stage
+from app.core.scheduling import apply_request_options
+from app.services.inference_executor import inference_executor
+from app.utils.helper import decode_base64_to_bytes, ImageDecodeError
+
+RAW_IMAGE_CONTENT_TYPES = ("application/octet-stream", "image/")
+RAW_VIDEO_CONTENT_TYPES = ("application/octet-stream", "video/")
+
+
+async def read_image_upload(request: Request, request_model: Type[BaseModel],
+                            options_model: Type[BaseModel]) -> Tuple[bytes, BaseModel]:
+    """
+    Read the image and request options from any supported upload format.
+
+    - application/json: the existing contract, a `request_model` body with a
+      base64 encoded `image` field.
+    - application/octet-stream (or image/*): the raw image bytes as the body,
+      options passed as query parameters.
+    - multipart/form-data: an `image` file part, options passed as form fields
+      or query parameters.
+
+    Args:
+        request (Request): The incoming request.
+        request_model: The JSON request schema (options plus `image`).
+        options_model: The request schema without the `image` field.
+    Returns:
+        Tuple[bytes, BaseModel]: The encoded image bytes and the parsed options.
+    """
+    with stage("read"):
+        image_bytes, req = await _read_image_upload(request, request_model, options_model)
+    observe_image_bytes(len(image_bytes))
+    # Priority of the origin and deadline field, for the batching scheduler
+    apply_request_options(req)
+    return image_bytes, req
+
+
+async def _read_image_upload(request: Request, request_model: Type[BaseModel],
+                             options_model: Type[BaseModel]) -> Tuple[bytes, BaseModel]:
+    content_type = request.headers.get("content-type", "application/json").lower()
+
+    try:
+        if content_type.startswith("application/json"):
+            # Validate straight from the raw body, without an intermediate dict
+            req = request_model.model_validate_json(await request.body())
+            image_bytes = await inference_executor.run(decode_base64_to_bytes, req.image)
+            return image_bytes, req
+
+        if content_type.startswith(RAW_IMAGE_CONTENT_TYPES):
+            options = options_model.model_validate(dict(request.query_params))
+            return await request.body(), options
+
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("image")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(
+                    status_code=422, detail="Multipart upload must contain an 'image' file")
+
+            fields = dict(request.query_params)
+            fields.update(
+                (key, value) for key, value in form.items() if isinstance(value, str))
+            options = options_model.model_validate(fields)
+            return await upload.read(), options
+
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    raise HTTPException(
+        status_code=415, detail=f"Unsupported content type: {content_type}")
+
+
+async def read_video_upload(request: Request, options_model: Type[BaseModel]) -> Tuple[str, BaseModel]:
+    """
+    Spool an uploaded video to a temporary file, so that it can be decoded
+    frame by frame instead of being held in memory.
+
+    - application/octet-stream (or video/*): the raw video as the body,
+      options passed as query parameters.
+    - multipart/form-data: a `video` file part, options passed as form fields
+      or query parameters.
+
+    The caller must delete the returned file.
+    Returns:
+        Tuple[str, BaseModel]: The temporary file path and the parsed options.
+    """
+    content_type = request.headers.get("content-type", "").lower()
+    max_bytes = VIDEO_MAX_UPLOAD_MB * 1024 * 1024
+    handle, path = tempfile.mkstemp(prefix="video_", suffix=".upload")
+
+    try:
+        with os.fdopen(handle, "wb") as spool:
+            if content_type.startswith(RAW_VIDEO_CONTENT_TYPES):
+                fields = dict(request.query_params)
+                size = 0
+                async for chunk in request.stream():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise HTTPException(
+                            status_code=413, detail=f"Video larger than {VIDEO_MAX_UPLOAD_MB:g} MB")
+                    spool.write(chunk)
+
+            elif content_type.startswith("multipart/form-data"):
+                form = await request.form()
+                upload = form.get("video")
+                if upload is None or isinstance(upload, str):
+                    raise HTTPException(
+                        status_code=422, detail="Multipart upload must contain a 'video' file")
+                if upload.size is not None and upload.size > max_bytes:
+                    raise HTTPException(
+                        status_code=413, detail=f"Video larger than {VIDEO_MAX_UPLOAD_MB:g} MB")
+
+                fields = dict(request.query_params)
+                fields.update(
+                    (key, value) for key, value in form.items() if isinstance(value, str))
+                await inference_executor.run(shutil.copyfileobj, upload.file, spool)
+
+            else:
+                raise HTTPException(
+                    status_code=415, detail=f"Unsupported content type: {content_type}")
+
+        try:
+            options = options_model.model_validate(fields)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        apply_request_options(options)
+        return path, options
+
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def image_upload_openapi(request_model: Type[BaseModel], options_model: Type[BaseModel]) -> dict:
+    """
+    OpenAPI description of the request body accepted by `read_image_upload`.
+    """
+    multipart_schema = options_model.model_json_schema()
+    multipart_schema["properties"] = {
+        "image": {"type": "string", "format": "binary"},
+        **multipart_schema.get("properties", {}),
+    }
+    multipart_schema["required"] = ["image", *multipart_schema.get("required", [])]
+
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": request_model.model_json_schema()},
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+                "multipart/form-data": {"schema": multipart_schema},
+            },
+        }
+    }
+
+
+def video_upload_openapi(options_model: Type[BaseModel]) -> dict:
+    """
+    OpenAPI description of the request body accepted by `read_video_upload`.
+    """
+    multipart_schema = options_model.model_json_schema()
+    multipart_schema["properties"] = {
+        "video": {"type": "string", "format": "binary"},
+        **multipart_schema.get("properties", {}),
+    }
+    multipart_schema["required"] = ["video", *multipart_schema.get("required", [])]
+
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+                "multipart/form-data": {"schema": multipart_schema},
+            },
+        }
+    }
@@ -1,45 +1,102 @@
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Request
-from app.api.v1.vehicle_damage_detection.schemas import VehicleDamageDetectorRequest
+from fastapi.exceptions import RequestValidationError
+from app.api.v1.vehicle_damage_detection.schemas import (
+    VehicleDamageDetectorBatchRequest, VehicleDamageDetectorOptions, VehicleDamageDetectorRequest)
+from app.api.v1.batch import batch_openapi, run_batch
+from app.api.v1.uploads import image_upload_openapi, read_image_upload
 from app.services.model_manager import model_manager
-from app.utils.helper import decode_base64_to_image
-from app.core.logging import logger
-from app.api.v1.vehicle_damage_detection.utils import process_image_with_model
+from app.services.inference_executor import inference_executor, ExecutorSaturatedError
+from app.services.inference_workers import InferenceWorkersUnavailableError
+from app.core.scheduling import DeadlineExceededError
+from app.services.inference_cache import inference_cache, image_digest, make_cache_key
+from app.utils.helper import decode_bytes_for_inference, ImageDecodeError
+from app.utils.detections import scale_boxes, select_labels
+from app.core.logging import log_http_exception, logger
+from app.api.v1.vehicle_damage_detection.utils import damage_class_ids, format_result, format_result_compact
+from app.core.metrics import observe_detections, observe_image, stage
+from app.api.v1.responses import compact_precision, compact_response, wants_compact
 
 
 router = APIRouter()
 
-# Get the YOLO model from the ModelManager for vehicle damage detection
-vehicle_damage_model = model_manager.get_vehicle_damage_model()
+# Get the batching scheduler for the vehicle damage model from the ModelManager
+vehicle_damage_scheduler = model_manager.get_vehicle_damage_scheduler()
 
 
-@router.post("/vehicle-damage-detector")
-async def vehicle_damage_detector(req: VehicleDamageDetectorRequest, request: Request):
+@router.post("/vehicle-damage-detector", openapi_extra=image_upload_openapi(VehicleDamageDetectorRequest, VehicleDamageDetectorOptions))
+async def vehicle_damage_detector(request: Request):
     try:
-        if "," in req.image:
-            req.image = req.image.split(",")[1]
+        # Read the body before taking a slot, so that slow uploads do not hold one
+        image_bytes, req = await read_image_upload(
+            request, VehicleDamageDetectorRequest, VehicleDamageDetectorOptions)
 
-        # Decode the base64 image to an image format
-        image, _, _ = decode_base64_to_image(req.image)
+        precision = compact_precision(request) if wants_compact(request) else None
+        with inference_executor.admit():
+            content = await _detect(image_bytes, precision)
+        return compact_response(content) if precision is not None else content
 
-        # Use the utility function to process the image and get results from the model
-        detections = process_image_with_model(image, vehicle_damage_model)
+    except (ExecutorSaturatedError, InferenceWorkersUnavailableError) as busy:
+        raise HTTPException(
+            status_code=503, detail=str(busy),
+            headers={"Retry-After": str(busy.retry_after)})
 
-        # Filter detections for vehicle damage parts (e.g., "damaged door", "damaged bumper")
-        damage_detections = [
-            d for d in detections["detections"] if "damaged" in d["label"].lower()]
+    except DeadlineExceededError as expired:
+        raise HTTPException(status_code=504, detail=str(expired))
 
-        if not damage_detections:
-            raise HTTPException(
-                status_code=404, detail="No vehicle damage detected"
-            )
+    except ImageDecodeError as invalid:
+        raise HTTPException(status_code=422, detail=str(invalid))
 
-        return {"detections": damage_detections}
+    except RequestValidationError:
+        raise
 
     except HTTPException as http_exception:
-        logger.error(f"HTTPException: {http_exception.detail}", exc_info=True)
+        log_http_exception(http_exception)
         raise http_exception
 
     except Exception as e:
-        logger.error(
-            f"Error occurred during vehicle damage detection: {e}", exc_info=True)
+        logger.exception(
+            f"Error occurred during vehicle damage detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/vehicle-damage-detector/batch", openapi_extra=batch_openapi(VehicleDamageDetectorBatchRequest))
+async def vehicle_damage_detector_batch(request: Request):
+    return await run_batch(request, VehicleDamageDetectorBatchRequest, _detect, "vehicle damage detection")
+
+
+async def _detect(image_bytes: bytes, precision: Optional[int]) -> dict:
+    """
+    Run detection for one encoded image and return the response content.
+    """
+    # Identical images are served from the cache; concurrent duplicates share one inference
+    digest = await inference_executor.run(image_digest, image_bytes)
+    cache_key = make_cache_key(digest, vehicle_damage_scheduler.model_id)
+    arrays = await inference_cache.get_or_compute(
+        cache_key, lambda: _predict(image_bytes))
+    label_mapping = model_manager.get_vehicle_damage_labels()
+
+    with stage("postprocess"):
+        # Filter detections for vehicle damage parts (e.g., "damaged door", "damaged bumper")
+        damage_arrays = select_labels(arrays, damage_class_ids(label_mapping))
+        observe_detections("damage", len(damage_arrays[0]))
+
+        if not len(damage_arrays[0]):
+            raise HTTPException(
+                status_code=404, detail="No vehicle damage detected"
+            )
+
+        if precision is not None:
+            return {"detections": format_result_compact(
+                damage_arrays, label_mapping, precision)}
+
+        return format_result(damage_arrays, label_mapping)
+
+
+async def _predict(image_bytes: bytes):
+    with stage("decode"):
+        image, scale = await inference_executor.run(decode_bytes_for_inference, image_bytes)
+    observe_image(image, scale)
+    with stage("inference"):
+        arrays = await vehicle_damage_scheduler.submit(image)
+    return scale_boxes(arrays, scale)
@@ -1,5 +1,6 @@
 # app/utils/model_utils.py
 import numpy as np
+from app.utils.detections import DetectionArrays, arrays_to_compact, arrays_to_detections, result_to_arrays
 
 
 def process_image_with_model(image: np.ndarray, model) -> dict:
@@ -14,36 +15,37 @@ def process_image_with_model(image: np.ndarray, model) -> dict:
     # Run inference
     results = model.predict(image)
 
-    # Extract bounding box coordinates, confidences, and labels
-    boxes = results[0].boxes.xyxy
-    confs = results[0].boxes.conf
-    labels = results[0].boxes.cls
+    # Use model's built-in class names
+    return format_result(result_to_arrays(results[0]), model.names)
+
 
-    # Move the results to CPU if they are on GPU
-    if boxes.is_cuda:
-        boxes = boxes.cpu()
-    if confs.is_cuda:
-        confs = confs.cpu()
-    if labels.is_cuda:
-        labels = labels.cpu()
+def format_result(arrays: DetectionArrays, label_mapping: dict) -> dict:
+    """
+    Format the detection arrays of one image into the detections returned by the API.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids for one image.
+        label_mapping (dict): The model's class names, e.g. {0: 'damaged door', 1: 'damaged bumper', 2: 'damaged hood'}
+    Returns:
+        dict: A dictionary containing the detections with labels, confidences, and bounding boxes.
+    """
+    return {"detections": arrays_to_detections(arrays, label_mapping)}
 
-    # Convert to numpy arrays
-    boxes = boxes.numpy()
-    confs = confs.numpy()
-    labels = labels.numpy()
 
-    # Use model's built-in class names
-    # This gives a dict like {0: 'damaged door', 1: 'damaged hood', ...}
-    label_mapping = model.names
-
-    # Format bounding boxes into a JSON-compatible format
-    detections = [
-        {
-            "label": label_mapping.get(int(labels[i]), "Unknown"),
-            "confidence": float(confs[i]),
-            "box": boxes[i].tolist()
-        }
-        for i in range(len(boxes))
-    ]
-
-    return {"detections": detections}
+def format_result_compact(arrays: DetectionArrays, label_mapping: dict, precision: int) -> dict:
+    """
+    Format the detection arrays of one image as parallel label/confidence/box arrays.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids for one image.
+        label_mapping (dict): The model's class names.
+        precision (int): Number of decimals kept for box coordinates.
+    Returns:
+        dict: The compact detections.
+    """
+    return arrays_to_compact(arrays, label_mapping, precision)
+
+
+def damage_class_ids(label_mapping: dict) -> tuple:
+    """
+    Class ids of the vehicle damage parts (e.g., "damaged door", "damaged bumper").
+    """
+    return tuple(i for i, name in label_mapping.items() if "damaged" in name.lower())
@@ -0,0 +1,114 @@
+# app/api/v1/video/endpoints.py
+import asyncio
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from app.api.v1.video.schemas import VideoAnalyzeOptions
+from app.api.v1.uploads import read_video_upload, video_upload_openapi
+from app.services.model_manager import model_manager
+from app.services.inference_executor import inference_executor, ExecutorSaturatedError
+from app.services.inference_workers import InferenceWorkersUnavailableError
+from app.core.scheduling import DeadlineExceededError
+from app.services.tracking import IoUTracker, tracks_to_results
+from app.services.video import VideoFrameSampler
+from app.api.v1.license_plate_detector.utils import (
+    LABEL_MAPPING as PLATE_LABEL_MAPPING, PLATE_CLASS_IDS, VEHICLE_CLASS_IDS)
+from app.api.v1.vehicle_damage_detection.utils import damage_class_ids
+from app.utils.detections import scale_boxes
+from app.core.logging import log_http_exception, logger
+
+router = APIRouter()
+
+yolo_scheduler = model_manager.get_vehicle_licence_scheduler()
+vehicle_damage_scheduler = model_manager.get_vehicle_damage_scheduler()
+
+
+@router.post("/analyze-video", openapi_extra=video_upload_openapi(VideoAnalyzeOptions))
+async def analyze_video(request: Request):
+    try:
+        # Spool and validate the upload before taking a slot, so that slow uploads do not hold one
+        path, req = await read_video_upload(request, VideoAnalyzeOptions)
+        try:
+            if not (req.detect_plates or req.detect_vehicles or req.detect_damage):
+                raise HTTPException(
+                    status_code=422, detail="At least one detection group must be selected")
+            with inference_executor.admit():
+                return await _analyze(path, req)
+        finally:
+            os.remove(path)
+
+    except (ExecutorSaturatedError, InferenceWorkersUnavailableError) as busy:
+        raise HTTPException(
+            status_code=503, detail=str(busy),
+            headers={"Retry-After": str(busy.retry_after)})
+
+    except DeadlineExceededError as expired:
+        raise HTTPException(status_code=504, detail=str(expired))
+
+    except RequestValidationError:
+        raise
+
+    except HTTPException as http_exception:
+        log_http_exception(http_exception)
+        raise http_exception
+
+    except Exception as e:
+        logger.exception(
+            f"Error occurred during video analysis: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _analyze(path: str, req: VideoAnalyzeOptions) -> dict:
+    try:
+        sampler = await inference_executor.run(
+            VideoFrameSampler, path, req.sample_fps, req.diff_threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    run_plate_model = req.detect_plates or req.detect_vehicles
+    plate_tracker, damage_tracker = IoUTracker(), IoUTracker()
+
+    next_frame = asyncio.ensure_future(inference_executor.run(sampler.next_frame))
+    try:
+        while True:
+            frame = await next_frame
+            if frame is None:
+                break
+            # Decode the next frame while the models run on this one
+            next_frame = asyncio.ensure_future(inference_executor.run(sampler.next_frame))
+
+            plate_arrays, damage_arrays = await asyncio.gather(
+                _detect(yolo_scheduler, frame) if run_plate_model else _skipped(),
+                _detect(vehicle_damage_scheduler, frame) if req.detect_damage else _skipped(),
+            )
+            if plate_arrays is not None:
+                plate_tracker.update(plate_arrays, frame.timestamp)
+            if damage_arrays is not None:
+                damage_tracker.update(damage_arrays, frame.timestamp)
+    finally:
+        # The capture is in use until the pending read returns
+        await asyncio.wait([next_frame])
+        await inference_executor.run(sampler.close)
+
+    def render(tracker, class_ids, label_mapping):
+        tracks = [track for track in tracker.tracks(req.min_track_frames)
+                  if track.label in class_ids]
+        return tracks_to_results(tracks, label_mapping)
+
+    response = {"video": sampler.stats()}
+    if req.detect_plates:
+        response["plates"] = render(plate_tracker, PLATE_CLASS_IDS, PLATE_LABEL_MAPPING)
+    if req.detect_vehicles:
+        response["vehicles"] = render(plate_tracker, VEHICLE_CLASS_IDS, PLATE_LABEL_MAPPING)
+    if req.detect_damage:
+        damage_labels = model_manager.get_vehicle_damage_labels()
+        response["damage"] = render(damage_tracker, damage_class_ids(damage_labels), damage_labels)
+    return response
+
+
+async def _detect(scheduler, frame):
+    return scale_boxes(await scheduler.submit(frame.image), frame.scale)
+
+
+async def _skipped():
+    return None
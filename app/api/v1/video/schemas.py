@@ -0,0 +1,23 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+from app.core.config import VIDEO_DIFF_THRESHOLD, VIDEO_SAMPLE_FPS
+
+
+class VideoAnalyzeOptions(BaseModel):
+    origin: str = Field(..., description="The origin source of the API call")
+    deadline_ms: Optional[int] = Field(
+        None, ge=1, description="Deadline in milliseconds after the request arrives. Frames the models "
+                                "have not run by then are dropped and the request fails with 504")
+    detect_plates: bool = Field(
+        True, description="Track license plates")
+    detect_vehicles: bool = Field(
+        True, description="Track vehicles")
+    detect_damage: bool = Field(
+        True, description="Track vehicle damage")
+    sample_fps: float = Field(
+        VIDEO_SAMPLE_FPS, gt=0, le=60, description="Frames per second sampled from the video")
+    diff_threshold: float = Field(
+        VIDEO_DIFF_THRESHOLD, ge=0, le=1,
+        description="Skip sampled frames that differ less than this from the last analyzed frame (0 disables)")
+    min_track_frames: int = Field(
+        1, ge=1, description="Only report objects detected in at least this many analyzed frames")
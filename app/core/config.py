@@ -0,0 +1,194 @@
+# app/core/config.py
+import json
+import os
+
+
+# Dynamic micro-batching in front of the YOLO models.
+# Requests arriving within BATCH_WINDOW_MS of each other are grouped into a
+# single forward pass of at most BATCH_MAX_SIZE images.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "10"))
+
+# Bounded executor for CPU-bound decoding and inference.
+# At most MAX_IN_FLIGHT_REQUESTS detection requests are admitted at once;
+# further requests are rejected with 503 and a Retry-After header.
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "4"))
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "32"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+
+# Model replicas. Each model is loaded MODEL_REPLICAS times, and batches run
+# in parallel on the least loaded replica. Every replica runs on its own
+# thread with TORCH_THREADS_PER_REPLICA intra-op threads (0: the process'
+# torch thread count divided by MODEL_REPLICAS) and, with PIN_REPLICA_CORES,
+# pinned to its own slice of the available cores.
+MODEL_REPLICAS = int(os.getenv("MODEL_REPLICAS", "1"))
+TORCH_THREADS_PER_REPLICA = int(os.getenv("TORCH_THREADS_PER_REPLICA", "0"))
+PIN_REPLICA_CORES = os.getenv("PIN_REPLICA_CORES", "true").lower() in ("1", "true", "yes")
+
+# Inference mode. "thread" runs the models in the API process. "process" runs
+# them in INFERENCE_WORKERS separate worker processes, each with
+# INFERENCE_WORKER_THREADS torch threads (0: cores / INFERENCE_WORKERS) and,
+# with PIN_REPLICA_CORES, its own slice of the cores. Decoded images reach the
+# workers through shared memory. A worker that exits is restarted after
+# INFERENCE_WORKER_RESTART_SECONDS, doubled after each failed restart.
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread").lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "0"))
+INFERENCE_WORKER_RESTART_SECONDS = float(os.getenv("INFERENCE_WORKER_RESTART_SECONDS", "1"))
+
+# Request scheduling. The batching queues serve higher priorities first. A
+# request's priority is the X-Priority header or else the priority of its
+# origin in REQUEST_PRIORITIES, a JSON object such as
+# {"mobile-app": 10, "back-office": -10}; other requests get
+# DEFAULT_REQUEST_PRIORITY. A request may carry a deadline, in milliseconds
+# after its arrival (X-Deadline-Ms header or `deadline_ms` field). Its images
+# are dropped before the model runs once the deadline has passed (expired)
+# and, with DEADLINE_SHEDDING, when it would pass before the batch is expected
+# to finish (shed).
+DEFAULT_REQUEST_PRIORITY = int(os.getenv("DEFAULT_REQUEST_PRIORITY", "0"))
+REQUEST_PRIORITIES = json.loads(os.getenv("REQUEST_PRIORITIES", "{}"))
+DEADLINE_SHEDDING = os.getenv("DEADLINE_SHEDDING", "true").lower() in ("1", "true", "yes")
+
+# Content-addressed inference result cache.
+# Set INFERENCE_CACHE_MAX_ENTRIES=0 to disable caching.
+INFERENCE_CACHE_MAX_ENTRIES = int(os.getenv("INFERENCE_CACHE_MAX_ENTRIES", "1024"))
+INFERENCE_CACHE_MAX_MB = float(os.getenv("INFERENCE_CACHE_MAX_MB", "64"))
+INFERENCE_CACHE_TTL_SECONDS = float(os.getenv("INFERENCE_CACHE_TTL_SECONDS", "300"))
+
+# Image decoding. With FAST_IMAGE_DECODE enabled, JPEGs are decoded by OpenCV
+# (libjpeg-turbo) at a reduced DCT scale close to MODEL_INPUT_SIZE, and boxes
+# are mapped back to the original resolution.
+FAST_IMAGE_DECODE = os.getenv("FAST_IMAGE_DECODE", "true").lower() in ("1", "true", "yes")
+MODEL_INPUT_SIZE = int(os.getenv("MODEL_INPUT_SIZE", "640"))
+
+# Preprocessing. With POOLED_PREPROCESSING, images are letterboxed straight
+# into reusable input buffers and the input tensor goes to the model without
+# ultralytics' own per-call preprocessing. Each model keeps at most
+# PREPROCESS_POOL_SIZE buffers (by default two, or one per replica), each sized for
+# BATCH_MAX_SIZE images.
+POOLED_PREPROCESSING = os.getenv("POOLED_PREPROCESSING", "true").lower() in ("1", "true", "yes")
+PREPROCESS_POOL_SIZE = int(os.getenv("PREPROCESS_POOL_SIZE", str(max(2, MODEL_REPLICAS))))
+
+# Inference runtime: "torch" (ultralytics/PyTorch), "onnx" (ONNX Runtime) or
+# "openvino". Non-torch backends export the .pt weights on first use and cache
+# the exported graph next to the weights.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+# Model weights
+LICENCE_PLATE_MODEL_PATH = os.getenv(
+    "LICENCE_PLATE_MODEL_PATH", "app/models/best_licence_plate_detector.pt")
+VEHICLE_DAMAGE_MODEL_PATH = os.getenv(
+    "VEHICLE_DAMAGE_MODEL_PATH", "app/models/vehicle_damage_best.pt")
+
+# INT8 model variants (onnx and openvino backends). MODEL_PRECISION applies to
+# both models unless overridden per model. QUANTIZATION_MODE is "dynamic"
+# (weights only, no calibration) or "static" (weights and activations,
+# calibrated on the images in CALIBRATION_IMAGES_DIR).
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+LICENCE_PLATE_MODEL_PRECISION = os.getenv(
+    "LICENCE_PLATE_MODEL_PRECISION", MODEL_PRECISION).lower()
+VEHICLE_DAMAGE_MODEL_PRECISION = os.getenv(
+    "VEHICLE_DAMAGE_MODEL_PRECISION", MODEL_PRECISION).lower()
+QUANTIZATION_MODE = os.getenv("QUANTIZATION_MODE", "static").lower()
+CALIBRATION_IMAGES_DIR = os.getenv("CALIBRATION_IMAGES_DIR", "testing/images")
+
+# Model loading and warmup. Models are loaded in the background at startup and
+# `/ready` reports ready once every eagerly loaded model has been warmed up.
+# Models listed in LAZY_MODELS ("vehicle_licence_plate", "vehicle_damage") are
+# loaded on first use instead. Warmup runs WARMUP_ITERATIONS passes on blank
+# images for every size in WARMUP_INPUT_SIZES and batch sizes 1 and
+# BATCH_MAX_SIZE.
+LAZY_MODELS = [name.strip() for name in os.getenv("LAZY_MODELS", "").split(",") if name.strip()]
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() in ("1", "true", "yes")
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "2"))
+WARMUP_INPUT_SIZES = [int(size) for size in os.getenv(
+    "WARMUP_INPUT_SIZES", str(MODEL_INPUT_SIZE)).split(",") if size.strip()]
+
+# Preload-and-fork launcher (python -m app.launcher). Models are loaded and
+# warmed up once, then shared copy-on-write by WEB_WORKERS forked workers, each
+# limited to TORCH_THREADS_PER_WORKER intra-op threads (0: cores / workers).
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))
+
+# Rate limiting (token bucket). By default every client IP may send
+# RATE_LIMIT_RATE requests per second with bursts of up to RATE_LIMIT_BURST.
+# RATE_LIMIT_RULES is a JSON list of overrides, the first match wins, e.g.
+#   [{"path": "/api/v1/analyze", "rate": 1, "burst": 2},
+#    {"origin": "mobile-app", "rate": 20, "burst": 40, "per": "origin"}]
+# A rule matches on a path prefix and/or the request origin (X-Origin header or
+# `origin` query parameter) and counts per client IP ("per": "ip") or per
+# origin ("per": "origin"). RATE_LIMIT_STORE is "memory" (per process) or
+# "sqlite" (shared by all workers on a host through RATE_LIMIT_SQLITE_PATH).
+# The sqlite store runs on the event loop, so it waits at most
+# RATE_LIMIT_SQLITE_BUSY_MS for the file lock and lets the request through
+# when it cannot get it.
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "2"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "2"))
+RATE_LIMIT_RULES = json.loads(os.getenv("RATE_LIMIT_RULES", "[]"))
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/vehicle-vision-rate-limit.sqlite3")
+RATE_LIMIT_SQLITE_BUSY_MS = float(os.getenv("RATE_LIMIT_SQLITE_BUSY_MS", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_IDLE_SECONDS = float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "300"))
+
+# Multi-image batch endpoints (POST .../batch): maximum images per request.
+BATCH_REQUEST_MAX_IMAGES = int(os.getenv("BATCH_REQUEST_MAX_IMAGES", "32"))
+
+# Video endpoint. Frames are sampled at VIDEO_SAMPLE_FPS; a sampled frame whose
+# downscaled grayscale version differs from the last analyzed frame by less
+# than VIDEO_DIFF_THRESHOLD (mean absolute difference, 0-1) is skipped, but
+# never for longer than VIDEO_MAX_SKIP_SECONDS. Detections are linked across
+# frames by an IoU tracker.
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_DIFF_THRESHOLD = float(os.getenv("VIDEO_DIFF_THRESHOLD", "0.03"))
+VIDEO_MAX_SKIP_SECONDS = float(os.getenv("VIDEO_MAX_SKIP_SECONDS", "2"))
+VIDEO_MAX_UPLOAD_MB = float(os.getenv("VIDEO_MAX_UPLOAD_MB", "200"))
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_MAX_MISSED = int(os.getenv("TRACK_MAX_MISSED", "3"))
+
+# Cascade mode of /api/v1/analyze: vehicles are detected on the frame
+# downscaled to CASCADE_DETECT_SIZE, then plates and damage are detected on
+# full-resolution crops of (at most CASCADE_MAX_CROPS) vehicle boxes, padded by
+# CASCADE_CROP_PADDING of their size. Duplicates from overlapping crops are
+# removed with NMS at CASCADE_NMS_IOU.
+CASCADE_DETECT_SIZE = int(os.getenv("CASCADE_DETECT_SIZE", str(MODEL_INPUT_SIZE)))
+CASCADE_MAX_CROPS = int(os.getenv("CASCADE_MAX_CROPS", "16"))
+CASCADE_CROP_PADDING = float(os.getenv("CASCADE_CROP_PADDING", "0.1"))
+CASCADE_MIN_CROP_SIZE = int(os.getenv("CASCADE_MIN_CROP_SIZE", "32"))
+CASCADE_NMS_IOU = float(os.getenv("CASCADE_NMS_IOU", "0.5"))
+
+# Tiled mode of /api/v1/analyze, for drone and overhead images: the image is
+# cut into TILE_SIZE tiles overlapping by TILE_OVERLAP of their size, run at
+# native resolution, and tile detections near the seams are merged with "nms"
+# or "fusion" (weighted box fusion) at TILE_MERGE_IOU. At most
+# TILE_MAX_IN_FLIGHT tiles of one image wait on the model at a time. With
+# TILE_FULL_IMAGE_PASS, the downscaled whole image is also analyzed so that
+# objects larger than a tile are not only found in pieces.
+TILE_SIZE = int(os.getenv("TILE_SIZE", str(MODEL_INPUT_SIZE)))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_MERGE = os.getenv("TILE_MERGE", "nms").lower()
+TILE_MERGE_IOU = float(os.getenv("TILE_MERGE_IOU", "0.5"))
+TILE_MAX_IN_FLIGHT = int(os.getenv("TILE_MAX_IN_FLIGHT", str(BATCH_MAX_SIZE)))
+TILE_FULL_IMAGE_PASS = os.getenv("TILE_FULL_IMAGE_PASS", "true").lower() in ("1", "true", "yes")
+
+# Diagnostics. Requests with an X-Debug-Timing header get a Server-Timing
+# response header unless SERVER_TIMING_ENABLED is false. /admin/profile samples
+# the worker's Python stacks every PROFILE_INTERVAL_MS for at most
+# PROFILE_MAX_SECONDS; it requires ADMIN_TOKEN and is disabled when unset.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+
+# Logging. With LOG_ENQUEUE, records are written to the console by a
+# background thread instead of the request handlers. LOG_FORMAT is "text" or
+# "json" (one serialized record per line). High-volume lines (uvicorn access
+# log, 4xx outcomes such as "nothing detected", rate limit rejections) are
+# sampled: a fraction LOG_SAMPLE_RATE of them is kept, overridden per route by
+# LOG_SAMPLE_RATES, e.g. {"/api/v1/license-plate-detector": 0.1, "/health-check": 0}.
+# Errors (5xx) are always logged, with their traceback.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_ENQUEUE = os.getenv("LOG_ENQUEUE", "true").lower() in ("1", "true", "yes")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+LOG_SAMPLE_RATES = json.loads(os.getenv("LOG_SAMPLE_RATES", "{}"))
@@ -1,23 +1,83 @@
-from loguru import logger
+import logging
+import random
 import sys
+from fastapi import HTTPException
+from loguru import logger
+from app.core.config import LOG_ENQUEUE, LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE, LOG_SAMPLE_RATES
+from app.core.metrics import route_label
+
+# Standard library loggers forwarded to loguru
+INTERCEPTED_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def sampled(route: str = None) -> bool:
+    """
+    Whether to emit a high-volume INFO line of `route` (default: the route of
+    the current request), according to LOG_SAMPLE_RATE and LOG_SAMPLE_RATES.
+    """
+    if route is None:
+        route = route_label()
+    rate = LOG_SAMPLE_RATES.get(route, LOG_SAMPLE_RATE)
+    return rate >= 1 or random.random() < rate
+
 
+def log_http_exception(exception: HTTPException):
+    """
+    Log an HTTPException raised by an endpoint. Only server errors are logged
+    with a traceback: client errors such as 404 (nothing detected) are
+    expected outcomes and get a sampled INFO line.
+    """
+    if exception.status_code >= 500:
+        logger.opt(exception=True).error(f"HTTPException {exception.status_code}: {exception.detail}")
+    elif sampled():
+        logger.info(f"HTTPException {exception.status_code}: {exception.detail}")
 
-def configure_logger():
+
+class InterceptHandler(logging.Handler):
+    """
+    Forward standard library records (uvicorn) to loguru, so that they share
+    its sinks and background writer. Access log lines are sampled per path.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        if record.name == "uvicorn.access" and record.levelno <= logging.INFO:
+            # uvicorn passes (client, method, path, http version, status)
+            path = record.args[2].split("?", 1)[0] if len(record.args) > 2 else None
+            if not sampled(path):
+                return
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        logger.opt(depth=6, exception=record.exc_info).log(level, record.getMessage())
+
+
+def configure_logger(context: str = None):
+    """
+    Set up the console loggers. `context` is the multiprocessing start
+    method of the queues used with LOG_ENQUEUE (by default the process's).
+    """
     # Remove the default logger
     logger.remove()
 
-    # Add a single console logger for all levels
-    logger.add(
-        sys.stdout,
-        level="DEBUG",  # Log all levels from DEBUG and above
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}: {message}",
-        colorize=True
-    )
+    # With enqueue, records are written by a background thread: the caller
+    # only formats the record and puts it on a queue, and never blocks on the
+    # console. JSON output has one serialized record per line. Tracebacks
+    # leave out variable values (diagnose), which may hold image data.
+    if LOG_FORMAT == "json":
+        options = {"format": "{message}", "serialize": True}
+    else:
+        options = {"format": "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}: {message}", "colorize": True}
+
+    # Add a single console logger for all levels from LOG_LEVEL
+    logger.add(sys.stdout, level=LOG_LEVEL, enqueue=LOG_ENQUEUE, context=context, diagnose=False, **options)
 
     # Add a console logger for CRITICAL messages to stderr
-    logger.add(
-        sys.stderr,
-        level="CRITICAL",  # Log CRITICAL messages
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}: {message}",
-        colorize=True
-    )
+    logger.add(sys.stderr, level="CRITICAL", enqueue=LOG_ENQUEUE, context=context, diagnose=False, **options)
+
+    handler = InterceptHandler()
+    for name in INTERCEPTED_LOGGERS:
+        std_logger = logging.getLogger(name)
+        std_logger.handlers = [handler]
+        std_logger.setLevel(LOG_LEVEL)
+        std_logger.propagate = False
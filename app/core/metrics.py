@@ -0,0 +1,321 @@
+# app/core/metrics.py
+# Prometheus metrics.
+#
+# Request-path metrics are plain prometheus_client histograms and gauges (an
+# observation costs about a microsecond). Values that already exist as
+# counters somewhere else (executor slots, batching queues, cache, model
+# timings) are read only when /metrics is scraped, by `ServiceCollector`.
+#
+# With several worker processes (app/launcher.py), set PROMETHEUS_MULTIPROC_DIR
+# to an empty directory: histograms and counters are then aggregated over all
+# workers, while the scrape-time values come from the worker that answers.
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Tuple
+import numpy as np
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, ProcessCollector,
+    generate_latest, multiprocess)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+IMAGE_BYTES_BUCKETS = tuple(2 ** exponent for exponent in range(14, 26))  # 16 KiB .. 32 MiB
+IMAGE_PIXELS_BUCKETS = (0.1e6, 0.3e6, 1e6, 2e6, 4e6, 8e6, 12e6, 16e6, 24e6, 50e6, 100e6)
+DETECTION_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REQUEST_SECONDS = Histogram(
+    "vehicle_vision_request_duration_seconds", "End-to-end HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge(
+    "vehicle_vision_requests_in_flight", "HTTP requests currently being handled",
+    multiprocess_mode="livesum")
+STAGE_SECONDS = Histogram(
+    "vehicle_vision_stage_duration_seconds",
+    "Latency of one stage of a request: read (body and base64), decode, inference "
+    "(batching queue and model), postprocess, serialize",
+    ["route", "stage"], buckets=LATENCY_BUCKETS)
+IMAGE_BYTES = Histogram(
+    "vehicle_vision_image_size_bytes", "Encoded size of uploaded images",
+    ["route"], buckets=IMAGE_BYTES_BUCKETS)
+IMAGE_PIXELS = Histogram(
+    "vehicle_vision_image_pixels", "Pixel count of decoded images, at original resolution",
+    ["route"], buckets=IMAGE_PIXELS_BUCKETS)
+DETECTIONS = Histogram(
+    "vehicle_vision_detections_per_image", "Detections found per image",
+    ["route", "group"], buckets=DETECTION_BUCKETS)
+BATCH_QUEUE_SECONDS = Histogram(
+    "vehicle_vision_batch_queue_seconds", "Time an image waits in the batching queue",
+    ["model"], buckets=LATENCY_BUCKETS)
+DEADLINE_DROPS = Counter(
+    "vehicle_vision_deadline_drops",
+    "Images dropped by the batching queue because of their request's deadline: "
+    "expired (already passed) or shed (would pass before the batch finishes)",
+    ["model", "reason"])
+BATCH_SIZE = Histogram(
+    "vehicle_vision_batch_size", "Images per model batch",
+    ["model"], buckets=BATCH_SIZE_BUCKETS)
+MODEL_STAGE_SECONDS = Histogram(
+    "vehicle_vision_model_stage_seconds",
+    "Time per model batch, by stage: preprocess, forward and postprocess (NMS and "
+    "conversion to arrays; a separate to_arrays stage without pooled preprocessing)",
+    ["model", "stage"], buckets=LATENCY_BUCKETS)
+
+ULTRALYTICS_STAGES = {"preprocess": "preprocess", "inference": "forward", "postprocess": "postprocess"}
+# Server-Timing entries of the model stages reported per batch
+SERVER_TIMING_MODEL_STAGES = {
+    "preprocess": "preprocess", "forward": "model", "postprocess": "postprocess", "to_arrays": "postprocess"}
+
+# The ASGI scope of the request being handled, to label observations made deep
+# in the call stack with the matched route
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+# Stage timings of the current request, only collected when the client asked
+# for a Server-Timing header
+_server_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+def set_request_scope(scope: dict) -> contextvars.Token:
+    return _request_scope.set(scope)
+
+
+def reset_request_scope(token: contextvars.Token):
+    _request_scope.reset(token)
+
+
+def start_server_timing() -> Tuple[dict, contextvars.Token]:
+    timings = {}
+    return timings, _server_timings.set(timings)
+
+
+def reset_server_timing(token: contextvars.Token):
+    _server_timings.reset(token)
+
+
+def add_server_timing(name: str, seconds: float):
+    """
+    Add to a stage of the Server-Timing header, if the current request has one.
+    Stages run several times (batch requests, several models) are summed.
+    """
+    timings = _server_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def server_timing_header(timings: dict, total: float) -> bytes:
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries).encode("latin-1")
+
+
+def route_label(scope: dict = None) -> str:
+    """
+    Route template of a request (e.g. "/api/v1/analyze"). Unmatched paths share
+    one label, so that scanners cannot create unbounded label values.
+    """
+    scope = scope if scope is not None else _request_scope.get()
+    if scope is None:
+        return "none"
+    path = getattr(scope.get("route"), "path", None)
+    if path is None:
+        return "unmatched"
+    # Routes of an included router may only know their path below the router
+    # prefix: take the prefix from the request path
+    static_part = path.split("{", 1)[0]
+    prefix_length = scope.get("path", "").find(static_part) if static_part else 0
+    return scope["path"][:prefix_length] + path if prefix_length > 0 else path
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a stage of the current request.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(route_label(), name).observe(elapsed)
+        add_server_timing(name, elapsed)
+
+
+def observe_request(scope: dict, status: int, seconds: float):
+    REQUEST_SECONDS.labels(scope.get("method", ""), route_label(scope), status).observe(seconds)
+
+
+def observe_image_bytes(size: int):
+    IMAGE_BYTES.labels(route_label()).observe(size)
+
+
+def observe_image(image: np.ndarray, scale: Tuple[float, float]):
+    """
+    Record the original pixel count of a decoded (possibly downscaled) image.
+    """
+    height, width = image.shape[:2]
+    IMAGE_PIXELS.labels(route_label()).observe(width * scale[0] * height * scale[1])
+
+
+def observe_detections(group: str, count: int):
+    DETECTIONS.labels(route_label(), group).observe(count)
+
+
+def observe_batch(model: str, batch_size: int, stage_seconds: dict):
+    """
+    Record the size and the stage timings (seconds per batch) of one batch.
+    """
+    BATCH_SIZE.labels(model).observe(batch_size)
+    for stage_name, seconds in stage_seconds.items():
+        MODEL_STAGE_SECONDS.labels(model, stage_name).observe(seconds)
+
+
+def ultralytics_stage_seconds(results: list) -> dict:
+    """
+    Stage timings of a batch run through the ultralytics predictor, which
+    reports each stage as milliseconds per image averaged over the batch.
+    """
+    speed = getattr(results[0], "speed", None) if results else None
+    return {stage_name: speed[key] * len(results) / 1000 for key, stage_name in ULTRALYTICS_STAGES.items()
+            if speed and speed.get(key) is not None}
+
+
+class ServiceCollector:
+    """
+    Expose the state of the inference services when /metrics is scraped.
+    """
+
+    def __init__(self, model_manager, inference_executor, inference_cache):
+        self.model_manager = model_manager
+        self.inference_executor = inference_executor
+        self.inference_cache = inference_cache
+
+    def collect(self):
+        executor = self.inference_executor.stats()
+        yield GaugeMetricFamily(
+            "vehicle_vision_inference_in_flight",
+            "Admitted requests holding an inference slot", value=executor["in_flight"])
+        yield GaugeMetricFamily(
+            "vehicle_vision_inference_max_in_flight",
+            "Inference slots available", value=executor["max_in_flight"])
+        yield CounterMetricFamily(
+            "vehicle_vision_inference_rejected",
+            "Requests rejected because every inference slot was taken",
+            value=executor["rejected"])
+
+        queued = GaugeMetricFamily(
+            "vehicle_vision_batch_queue_depth", "Images waiting in the batching queue",
+            labels=["model"])
+        replica_in_flight = GaugeMetricFamily(
+            "vehicle_vision_replica_in_flight", "Batches running on a model replica",
+            labels=["model", "replica"])
+        replica_batches = CounterMetricFamily(
+            "vehicle_vision_replica_batches", "Batches run by a model replica",
+            labels=["model", "replica"])
+        replica_busy = CounterMetricFamily(
+            "vehicle_vision_replica_busy_seconds", "Time a model replica spent running batches",
+            labels=["model", "replica"])
+        for name, stats in self.model_manager.scheduler_stats().items():
+            queued.add_metric([name], stats["queue_depth"])
+            for index, replica in enumerate(stats.get("replicas", ())):
+                replica_in_flight.add_metric([name, str(index)], replica["in_flight"])
+                replica_batches.add_metric([name, str(index)], replica["batches"])
+                replica_busy.add_metric([name, str(index)], replica["busy_seconds"])
+        yield from (queued, replica_in_flight, replica_batches, replica_busy)
+
+        buffers = GaugeMetricFamily(
+            "vehicle_vision_preprocess_buffers", "Pooled preprocessing input buffers",
+            labels=["model", "state"])
+        buffer_allocations = CounterMetricFamily(
+            "vehicle_vision_preprocess_buffer_allocations",
+            "Preprocessing input buffers allocated, pooled or temporary", labels=["model"])
+        unpooled = CounterMetricFamily(
+            "vehicle_vision_preprocess_buffer_unpooled",
+            "Batches preprocessed into a temporary buffer because the pool was exhausted",
+            labels=["model"])
+        for name, stats in self.model_manager.buffer_pool_stats().items():
+            buffers.add_metric([name, "in_use"], stats["in_use"])
+            buffers.add_metric([name, "free"], stats["free"])
+            buffer_allocations.add_metric([name], stats["allocations"])
+            unpooled.add_metric([name], stats["unpooled"])
+        yield from (buffers, buffer_allocations, unpooled)
+
+        status = self.model_manager.status()
+        yield GaugeMetricFamily(
+            "vehicle_vision_ready", "1 once the models are loaded and warmed up",
+            value=int(status["ready"]))
+        loaded = GaugeMetricFamily(
+            "vehicle_vision_model_loaded", "1 if the model is loaded", labels=["model"])
+        load_seconds = GaugeMetricFamily(
+            "vehicle_vision_model_load_seconds", "Time taken to load the model",
+            labels=["model"])
+        warmup_seconds = GaugeMetricFamily(
+            "vehicle_vision_model_warmup_seconds", "Time taken to warm up the model",
+            labels=["model"])
+        for name, model in status["models"].items():
+            loaded.add_metric([name], int(model["loaded"]))
+            if "load_seconds" in model:
+                load_seconds.add_metric([name], model["load_seconds"])
+            if "warmup_seconds" in model:
+                warmup_seconds.add_metric([name], model["warmup_seconds"])
+        yield from (loaded, load_seconds, warmup_seconds)
+
+        if "inference_workers" in status:
+            worker_ready = GaugeMetricFamily(
+                "vehicle_vision_inference_worker_ready", "1 if the inference worker process is ready",
+                labels=["worker"])
+            worker_in_flight = GaugeMetricFamily(
+                "vehicle_vision_inference_worker_in_flight", "Batches sent to an inference worker",
+                labels=["worker"])
+            worker_batches = CounterMetricFamily(
+                "vehicle_vision_inference_worker_batches", "Batches run by an inference worker",
+                labels=["worker"])
+            worker_restarts = CounterMetricFamily(
+                "vehicle_vision_inference_worker_restarts", "Restarts of an inference worker",
+                labels=["worker"])
+            for index, worker in enumerate(status["inference_workers"]["workers"]):
+                worker_ready.add_metric([str(index)], int(worker["ready"]))
+                worker_in_flight.add_metric([str(index)], worker["in_flight"])
+                worker_batches.add_metric([str(index)], worker["batches"])
+                worker_restarts.add_metric([str(index)], worker["restarts"])
+            yield from (worker_ready, worker_in_flight, worker_batches, worker_restarts)
+
+        cache = self.inference_cache.stats()
+        yield GaugeMetricFamily(
+            "vehicle_vision_cache_entries", "Results held by the inference cache",
+            value=cache["entries"])
+        yield GaugeMetricFamily(
+            "vehicle_vision_cache_bytes", "Memory held by the inference cache",
+            value=cache["bytes"])
+        for key in ("hits", "misses", "coalesced", "evictions"):
+            yield CounterMetricFamily(
+                f"vehicle_vision_cache_{key}", f"Inference cache {key}", value=cache[key])
+
+
+_service_collectors = []
+
+
+def register_service_collector(collector: ServiceCollector):
+    _service_collectors.append(collector)
+    if not MULTIPROCESS:
+        REGISTRY.register(collector)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render every metric in the Prometheus text format.
+    Returns:
+        Tuple[bytes, str]: The body and its content type.
+    """
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    # Memory and scrape-time values of the worker answering the scrape
+    ProcessCollector(registry=registry)
+    for collector in _service_collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,59 +1,167 @@
-from time import time
-from collections import defaultdict
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+import math
+import time
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
 from starlette.responses import JSONResponse
-from app.core.logging import logger
+from app.core.logging import logger, sampled
+from app.core.config import SERVER_TIMING_ENABLED
+from app.core.metrics import (
+    REQUESTS_IN_FLIGHT, observe_request, reset_request_scope, reset_server_timing,
+    server_timing_header, set_request_scope, start_server_timing)
+from app.core.rate_limit import RateLimiter, request_origin
+from app.core.scheduling import reset_request_schedule, start_request_schedule
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI rate limiter: the admission decision only looks at the scope,
+    and admitted requests are passed through without wrapping the body.
+    """
+
+    def __init__(self, app, limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = limiter or RateLimiter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        origin = request_origin(Headers(scope=scope), scope.get("query_string", b""))
+
+        retry_after = self.limiter.check(client_ip, scope["path"], origin)
+        if retry_after:
+            if sampled(scope["path"]):
+                logger.warning(f"Rate limit exceeded for IP: {client_ip} (origin: {origin})")
+            response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429,
+                                    headers={"Retry-After": str(math.ceil(retry_after))})
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+]
+SECURITY_HEADER_NAMES = {name for name, _ in SECURITY_HEADERS}
+
+
+class SecurityHeaderMiddleware:
+    """
+    Pure ASGI middleware adding the security headers to the
+    `http.response.start` message of every response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Replace rather than duplicate headers the endpoint already set
+                headers = [(name, value) for name, value in message.get("headers", ())
+                           if name.lower() not in SECURITY_HEADER_NAMES]
+                message["headers"] = headers + SECURITY_HEADERS
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+# Clients send this header (any value) to get a Server-Timing response header
+SERVER_TIMING_REQUEST_HEADER = b"x-debug-timing"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency by route and status, and
+    making the request scope available to the stage timers in app.core.metrics.
+
+    Requests carrying an `X-Debug-Timing` header also get a `Server-Timing`
+    response header with the time spent in each stage of that request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
+        status = 500
+        timings, timing_token = None, None
+        if SERVER_TIMING_ENABLED and any(
+                name == SERVER_TIMING_REQUEST_HEADER for name, _ in scope["headers"]):
+            timings, timing_token = start_server_timing()
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, rate_limit_window: int, max_requests: int):
-        super().__init__(app)
-        self.rate_limit_window = rate_limit_window
-        self.max_requests = max_requests
-        self.requests = defaultdict(list)
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    # Streaming responses only report the stages finished so far
+                    header = server_timing_header(timings, time.perf_counter() - start)
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", header)]
+            await send(message)
 
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        request_time = time()
+        token = set_request_scope(scope)
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Streaming responses are timed until their last chunk is sent
+            observe_request(scope, status, time.perf_counter() - start)
+            REQUESTS_IN_FLIGHT.dec()
+            reset_request_scope(token)
+            if timing_token is not None:
+                reset_server_timing(timing_token)
 
-        if client_ip in self.requests:
-            # Filter out timestamps older than rate_limit_window
-            self.requests[client_ip] = [timestamp for timestamp in self.requests[client_ip]
-                                        if request_time - timestamp < self.rate_limit_window]
 
-        if len(self.requests[client_ip]) >= self.max_requests:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse({"detail": "Rate limit exceeded"}, status_code=429)
+class RequestScheduleMiddleware:
+    """
+    Pure ASGI middleware starting the priority and deadline of each request
+    (see app.core.scheduling) from its headers and origin.
+    """
 
-        self.requests[client_ip].append(request_time)
-        logger.info(
-            f"Request allowed for IP: {client_ip} at time: {request_time}")
-        response = await call_next(request)
-        return response
+    def __init__(self, app):
+        self.app = app
 
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class SecurityHeaderMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        return response
+        headers = Headers(scope=scope)
+        token = start_request_schedule(headers, request_origin(headers, scope.get("query_string", b"")))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_request_schedule(token)
 
 
-def setup_middleware(app):
+def setup_middleware(app, limiter: RateLimiter = None):
     cors_options = {
         "allow_methods": ["*"],
         "allow_headers": ["*"],
         "allow_origins": ["*"],
         "allow_credentials": True,
     }
+    # Innermost: only requests that reach an endpoint are scheduled
+    app.add_middleware(RequestScheduleMiddleware)
     app.add_middleware(CORSMiddleware, **cors_options)
-    app.add_middleware(RateLimitMiddleware,
-                       rate_limit_window=1, max_requests=2)
+    # Limits are configured through RATE_LIMIT_* (see app/core/config.py)
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
     app.add_middleware(SecurityHeaderMiddleware)
+    # Outermost, so that rate limited requests are measured as well
+    app.add_middleware(MetricsMiddleware)
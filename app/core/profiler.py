@@ -0,0 +1,81 @@
+# app/core/profiler.py
+import collections
+import os
+import sys
+import threading
+import time
+from app.core.config import PROFILE_INTERVAL_MS
+
+# Leaf functions of threads that are blocked rather than running, e.g. idle
+# thread pool workers or the event loop waiting in select()
+IDLE_FUNCTIONS = {"wait", "select", "poll", "_worker", "accept", "_wait_for_tstate_lock"}
+
+
+class ProfilerBusyError(Exception):
+    """
+    Raised when a profile is requested while another one is running.
+    """
+
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler for the running process.
+
+    A background thread reads the Python stack of every other thread with
+    `sys._current_frames()` at a fixed interval and counts identical stacks.
+    Nothing is installed in the profiled threads, so the overhead is that of
+    the sampling thread alone (a few percent of one core at 100 Hz) and
+    requests are not slowed down between profiles.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = max(1.0, interval_ms) / 1000
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, include_idle: bool = False) -> str:
+        """
+        Sample for `seconds` and return the stacks in folded format. Blocking.
+
+        Each line is `frame;frame;...;frame count`, root first, as read by
+        flamegraph.pl, speedscope and most flame graph viewers.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            counts = self._sample(seconds, include_idle)
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    def _sample(self, seconds: float, include_idle: bool) -> collections.Counter:
+        counts = collections.Counter()
+        own_thread = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                counts[self._fold(names.get(thread_id, str(thread_id)), frame)] += 1
+            time.sleep(self.interval)
+        return counts
+
+    @staticmethod
+    def _fold(thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        # The thread is the root frame, so the flame graph can be split per thread
+        frames.append(thread_name.replace(";", ":"))
+        return ";".join(reversed(frames))
+
+
+# Singleton instance of SamplingProfiler
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,224 @@
+# app/core/rate_limit.py
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qsl
+from loguru import logger
+from app.core.config import (
+    RATE_LIMIT_BURST, RATE_LIMIT_IDLE_SECONDS, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_RATE,
+    RATE_LIMIT_RULES, RATE_LIMIT_SQLITE_BUSY_MS, RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_STORE)
+
+
+class RateLimitRule(NamedTuple):
+    """
+    A token bucket refilled at `rate` tokens per second, holding at most
+    `burst` tokens. Applies to requests whose path starts with `path` and/or
+    whose origin equals `origin` (None matches anything).
+    """
+    rate: float
+    burst: float
+    path: Optional[str] = None
+    origin: Optional[str] = None
+    per: str = "ip"
+
+    def matches(self, path: str, origin: Optional[str]) -> bool:
+        return ((self.path is None or path.startswith(self.path))
+                and (self.origin is None or self.origin == origin))
+
+
+class RateLimitStore:
+    """
+    Storage for token buckets. `consume` must take one token from the bucket
+    at `key` if available, atomically with respect to other callers sharing
+    the store, and return how many seconds to wait otherwise (0 if allowed).
+    """
+
+    def consume(self, key: str, rate: float, burst: float, now: float) -> float:
+        raise NotImplementedError
+
+    @staticmethod
+    def _take(tokens: float, updated: float, rate: float, burst: float, now: float):
+        # Refill for the time elapsed since the last request, then try to take one token
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / rate
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Per-process buckets kept in least-recently-used order.
+
+    Every request touches one bucket and evicts at most a few idle ones from
+    the cold end, so the cost per request is constant. Memory is bounded by
+    `max_keys`; an evicted idle bucket would have refilled completely anyway.
+    Only used from the event loop thread, so no lock is needed.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS,
+                 idle_seconds: float = RATE_LIMIT_IDLE_SECONDS):
+        self.max_keys = max(1, max_keys)
+        self.idle_seconds = idle_seconds
+        self._buckets = OrderedDict()
+
+    def consume(self, key: str, rate: float, burst: float, now: float) -> float:
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens, retry_after = self._take(tokens, updated, rate, burst, now)
+        self._buckets[key] = (tokens, now)
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float):
+        for _ in range(2):
+            if not self._buckets:
+                return
+            _, (_, updated) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - updated < self.idle_seconds:
+                return
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """
+    Buckets in a local SQLite file, shared by every worker process on the host.
+
+    A stand-in for a networked store (e.g. Redis) that needs no extra service.
+    Each `consume` is a single short write transaction; idle buckets are
+    purged every `purge_every` calls.
+
+    `consume` runs on the event loop, so it waits at most `busy_ms` for the
+    file lock held by other workers. When the lock stays busy, or the store
+    fails, the request is allowed rather than blocking the loop.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH,
+                 idle_seconds: float = RATE_LIMIT_IDLE_SECONDS, purge_every: int = 1000,
+                 busy_ms: float = RATE_LIMIT_SQLITE_BUSY_MS):
+        self.path = path
+        self.busy_timeout = max(0.0, busy_ms) / 1000
+        self.idle_seconds = idle_seconds
+        self.purge_every = purge_every
+        self._connection = None
+        self._pid = None
+        self._calls = 0
+        self._failed_open = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not be shared across fork(), so open one per process
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def consume(self, key: str, rate: float, burst: float, now: float) -> float:
+        try:
+            return self._consume(key, rate, burst, now)
+        except sqlite3.Error as e:
+            # Fail open: a busy or broken store must not stall the event loop
+            # or reject traffic
+            self._failed_open += 1
+            if self._failed_open == 1 or self._failed_open % 1000 == 0:
+                logger.warning(f"Rate limit store unavailable, allowing requests "
+                               f"({self._failed_open} so far): {e}")
+            return 0.0
+
+    def _consume(self, key: str, rate: float, burst: float, now: float) -> float:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row is not None else (burst, now)
+            tokens, retry_after = self._take(tokens, updated, rate, burst, now)
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now))
+
+            self._calls += 1
+            if self._calls % self.purge_every == 0:
+                connection.execute(
+                    "DELETE FROM buckets WHERE updated < ?", (now - self.idle_seconds,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return retry_after
+
+
+STORES = {
+    "memory": MemoryRateLimitStore,
+    "sqlite": SQLiteRateLimitStore,
+}
+
+
+def get_store(name: str = RATE_LIMIT_STORE) -> RateLimitStore:
+    if name not in STORES:
+        raise ValueError(
+            f"Unknown rate limit store '{name}', expected one of: {', '.join(STORES)}")
+    return STORES[name]()
+
+
+def parse_rules(rules: list) -> list:
+    parsed = []
+    for rule in rules:
+        rule = RateLimitRule(**rule)
+        if rule.per not in ("ip", "origin"):
+            raise ValueError(f"Rate limit rule 'per' must be 'ip' or 'origin', got '{rule.per}'")
+        if rule.rate <= 0 or rule.burst < 1:
+            raise ValueError(f"Rate limit rule needs rate > 0 and burst >= 1: {rule}")
+        parsed.append(rule)
+    return parsed
+
+
+class RateLimiter:
+    """
+    Resolve the rule for a request and charge its bucket.
+    """
+
+    def __init__(self, store: RateLimitStore = None, rules: list = None,
+                 default_rule: RateLimitRule = None):
+        self.store = store if store is not None else get_store()
+        self.rules = parse_rules(RATE_LIMIT_RULES if rules is None else rules)
+        # Validated like the rules, so that a bad RATE_LIMIT_RATE/BURST fails at startup
+        default_rule = default_rule or RateLimitRule(RATE_LIMIT_RATE, RATE_LIMIT_BURST)
+        self.default_rule = parse_rules([default_rule._asdict()])[0]
+
+    def rule_for(self, path: str, origin: Optional[str]):
+        for index, rule in enumerate(self.rules):
+            if rule.matches(path, origin):
+                return index, rule
+        return "default", self.default_rule
+
+    def check(self, client_ip: str, path: str, origin: Optional[str]) -> float:
+        """
+        Returns:
+            float: 0 if the request is allowed, else the seconds until it would be.
+        """
+        rule_id, rule = self.rule_for(path, origin)
+        subject = f"origin:{origin}" if rule.per == "origin" else f"ip:{client_ip}"
+        return self.store.consume(f"{rule_id}:{subject}", rule.rate, rule.burst, time.time())
+
+
+def request_origin(headers, query_string: bytes) -> Optional[str]:
+    """
+    The calling application, from the X-Origin header or the `origin` query
+    parameter (the request body is not parsed for rate limiting).
+    """
+    origin = headers.get("x-origin")
+    if origin:
+        return origin
+    if b"origin=" in query_string:
+        for key, value in parse_qsl(query_string.decode("latin-1")):
+            if key == "origin":
+                return value
+    return None
@@ -0,0 +1,156 @@
+# app/core/scheduling.py
+# Request priorities and deadlines.
+#
+# Every request gets a `RequestSchedule`, started from its headers by
+# `RequestScheduleMiddleware` and completed from the parsed request options
+# (`origin` and `deadline_ms` fields). The batching scheduler reads it when the
+# images of the request are queued, so it applies to every model the request
+# runs.
+import contextvars
+import math
+import time
+from typing import Optional
+from app.core.config import DEFAULT_REQUEST_PRIORITY, REQUEST_PRIORITIES
+
+PRIORITY_HEADER = "x-priority"
+DEADLINE_HEADER = "x-deadline-ms"
+
+
+class DeadlineExceededError(Exception):
+    """
+    Raised for images dropped because the deadline of their request has
+    passed, or would pass before their batch finishes.
+    """
+
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+
+class RequestSchedule:
+    """
+    Priority (higher is served first) and deadline (a `time.monotonic()`
+    value, or None) of one request.
+    """
+
+    __slots__ = ("received_at", "priority", "deadline", "explicit_priority")
+
+    def __init__(self, received_at: float = None):
+        self.received_at = time.monotonic() if received_at is None else received_at
+        self.priority = DEFAULT_REQUEST_PRIORITY
+        self.deadline = None
+        # Set by the X-Priority header, which takes precedence over the origin
+        self.explicit_priority = False
+
+    def set_origin(self, origin: Optional[str]):
+        if origin is not None and not self.explicit_priority:
+            self.priority = REQUEST_PRIORITIES.get(origin, DEFAULT_REQUEST_PRIORITY)
+
+    def set_deadline_ms(self, milliseconds: float):
+        """
+        Set the deadline, relative to the arrival of the request. When both
+        the header and the field are given, the earlier deadline wins.
+        """
+        deadline = self.received_at + milliseconds / 1000
+        self.deadline = deadline if self.deadline is None else min(self.deadline, deadline)
+
+    def remaining(self) -> Optional[float]:
+        """
+        Seconds left until the deadline (negative once passed), or None.
+        """
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+
+class SharedSchedule(RequestSchedule):
+    """
+    Schedule of work shared by several requests, e.g. one inference awaited
+    by concurrent uploads of the same image: the highest priority and the
+    latest deadline of the requests that joined it, no deadline if any of
+    them has none.
+
+    Queues holding the work watch the schedule, to be told when a joining
+    request raises its priority.
+    """
+
+    __slots__ = ("_watchers",)
+
+    def __init__(self, schedule: Optional[RequestSchedule]):
+        super().__init__()
+        self._watchers = []
+        if schedule is not None:
+            self.received_at = schedule.received_at
+            self.priority = schedule.priority
+            self.deadline = schedule.deadline
+
+    def join(self, schedule: Optional[RequestSchedule]):
+        """
+        Widen the schedule to serve another request (None: a request
+        without schedule, with the default priority and no deadline).
+        """
+        priority = schedule.priority if schedule is not None else DEFAULT_REQUEST_PRIORITY
+        deadline = schedule.deadline if schedule is not None else None
+        self.deadline = None if deadline is None or self.deadline is None else max(self.deadline, deadline)
+        if priority > self.priority:
+            self.priority = priority
+            for watcher in self._watchers:
+                watcher()
+
+    def watch(self, callback):
+        """
+        Call `callback()` whenever the priority is raised.
+        """
+        self._watchers.append(callback)
+
+
+_request_schedule = contextvars.ContextVar("request_schedule", default=None)
+
+
+def start_request_schedule(headers, origin: Optional[str]) -> contextvars.Token:
+    """
+    Start the schedule of the current request from the X-Priority and
+    X-Deadline-Ms headers and the origin. Malformed values are ignored.
+    """
+    schedule = RequestSchedule()
+    priority = headers.get(PRIORITY_HEADER)
+    if priority:
+        try:
+            schedule.priority = int(priority)
+            schedule.explicit_priority = True
+        except ValueError:
+            pass
+    schedule.set_origin(origin)
+
+    deadline = headers.get(DEADLINE_HEADER)
+    if deadline:
+        try:
+            milliseconds = float(deadline)
+        except ValueError:
+            milliseconds = math.nan
+        if math.isfinite(milliseconds) and milliseconds > 0:
+            schedule.set_deadline_ms(milliseconds)
+    return _request_schedule.set(schedule)
+
+
+def set_request_schedule(schedule: Optional[RequestSchedule]) -> contextvars.Token:
+    return _request_schedule.set(schedule)
+
+
+def reset_request_schedule(token: contextvars.Token):
+    _request_schedule.reset(token)
+
+
+def current_schedule() -> Optional[RequestSchedule]:
+    return _request_schedule.get()
+
+
+def apply_request_options(options):
+    """
+    Complete the schedule of the current request from its parsed options:
+    the `origin` field (unless X-Priority was sent) and the `deadline_ms` field.
+    """
+    schedule = _request_schedule.get()
+    if schedule is None:
+        return
+    schedule.set_origin(getattr(options, "origin", None))
+    deadline_ms = getattr(options, "deadline_ms", None)
+    if deadline_ms is not None:
+        schedule.set_deadline_ms(deadline_ms)
@@ -0,0 +1,184 @@
+# app/launcher.py
+# Preload-and-fork multi-worker launcher.
+#
+# Loads and warms up the models once in this (parent) process, then forks the
+# uvicorn workers. The workers inherit the model weights copy-on-write instead
+# of each loading their own copy, so memory stays roughly flat as workers are
+# added and workers start serving immediately.
+#
+# Usage (from the repository root):
+#   python -m app.launcher --workers 4 --host 0.0.0.0 --port 8000
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import torch
+import uvicorn
+from app.core.config import (
+    MODEL_REPLICAS, MODEL_WARMUP, PIN_REPLICA_CORES, TORCH_THREADS_PER_WORKER, WEB_WORKERS)
+
+
+class PreforkLauncher:
+    """
+    Fork `workers` uvicorn servers sharing one listening socket, restarting
+    any worker that exits unexpectedly.
+    """
+
+    def __init__(self, app, host: str, port: int, workers: int, threads_per_worker: int):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.children = {}
+        self.stopping = False
+
+    def run(self):
+        from app.core.logging import logger
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+
+        # Move everything allocated so far (modules, models) out of the GC's
+        # reach, so that collections in the workers do not write to (and
+        # thereby copy) the shared pages
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        logger.info(
+            f"Forking {self.workers} workers on {self.host}:{self.port} "
+            f"({self.threads_per_worker} torch threads each)")
+        for slot in range(self.workers):
+            self._spawn(slot, sock)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.children.pop(pid, None)
+            if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+                # Drop the live gauges of the dead worker from /metrics
+                from prometheus_client import multiprocess
+                multiprocess.mark_process_dead(pid)
+            if slot is None or self.stopping:
+                continue
+            logger.warning(
+                f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(1)
+            self._spawn(slot, sock)
+
+        sock.close()
+
+    def _spawn(self, slot: int, sock: socket.socket):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = slot
+            return
+
+        # Worker process
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        torch.set_num_threads(self.threads_per_worker)
+        if PIN_REPLICA_CORES and MODEL_REPLICAS > 1 and hasattr(os, "sched_setaffinity"):
+            # Replicas split the cores of their worker, which must then not
+            # be shared with the other workers
+            from app.services.replicas import split_cores
+            os.sched_setaffinity(0, split_cores(self.workers)[slot])
+
+        config = uvicorn.Config(self.app, log_config=None)
+        uvicorn.Server(config).run(sockets=[sock])
+        os._exit(0)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def preload(model_manager):
+    """
+    Load and warm up every model in the parent process.
+    """
+    from app.core.logging import logger
+
+    if model_manager.inference_workers is not None:
+        # The models run in the inference worker processes of each worker
+        logger.info("INFERENCE_MODE is process, not preloading the models")
+        return
+
+    non_torch = {name: backend.variant for name, backend in model_manager.backends().items()
+                 if backend.name != "torch"}
+    if non_torch:
+        # ONNX Runtime and OpenVINO start their thread pools when a session
+        # is created, and those threads do not survive a fork
+        logger.warning(
+            f"Not preloading {non_torch}: these runtimes are not fork-safe, "
+            "each worker will load its own copy")
+        return
+
+    if model_manager.device != "cpu":
+        raise RuntimeError(
+            "Preload-and-fork requires CPU inference: a CUDA context cannot be shared "
+            "with forked workers. Run uvicorn with --workers instead.")
+
+    # Warmup has to happen here as well: the first predict call fuses the
+    # Conv/BatchNorm layers, which would otherwise rewrite the weights (and
+    # un-share them) in every worker
+    if not MODEL_WARMUP:
+        logger.warning("MODEL_WARMUP is disabled, preloaded models will be fused in each worker")
+    model_manager.load()
+
+
+def clear_metrics_dir():
+    """
+    Remove the metric files of a previous run from PROMETHEUS_MULTIPROC_DIR,
+    before any metric is created.
+    """
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not metrics_dir:
+        return
+    os.makedirs(metrics_dir, exist_ok=True)
+    for entry in os.scandir(metrics_dir):
+        if entry.name.endswith(".db"):
+            os.remove(entry.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with models preloaded before forking")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--threads-per-worker", type=int, default=TORCH_THREADS_PER_WORKER,
+                        help="Torch intra-op threads per worker (default: cores / workers)")
+    args = parser.parse_args()
+
+    clear_metrics_dir()
+
+    # A single intra-op thread while preloading: an OpenMP pool started in the
+    # parent is not usable after fork, and the workers set their own count
+    torch.set_num_threads(1)
+
+    from app.main import app
+    from app.services.model_manager import model_manager
+
+    preload(model_manager)
+    PreforkLauncher(app, args.host, args.port, args.workers, args.threads_per_worker).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,34 +1,52 @@
+import asyncio
 from contextlib import asynccontextmanager
 import os
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 from app.api.v1.license_plate_detector.endpoints import router as v1_license_plate_detector
 from app.api.v1.vehicle_detector.endpoints import router as v1_vehicle_detector
 from app.api.v1.vehicle_damage_detection.endpoints import router as v1_vehicle_damage_detector
+from app.api.v1.analyze.endpoints import router as v1_analyze
+from app.api.v1.video.endpoints import router as v1_video
+from app.api.admin.endpoints import router as admin
+from app.api.v1.responses import TimedJSONResponse
+from app.core.metrics import ServiceCollector, register_service_collector, render_metrics
 from app.core.middleware import setup_middleware
 import torch
 from app.core.logging import configure_logger, logger
 from app.services.model_manager import model_manager
+from app.services.inference_executor import inference_executor
+from app.services.inference_cache import inference_cache
 # Import the lifespan context manager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Load models at startup
-    # This will call the method correctly
-    model_manager
+    # Load and warm up the models in the background, so that the server
+    # answers /health-check while /ready reports 503 until warmup is done
+    startup = asyncio.create_task(model_manager.start())
     yield
+    startup.cancel()
+    inference_executor.shutdown()
+    model_manager.shutdown()
+    # Flush the records still queued for the background log writer
+    await logger.complete()
 
 # Create FastAPI app instance and pass lifespan for startup/shutdown handling
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 
 configure_logger()
 # Set up middleware
 setup_middleware(app)
+register_service_collector(ServiceCollector(model_manager, inference_executor, inference_cache))
 
 # Include API routers
 app.include_router(v1_license_plate_detector, prefix="/api/v1")
 app.include_router(v1_vehicle_detector, prefix="/api/v1")
 app.include_router(v1_vehicle_damage_detector, prefix="/api/v1")
+app.include_router(v1_analyze, prefix="/api/v1")
+app.include_router(v1_video, prefix="/api/v1")
+app.include_router(admin, prefix="/admin", include_in_schema=False)
 
 
 @app.get("/health-check")
@@ -36,6 +54,13 @@ def home():
     return {"Health Check": "OK"}
 
 
+@app.get("/ready")
+async def ready():
+    # Readiness probe: only route traffic here once the models are warm
+    status = model_manager.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
 @app.get("/check-gpu")
 async def check_gpu(request: Request):
     user_id = getattr(request.state, 'user_id', None)
@@ -50,3 +75,24 @@ async def check_gpu(request: Request):
         return {"GPU Status": "Available", "Details": gpu_info}
     else:
         return {"GPU Status": "Not Available"}
+
+
+@app.get("/batching-stats")
+async def batching_stats():
+    return model_manager.scheduler_stats()
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return inference_cache.stats()
+
+
+@app.get("/preprocessing-stats")
+async def preprocessing_stats():
+    return model_manager.buffer_pool_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,148 @@
+# app/services/backends.py
+import os
+from ultralytics import YOLO
+from app.core.config import (
+    CALIBRATION_IMAGES_DIR, INFERENCE_BACKEND, MODEL_INPUT_SIZE, MODEL_PRECISION, QUANTIZATION_MODE)
+from app.core.logging import logger
+
+
+class InferenceBackend:
+    """
+    Runtime used to execute a YOLO model.
+
+    Every backend loads through ultralytics, which wraps exported graphs in the
+    same predictor, so `predict` returns identical `Results` objects whatever
+    runtime runs the forward pass.
+    """
+
+    name = None
+    export_format = None
+    supports_int8 = False
+
+    def __init__(self, precision: str = "fp32", quantization: str = QUANTIZATION_MODE):
+        if precision not in ("fp32", "int8"):
+            raise ValueError(f"Unknown model precision '{precision}', expected 'fp32' or 'int8'")
+        if precision == "int8" and not self.supports_int8:
+            raise ValueError(f"INT8 models are not supported by the {self.name} backend")
+        self.precision = precision
+        self.quantization = quantization
+
+    @property
+    def variant(self) -> str:
+        """
+        Identifies backend and precision, e.g. "onnx-int8-static".
+        """
+        if self.precision == "int8":
+            return f"{self.name}-int8-{self.quantization}"
+        return f"{self.name}-{self.precision}"
+
+    def artifact_path(self, weights_path: str) -> str:
+        """
+        Path of the model artifact this backend loads for the given .pt weights.
+        """
+        raise NotImplementedError
+
+    def export(self, weights_path: str) -> str:
+        """
+        Export the .pt weights for this backend, reusing a cached export that is
+        newer than the weights.
+        """
+        artifact = self.artifact_path(weights_path)
+        if os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(weights_path):
+            return artifact
+
+        logger.info(f"Exporting {weights_path} to {self.variant} at {artifact}")
+        exported = self._export(weights_path)
+        if os.path.abspath(str(exported)) != os.path.abspath(artifact):
+            raise RuntimeError(
+                f"Unexpected export location {exported}, expected {artifact}")
+        return artifact
+
+    def _export(self, weights_path: str) -> str:
+        # Dynamic axes so that the micro-batching scheduler can run real batches
+        return YOLO(weights_path).export(
+            format=self.export_format, imgsz=MODEL_INPUT_SIZE, dynamic=True)
+
+    def load(self, weights_path: str, device) -> YOLO:
+        return YOLO(self.export(weights_path), task="detect")
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def artifact_path(self, weights_path: str) -> str:
+        return weights_path
+
+    def export(self, weights_path: str) -> str:
+        return weights_path
+
+    def load(self, weights_path: str, device) -> YOLO:
+        model_instance = YOLO(weights_path)
+        model_instance.to(device)
+        return model_instance
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    name = "onnx"
+    export_format = "onnx"
+    supports_int8 = True
+
+    def artifact_path(self, weights_path: str) -> str:
+        if self.precision == "int8":
+            return os.path.splitext(weights_path)[0] + f".int8-{self.quantization}.onnx"
+        return os.path.splitext(weights_path)[0] + ".onnx"
+
+    def _export(self, weights_path: str) -> str:
+        if self.precision != "int8":
+            return super()._export(weights_path)
+
+        # Quantize the (cached) FP32 export
+        from app.services.quantization import quantize_onnx
+        fp32_path = OnnxRuntimeBackend().export(weights_path)
+        return quantize_onnx(
+            fp32_path, self.artifact_path(weights_path), self.quantization,
+            CALIBRATION_IMAGES_DIR, MODEL_INPUT_SIZE)
+
+
+class OpenVINOBackend(InferenceBackend):
+    name = "openvino"
+    export_format = "openvino"
+    supports_int8 = True
+
+    def __init__(self, precision: str = "fp32", quantization: str = QUANTIZATION_MODE):
+        super().__init__(precision, quantization)
+        if precision == "int8" and quantization != "static":
+            raise ValueError("OpenVINO INT8 models require QUANTIZATION_MODE=static")
+
+    def artifact_path(self, weights_path: str) -> str:
+        if self.precision == "int8":
+            return os.path.splitext(weights_path)[0] + "_int8_openvino_model"
+        return os.path.splitext(weights_path)[0] + "_openvino_model"
+
+    def _export(self, weights_path: str) -> str:
+        if self.precision != "int8":
+            return super()._export(weights_path)
+
+        # NNCF post-training quantization, calibrated on the sample images
+        from app.services.quantization import calibration_dataset_yaml
+        model = YOLO(weights_path)
+        data = calibration_dataset_yaml(CALIBRATION_IMAGES_DIR, model.names)
+        try:
+            return model.export(
+                format=self.export_format, imgsz=MODEL_INPUT_SIZE, dynamic=True,
+                int8=True, data=data)
+        finally:
+            os.remove(data)
+
+
+BACKENDS = {
+    backend.name: backend for backend in (TorchBackend, OnnxRuntimeBackend, OpenVINOBackend)
+}
+
+
+def get_backend(name: str = INFERENCE_BACKEND, precision: str = MODEL_PRECISION,
+                quantization: str = QUANTIZATION_MODE) -> InferenceBackend:
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](precision=precision, quantization=quantization)
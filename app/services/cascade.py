@@ -0,0 +1,106 @@
+# app/services/cascade.py
+import asyncio
+from typing import Optional, Tuple
+import numpy as np
+from app.core.config import (
+    CASCADE_CROP_PADDING, CASCADE_DETECT_SIZE, CASCADE_MAX_CROPS, CASCADE_MIN_CROP_SIZE,
+    CASCADE_NMS_IOU)
+from app.services.inference_executor import inference_executor
+from app.utils.detections import (
+    DetectionArrays, concat_arrays, non_max_suppression, scale_boxes, select_labels)
+from app.utils.helper import resize_long_side
+
+
+def crop_regions(boxes: np.ndarray, confs: np.ndarray, width: int, height: int,
+                 padding: float = CASCADE_CROP_PADDING, max_crops: int = CASCADE_MAX_CROPS,
+                 min_size: int = CASCADE_MIN_CROP_SIZE) -> np.ndarray:
+    """
+    Turn vehicle boxes into padded, clipped integer crop regions.
+    Args:
+        boxes (np.ndarray): (N, 4) vehicle boxes in full-resolution xyxy coordinates.
+        confs (np.ndarray): (N,) vehicle confidences, used to keep the best `max_crops`.
+        width (int): Image width.
+        height (int): Image height.
+    Returns:
+        np.ndarray: (K, 4) int crop regions, most confident vehicle first.
+    """
+    order = np.argsort(-confs, kind="stable")[:max_crops]
+    boxes = boxes[order]
+
+    # Context around the vehicle: plates and bumpers sit at the box edges
+    pad = (boxes[:, 2:] - boxes[:, :2]) * padding
+    regions = np.concatenate([boxes[:, :2] - pad, boxes[:, 2:] + pad], axis=1)
+    regions = np.clip(np.round(regions), 0, [width, height, width, height]).astype(np.intp)
+
+    sizes = regions[:, 2:] - regions[:, :2]
+    return regions[(sizes >= min_size).all(axis=1)]
+
+
+async def run_cascade(image: np.ndarray, vehicle_scheduler, plate_class_ids, vehicle_class_ids,
+                      damage_scheduler=None, damage_class_ids=None,
+                      detect_size: int = CASCADE_DETECT_SIZE
+                      ) -> Tuple[DetectionArrays, Optional[DetectionArrays]]:
+    """
+    Detect vehicles on a downscaled frame, then plates and damage on
+    full-resolution crops of the vehicles.
+
+    The plate model detects both vehicles and plates, so it serves the first
+    stage as well. All crops are submitted together and run as model batches.
+    Plates found in the first stage are kept as well, and duplicates from
+    overlapping crops are removed with class-aware NMS. When no vehicle is
+    found (e.g. a close-up of a dent), damage is detected on the whole
+    downscaled frame instead.
+    Args:
+        image (np.ndarray): The full-resolution RGB image.
+        vehicle_scheduler: Batching scheduler of the plate/vehicle model.
+        plate_class_ids: Plate class ids of that model, or None to skip plates.
+        vehicle_class_ids: Vehicle class ids of that model.
+        damage_scheduler: Batching scheduler of the damage model, or None to skip damage.
+        damage_class_ids: Damage class ids of the damage model.
+        detect_size (int): Long side of the frame used for the vehicle stage.
+    Returns:
+        Tuple[DetectionArrays, Optional[DetectionArrays]]: Plate/vehicle model
+        detections (vehicles from the first stage, plates from all stages) and
+        damage detections, in full-resolution coordinates.
+    """
+    height, width = image.shape[:2]
+    small, scale = await inference_executor.run(resize_long_side, image, detect_size)
+    first_stage = scale_boxes(await vehicle_scheduler.submit(small), scale)
+
+    vehicles = select_labels(first_stage, vehicle_class_ids)
+    regions = crop_regions(vehicles[0], vehicles[1], width, height)
+
+    if not len(regions):
+        damage = None
+        if damage_scheduler is not None:
+            damage = select_labels(
+                scale_boxes(await damage_scheduler.submit(small), scale), damage_class_ids)
+        return first_stage, damage
+
+    # Views into the full image, no copies
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+    offsets = np.concatenate([regions[:, :2], regions[:, :2]], axis=1)
+
+    async def detect_crops(scheduler, class_ids):
+        results = await asyncio.gather(*(scheduler.submit(crop) for crop in crops))
+        shifted = [(boxes + offset.astype(boxes.dtype), confs, labels)
+                   for (boxes, confs, labels), offset in zip(results, offsets)]
+        return select_labels(concat_arrays(*shifted), class_ids)
+
+    crop_plates, crop_damage = await asyncio.gather(
+        detect_crops(vehicle_scheduler, plate_class_ids) if plate_class_ids is not None
+        else _skipped(),
+        detect_crops(damage_scheduler, damage_class_ids) if damage_scheduler is not None
+        else _skipped(),
+    )
+
+    if crop_plates is not None:
+        plates = non_max_suppression(concat_arrays(
+            select_labels(first_stage, plate_class_ids), crop_plates), CASCADE_NMS_IOU)
+        vehicles = concat_arrays(vehicles, plates)
+    damage = non_max_suppression(crop_damage, CASCADE_NMS_IOU) if crop_damage is not None else None
+    return vehicles, damage
+
+
+async def _skipped():
+    return None
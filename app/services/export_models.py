@@ -0,0 +1,32 @@
+# app/services/export_models.py
+# Export the .pt weights for the ONNX Runtime / OpenVINO backends.
+#
+# Usage (from the repository root):
+#   python -m app.services.export_models --backend onnx --backend openvino
+#   python -m app.services.export_models --backend onnx --precision int8
+import argparse
+from app.core.config import LICENCE_PLATE_MODEL_PATH, VEHICLE_DAMAGE_MODEL_PATH
+from app.core.logging import configure_logger, logger
+from app.services.backends import BACKENDS, get_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the detector weights for non-PyTorch inference backends")
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS),
+                        help="Backend to export for (repeatable, default: onnx)")
+    parser.add_argument("--precision", choices=("fp32", "int8"), default="fp32",
+                        help="Model precision (int8 uses QUANTIZATION_MODE and "
+                             "CALIBRATION_IMAGES_DIR, default: fp32)")
+    args = parser.parse_args()
+
+    configure_logger()
+    for name in args.backend or ["onnx"]:
+        backend = get_backend(name, precision=args.precision)
+        for weights_path in (LICENCE_PLATE_MODEL_PATH, VEHICLE_DAMAGE_MODEL_PATH):
+            artifact = backend.export(weights_path)
+            logger.info(f"{backend.variant}: {weights_path} -> {artifact}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# app/services/inference_cache.py
+import asyncio
+from collections import OrderedDict
+import hashlib
+import time
+from app.core.config import (
+    INFERENCE_CACHE_MAX_ENTRIES, INFERENCE_CACHE_MAX_MB, INFERENCE_CACHE_TTL_SECONDS)
+from app.core.scheduling import (
+    DeadlineExceededError, SharedSchedule, current_schedule, set_request_schedule)
+from app.utils.detections import DetectionArrays, arrays_nbytes, freeze_arrays
+
+# Rough per-entry bookkeeping overhead (key, tuple, array headers)
+ENTRY_OVERHEAD_BYTES = 512
+
+
+def image_digest(image_bytes: bytes) -> str:
+    """
+    Content hash of the encoded image bytes.
+    """
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def make_cache_key(digest: str, model_id: str) -> str:
+    """
+    Build a cache key from the digest of the encoded image and the model
+    identity (weights and backend). The other inputs of the result (input
+    size, decoding, thresholds) are fixed per process, and so per cache.
+    """
+    return f"{model_id}|{digest}"
+
+
+class InferenceCache:
+    """
+    LRU cache of detection arrays with a TTL and a memory cap.
+
+    Concurrent lookups for a key that is still being computed are coalesced:
+    only the first caller runs the inference and every other caller awaits
+    the same result.
+    """
+
+    def __init__(self, max_entries: int = INFERENCE_CACHE_MAX_ENTRIES,
+                 max_mb: float = INFERENCE_CACHE_MAX_MB,
+                 ttl_seconds: float = INFERENCE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_seconds
+
+        # key -> (expires_at, arrays, size)
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    async def get_or_compute(self, key: str, compute) -> DetectionArrays:
+        """
+        Return the cached arrays for `key`, or run `compute()` (a coroutine
+        function) once and cache its result.
+        """
+        if not self.enabled:
+            return await compute()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, arrays, size = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return arrays
+            self._remove(key)
+            self._expirations += 1
+
+        schedule = current_schedule()
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._coalesced += 1
+            task, shared = in_flight
+            shared.join(schedule)
+        else:
+            self._misses += 1
+            # Run the computation as its own task so that a caller going away
+            # does not cancel the result the other waiters depend on. It is
+            # queued with the highest priority and latest deadline of its
+            # waiters, not those of the first caller.
+            shared = SharedSchedule(schedule)
+            task = asyncio.ensure_future(self._compute(compute, shared))
+            self._in_flight[key] = (task, shared)
+            task.add_done_callback(lambda t: self._on_computed(key, t))
+
+        # Each waiter still gives up at its own deadline
+        remaining = schedule.remaining() if schedule is not None else None
+        if remaining is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError() from None
+
+    @staticmethod
+    async def _compute(compute, schedule: SharedSchedule) -> DetectionArrays:
+        # The task runs in a copy of the caller's context
+        set_request_schedule(schedule)
+        return await compute()
+
+    def _on_computed(self, key: str, task: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._store(key, freeze_arrays(task.result()))
+
+    def _store(self, key: str, arrays: DetectionArrays):
+        size = arrays_nbytes(arrays) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, arrays, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "in_flight": len(self._in_flight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
+
+
+# Singleton instance of InferenceCache
+inference_cache = InferenceCache()
@@ -0,0 +1,90 @@
+# app/services/inference_executor.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import functools
+from app.core.config import INFERENCE_THREADS, MAX_IN_FLIGHT_REQUESTS, RETRY_AFTER_SECONDS
+from app.core.logging import logger
+
+
+class ExecutorSaturatedError(Exception):
+    """
+    Raised when every in-flight slot is taken and a request must be rejected.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, retry later")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Run CPU-bound decoding and inference off the event loop.
+
+    Work is executed on a dedicated thread pool so that slow images never block
+    the event loop (and with it `/health-check`). Admission is bounded by a fixed
+    number of in-flight slots: once they are all taken, new requests fail fast
+    with `ExecutorSaturatedError` instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_THREADS,
+                 max_in_flight: int = MAX_IN_FLIGHT_REQUESTS,
+                 retry_after: int = RETRY_AFTER_SECONDS):
+        self.max_workers = max(1, max_workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="inference")
+        self._in_flight = 0
+        self._rejected = 0
+
+    @contextmanager
+    def admit(self, weight: int = 1):
+        """
+        Reserve in-flight slots for the duration of a request. A request
+        carrying several images takes one slot per image (capped at the
+        total, so that any request can eventually be admitted).
+
+        Only ever called from the event loop thread, so no lock is needed.
+        """
+        weight = self._weight(weight)
+        if not self.has_capacity(weight):
+            self._rejected += 1
+            logger.warning(
+                f"Inference executor saturated ({self._in_flight}/{self.max_in_flight} in flight)")
+            raise ExecutorSaturatedError(self.retry_after)
+
+        self._in_flight += weight
+        try:
+            yield
+        finally:
+            self._in_flight -= weight
+
+    def has_capacity(self, weight: int = 1) -> bool:
+        return self._in_flight + self._weight(weight) <= self.max_in_flight
+
+    def _weight(self, weight: int) -> int:
+        return min(max(1, weight), self.max_in_flight)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking function on the inference thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "threads": self.max_workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton instance of InferenceExecutor
+inference_executor = InferenceExecutor()
@@ -0,0 +1,502 @@
+# app/services/inference_workers.py
+# Out-of-process inference.
+#
+# With INFERENCE_MODE=process the models run in dedicated worker processes, so
+# that HTTP handling, decoding and postprocessing in the API process no longer
+# share a GIL with the models. For each batch, the API process copies the
+# decoded images into a shared memory segment and sends the worker a small
+# message describing where they are. The worker runs the model on arrays
+# viewing the segment, without pickling the images, and sends back the
+# detection arrays. Every worker has one duplex pipe, read by the event loop.
+import asyncio
+from collections import OrderedDict
+import itertools
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import signal
+import time
+from typing import List
+import numpy as np
+import torch
+from app.core.config import (
+    INFERENCE_WORKER_RESTART_SECONDS, INFERENCE_WORKER_THREADS, INFERENCE_WORKERS, PIN_REPLICA_CORES)
+from app.core.logging import configure_logger, logger
+from app.services.inference_executor import inference_executor
+from app.services.replicas import available_cores, split_cores
+
+# Shared memory segments are allocated in whole megabytes, so that they can
+# be reused by batches of slightly different sizes
+SEGMENT_GRANULARITY = 1 << 20
+# Offsets of the images in a segment
+IMAGE_ALIGNMENT = 64
+# Upper bound of the delay between restarts of a failing worker
+MAX_RESTART_SECONDS = 60
+
+
+class InferenceWorkerError(RuntimeError):
+    """
+    Raised for work that an inference worker could not do: the worker exited,
+    no worker is running, or the model raised (with the worker's message).
+    """
+
+
+class InferenceWorkersUnavailableError(InferenceWorkerError):
+    """
+    Raised when no worker is running, while they are being restarted. Like a
+    saturated executor, a temporary condition: retry after `retry_after` seconds.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("No inference worker is running, retry later")
+        self.retry_after = retry_after
+
+
+def _aligned(size: int) -> int:
+    return -(-size // IMAGE_ALIGNMENT) * IMAGE_ALIGNMENT
+
+
+def images_nbytes(images: List[np.ndarray]) -> int:
+    return sum(_aligned(image.nbytes) for image in images)
+
+
+def write_images(buffer, images: List[np.ndarray]) -> list:
+    """
+    Copy images into `buffer` one after the other.
+    Returns:
+        list: The (offset, shape, dtype) of each image, for `read_images`.
+    """
+    layout, offset = [], 0
+    for image in images:
+        np.copyto(np.ndarray(image.shape, image.dtype, buffer=buffer, offset=offset), image)
+        layout.append((offset, image.shape, image.dtype.str))
+        offset += _aligned(image.nbytes)
+    return layout
+
+
+def read_images(buffer, layout: list) -> List[np.ndarray]:
+    """
+    Views of the images written by `write_images`.
+    """
+    return [np.ndarray(shape, dtype, buffer=buffer, offset=offset) for offset, shape, dtype in layout]
+
+
+def _close(segment: shared_memory.SharedMemory):
+    try:
+        segment.close()
+    except BufferError:
+        # An array still views the segment: the mapping goes with it
+        pass
+
+
+class SharedImageBuffers:
+    """
+    Shared memory segments carrying batches of images to the workers. Only
+    used from the event loop thread.
+
+    A batch takes the smallest free segment that fits, or a new one. At most
+    `max_free` free segments are kept, the smallest are unlinked first.
+    """
+
+    def __init__(self, max_free: int):
+        self.max_free = max(1, max_free)
+        self._segments = {}
+        self._free = []
+        self._created = 0
+
+    def acquire(self, nbytes: int) -> shared_memory.SharedMemory:
+        fits = [segment for segment in self._free if segment.size >= nbytes]
+        if fits:
+            segment = min(fits, key=lambda s: s.size)
+            self._free.remove(segment)
+            return segment
+
+        size = max(1, -(-nbytes // SEGMENT_GRANULARITY)) * SEGMENT_GRANULARITY
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        self._segments[segment.name] = segment
+        self._created += 1
+        return segment
+
+    def release(self, segment: shared_memory.SharedMemory):
+        self._free.append(segment)
+        if len(self._free) > self.max_free:
+            smallest = min(self._free, key=lambda s: s.size)
+            self._free.remove(smallest)
+            self._destroy(smallest)
+
+    def _destroy(self, segment: shared_memory.SharedMemory):
+        del self._segments[segment.name]
+        _close(segment)
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "segments": len(self._segments),
+            "free": len(self._free),
+            "created": self._created,
+            "bytes": sum(segment.size for segment in self._segments.values()),
+        }
+
+    def close(self):
+        for segment in list(self._segments.values()):
+            self._destroy(segment)
+        self._free.clear()
+
+
+class InferenceWorker:
+    """
+    The API-side state of one worker process.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.error = None
+        # Job id -> (future, shared memory segment or None)
+        self.pending = {}
+        self.batches = 0
+        self.restarts = 0
+        self.failures = 0
+        self.started_at = None
+        # Monotonic time at which the exited process is started again
+        self.restart_at = None
+        # Resolved once the first process has loaded its models
+        self.started = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": self.process.pid if self.process is not None else None,
+            "ready": self.ready,
+            "in_flight": len(self.pending),
+            "batches": self.batches,
+            "restarts": self.restarts,
+            "uptime_seconds": time.monotonic() - self.started_at if self.ready else 0.0,
+        }
+
+
+class InferenceWorkerPool:
+    """
+    `size` worker processes, each running every model.
+
+    Batches go to the ready worker with the fewest batches in flight. When a
+    worker exits, the batches it was running fail with `InferenceWorkerError`
+    and the worker is started again, while the other workers keep serving.
+    All methods except `shutdown` must be called from the event loop thread.
+    """
+
+    def __init__(self, size: int = INFERENCE_WORKERS, threads: int = INFERENCE_WORKER_THREADS,
+                 restart_seconds: float = INFERENCE_WORKER_RESTART_SECONDS,
+                 pin_cores: bool = PIN_REPLICA_CORES, target=None):
+        self.size = max(1, size)
+        # Entry point of the worker processes (an importable function)
+        self.target = target or worker_main
+        self.threads = threads or max(1, len(available_cores()) // self.size)
+        self.restart_seconds = max(0.0, restart_seconds)
+        self.pin_cores = pin_cores and self.size > 1 and hasattr(os, "sched_setaffinity")
+        self.workers = [InferenceWorker(index) for index in range(self.size)]
+        self.buffers = SharedImageBuffers(max_free=2 * self.size)
+        # Class names and load timings of each model, as reported by the workers
+        self.labels = {}
+        self.model_timings = {}
+        # Spawned, not forked: the API process already runs threads
+        self._context = multiprocessing.get_context("spawn")
+        self._job_ids = itertools.count()
+        self._loop = None
+        self._stopping = False
+
+    @property
+    def ready(self) -> bool:
+        return any(worker.ready for worker in self.workers)
+
+    async def start(self):
+        """
+        Start the workers and wait until each has loaded its models.
+        """
+        self._loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            worker.started = self._loop.create_future()
+            self._start_worker(worker)
+        await asyncio.gather(*(worker.started for worker in self.workers))
+        logger.info(f"Started {self.size} inference workers ({self.threads} torch threads each)")
+
+    def _start_worker(self, worker: InferenceWorker):
+        if self._stopping:
+            return
+        cores = split_cores(self.size)[worker.index] if self.pin_cores else None
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=self.target, args=(child_conn, worker.index, self.threads, cores),
+            name=f"inference-worker-{worker.index}", daemon=True)
+        process.start()
+        child_conn.close()
+
+        worker.process, worker.conn = process, conn
+        worker.ready, worker.error = False, None
+        worker.started_at, worker.restart_at = time.monotonic(), None
+        self._loop.add_reader(conn.fileno(), self._receive, worker)
+        self._loop.add_reader(process.sentinel, self._exited, worker)
+
+    def _receive(self, worker: InferenceWorker):
+        try:
+            message = worker.conn.recv()
+        except (EOFError, OSError):
+            self._exited(worker)
+            return
+
+        kind = message[0]
+        if kind in ("result", "error"):
+            _, job_id, payload = message
+            future, segment = worker.pending.pop(job_id, (None, None))
+            if segment is not None:
+                self.buffers.release(segment)
+            worker.batches += 1
+            if future is None or future.done():
+                return
+            if kind == "result":
+                future.set_result(payload)
+            else:
+                future.set_exception(InferenceWorkerError(payload))
+        elif kind == "loaded":
+            _, name, labels, timings = message
+            self.labels[name] = labels
+            self.model_timings[name] = timings
+        elif kind == "ready":
+            worker.ready, worker.failures = True, 0
+            worker.started_at = time.monotonic()
+            logger.info(f"Inference worker {worker.index} (pid {worker.process.pid}) is ready")
+            if not worker.started.done():
+                worker.started.set_result(None)
+        elif kind == "failed":
+            worker.error = message[1]
+
+    def _exited(self, worker: InferenceWorker):
+        process = worker.process
+        if process is None:
+            # Already handled: the pipe and the sentinel both report an exit
+            return
+        self._loop.remove_reader(worker.conn.fileno())
+        self._loop.remove_reader(process.sentinel)
+        worker.conn.close()
+        process.join(timeout=1)
+        if process.exitcode is None:
+            # Closed its pipe without exiting: it cannot be used any more
+            process.kill()
+            process.join()
+        exitcode = process.exitcode
+        process.close()
+        was_ready = worker.ready
+        worker.process, worker.conn, worker.ready = None, None, False
+
+        message = f"Inference worker {worker.index} exited with code {exitcode}"
+        error = InferenceWorkerError(f"{message}: {worker.error}" if worker.error else message)
+        pending = list(worker.pending.values())
+        worker.pending.clear()
+        for future, segment in pending:
+            if segment is not None:
+                self.buffers.release(segment)
+            if not future.done():
+                future.set_exception(error)
+
+        if self._stopping:
+            return
+        if not worker.started.done():
+            # Failed before loading its models: the service cannot start
+            worker.started.set_exception(error)
+            return
+
+        worker.failures = 0 if was_ready else worker.failures + 1
+        worker.restarts += 1
+        delay = min(MAX_RESTART_SECONDS, self.restart_seconds * 2 ** worker.failures)
+        logger.error(f"{error}, {len(pending)} batches failed, restarting it in {delay:g}s")
+        worker.restart_at = time.monotonic() + delay
+        self._loop.call_later(delay, self._start_worker, worker)
+
+    def _pick(self) -> InferenceWorker:
+        running = [worker for worker in self.workers if worker.process is not None]
+        if not running:
+            restarts = [worker.restart_at for worker in self.workers if worker.restart_at is not None]
+            wait = min(restarts) - time.monotonic() if restarts else self.restart_seconds
+            raise InferenceWorkersUnavailableError(max(1, math.ceil(wait)))
+        # A restarting worker queues work until it is ready, so it is only
+        # picked when no ready worker is left
+        return min(running, key=lambda w: (not w.ready, len(w.pending), w.batches))
+
+    async def _call(self, request: tuple, segment: shared_memory.SharedMemory = None):
+        """
+        Send a request to a worker and wait for its result. The worker owns
+        `segment` until it answers or exits.
+        """
+        try:
+            worker = self._pick()
+        except InferenceWorkerError:
+            if segment is not None:
+                self.buffers.release(segment)
+            raise
+
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        worker.pending[job_id] = (future, segment)
+        kind, *args = request
+        try:
+            worker.conn.send((kind, job_id, *args))
+        except OSError as e:
+            # The exit is handled (and the segment released) by `_exited`
+            worker.pending.pop(job_id, None)
+            if segment is not None:
+                self.buffers.release(segment)
+            raise InferenceWorkerError(f"Inference worker {worker.index} is not reachable: {e}")
+        return await future
+
+    async def predict(self, name: str, images: List[np.ndarray]) -> tuple:
+        """
+        Run a model on a batch of images in a worker.
+        Returns:
+            tuple: The detection arrays of each image, and the seconds spent
+            in each stage.
+        """
+        segment = self.buffers.acquire(images_nbytes(images))
+        try:
+            layout = await inference_executor.run(write_images, segment.buf, images)
+        except BaseException:
+            self.buffers.release(segment)
+            raise
+        return await self._call(("predict", name, segment.name, layout), segment)
+
+    async def load_labels(self, name: str) -> dict:
+        """
+        Class names of a model, loading it in a worker first if needed.
+        """
+        if name not in self.labels:
+            self.labels[name] = await self._call(("load", name))
+        return self.labels[name]
+
+    def stats(self) -> dict:
+        return {
+            "workers": [worker.stats() for worker in self.workers],
+            "threads": self.threads,
+            "shared_memory": self.buffers.stats(),
+        }
+
+    def shutdown(self):
+        """
+        Stop the workers, then release their pipes, process handles and the
+        shared memory segments, including those of batches still in flight.
+        Blocking.
+        """
+        self._stopping = True
+        running = [worker for worker in self.workers if worker.process is not None]
+        for worker in running:
+            self._loop.remove_reader(worker.conn.fileno())
+            self._loop.remove_reader(worker.process.sentinel)
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in running:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+
+        # Only once every worker has exited, so that none still maps a segment
+        for worker in running:
+            worker.conn.close()
+            worker.process.close()
+            worker.process, worker.conn, worker.ready = None, None, False
+        for worker in self.workers:
+            for future, _ in worker.pending.values():
+                if not future.done():
+                    future.set_exception(InferenceWorkerError("Inference workers are shutting down"))
+            worker.pending.clear()
+        self.buffers.close()
+
+
+def _attach(segments: OrderedDict, name: str, limit: int) -> shared_memory.SharedMemory:
+    """
+    Map a segment of the API process, keeping the `limit` most recently used
+    mappings open.
+    """
+    segment = segments.pop(name, None)
+    if segment is None:
+        segment = shared_memory.SharedMemory(name=name)
+    segments[name] = segment
+    while len(segments) > limit:
+        _close(segments.popitem(last=False)[1])
+    return segment
+
+
+def worker_main(conn, index: int, threads: int, cores: list = None):
+    """
+    Entry point of a worker process: load the models, then answer requests
+    until the API process closes the pipe or sends None.
+    """
+    # Ctrl+C reaches the whole process group: let the API process stop us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The locks of the log queues are registered with the resource tracker
+    # shared with the API process, unless created by the fork context, which
+    # unlinks them right away. A killed worker then leaves none behind.
+    configure_logger(context="fork")
+    if cores is not None:
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            logger.warning(f"Could not pin inference worker {index} to cores {cores}: {e}")
+    torch.set_num_threads(threads)
+
+    # Imported here: the model manager creates the pool of the API process
+    from app.services.model_manager import ModelManager
+    manager = ModelManager(mode="thread", replicas=1)
+    reported = set()
+
+    def report_loaded():
+        status = manager.status()["models"]
+        for name, model in status.items():
+            if model["loaded"] and name not in reported:
+                timings = {key: value for key, value in model.items() if key.endswith("_seconds")}
+                conn.send(("loaded", name, manager.get_model(name).model.names, timings))
+                reported.add(name)
+
+    try:
+        manager.load()
+        report_loaded()
+    except Exception as e:
+        logger.exception(f"Inference worker {index} could not load the models: {e}")
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready",))
+
+    # Each segment of the API's pool may be mapped once
+    segments = OrderedDict()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        kind, job_id, name, *args = message
+        try:
+            if kind == "load":
+                result = manager.get_model(name).model.names
+            else:
+                segment_name, layout = args
+                segment = _attach(segments, segment_name, limit=2 * INFERENCE_WORKERS + 2)
+                result = manager.predict(name, read_images(segment.buf, layout))
+            # A lazily loaded model was loaded by this request
+            report_loaded()
+            conn.send(("result", job_id, result))
+        except Exception as e:
+            logger.exception(f"Inference failed in worker {index}: {e}")
+            conn.send(("error", job_id, f"{type(e).__name__}: {e}"))
+
+    for segment in segments.values():
+        _close(segment)
+    # Flush and stop the background log writer, releasing its queue
+    logger.remove()
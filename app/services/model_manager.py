@@ -1,30 +1,526 @@
 # FILE: app/services/model_manager.py
+import asyncio
+import functools
+import heapq
+import itertools
+import threading
+import time
+import numpy as np
 import torch
+from app.core.config import (
+    BATCH_MAX_SIZE, BATCH_WINDOW_MS, DEADLINE_SHEDDING, DEFAULT_REQUEST_PRIORITY, INFERENCE_MODE, LAZY_MODELS, LICENCE_PLATE_MODEL_PATH,
+    LICENCE_PLATE_MODEL_PRECISION, MODEL_REPLICAS, MODEL_WARMUP, POOLED_PREPROCESSING,
+    VEHICLE_DAMAGE_MODEL_PATH, VEHICLE_DAMAGE_MODEL_PRECISION, WARMUP_INPUT_SIZES, WARMUP_ITERATIONS)
+from app.core.logging import logger
+from app.core.metrics import (
+    BATCH_QUEUE_SECONDS, DEADLINE_DROPS, SERVER_TIMING_MODEL_STAGES, add_server_timing, observe_batch,
+    ultralytics_stage_seconds)
+from app.core.scheduling import DeadlineExceededError, SharedSchedule, current_schedule
+from app.services.backends import get_backend
+from app.services.inference_executor import inference_executor
+from app.services.inference_workers import InferenceWorkerPool
+from app.services.preprocessing import LetterboxBufferPool, predict_pooled
+from app.services.replicas import ReplicaPool
 from app.services.yolo_plate_detector import YOLOLicensePlateDetector
 from app.services.vehicle_damage_yolo8 import YOLOVehicleDamageDetector
+from app.utils.detections import result_to_arrays
+
+
+class BatchScheduler:
+    """
+    Collect single-image inference requests into micro-batches.
+
+    Requests that arrive within `batch_window_ms` of the first queued request
+    are grouped (up to `max_batch_size` images) and run as one batched
+    `predict` call. Each caller receives the result for its own image.
+
+    `run` executes `predict_batch` off the event loop (by default on the
+    inference executor), with up to `concurrency` batches at a time. While
+    they are all running, new requests keep queueing and form the next batch.
+    It returns the results of the batch and the seconds spent in each stage
+    of it, which are reported in the Server-Timing of every caller.
+
+    The queue is ordered by the priority of the caller's request, then by
+    arrival. Images whose request deadline has passed, or would pass before
+    the batch is expected to finish, fail with `DeadlineExceededError` instead
+    of being run.
+    """
+
+    def __init__(self, predict_batch, max_batch_size: int = BATCH_MAX_SIZE,
+                 batch_window_ms: float = BATCH_WINDOW_MS, name: str = "model",
+                 model_id: str = None, run=None, concurrency: int = 1):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = max(0.0, batch_window_ms) / 1000
+        self.name = name
+        # Identifies the model weights, e.g. for inference cache keys
+        self.model_id = model_id or name
+        self.run = run or inference_executor.run
+        self.concurrency = max(1, concurrency)
+
+        # Created lazily on first submit so the scheduler binds to the
+        # event loop that is actually serving requests. The queue is a heap of
+        # (-priority, sequence, item).
+        self._queue = None
+        self._queued = None
+        self._sequence = itertools.count()
+        self._worker = None
+        self._slots = None
+        self._running = set()
+        # Moving average of the batch run time, the expected time to
+        # finish a batch when deciding whether to shed an image
+        self._batch_seconds = 0.0
+        self._dropped = {"expired": 0, "shed": 0}
+
+        self._batches = 0
+        self._images = 0
+        self._max_batch_seen = 0
+        self._batch_size_counts = {}
+
+    async def submit(self, image):
+        """
+        Queue an image for inference, with the priority and deadline of the
+        current request, and wait for its result.
+        """
+        loop = asyncio.get_running_loop()
+        self._ensure_worker()
+
+        schedule = current_schedule()
+        priority = schedule.priority if schedule is not None else DEFAULT_REQUEST_PRIORITY
+        if schedule is not None and schedule.deadline is not None and time.monotonic() >= schedule.deadline:
+            self._drop("expired")
+            raise DeadlineExceededError()
+        if isinstance(schedule, SharedSchedule):
+            # Requests joining a shared inference may raise its priority
+            # while it is queued
+            schedule.watch(self._reprioritize)
+
+        future = loop.create_future()
+        queued_at = loop.time()
+        # Filled by the worker with the start, end and stage timings of the batch
+        batch_timing = {}
+        heapq.heappush(self._queue, (-priority, next(self._sequence),
+                                     (image, future, queued_at, batch_timing, schedule)))
+        self._queued.set()
+        result = await future
+        if batch_timing:
+            add_server_timing("queue", batch_timing["started"] - queued_at)
+            if batch_timing["stages"]:
+                for stage_name, seconds in batch_timing["stages"].items():
+                    add_server_timing(SERVER_TIMING_MODEL_STAGES.get(stage_name, stage_name), seconds)
+            else:
+                add_server_timing("model", batch_timing["finished"] - batch_timing["started"])
+        return result
+
+    def _reprioritize(self):
+        """
+        Re-sort the queue with the current priorities of its requests.
+        """
+        if not self._queue:
+            return
+        self._queue = [
+            (-(item[4].priority if item[4] is not None else DEFAULT_REQUEST_PRIORITY), sequence, item)
+            for _, sequence, item in self._queue
+        ]
+        heapq.heapify(self._queue)
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = []
+            self._queued = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        while not self._queue:
+            self._queued.clear()
+            await self._queued.wait()
+        batch = [heapq.heappop(self._queue)[2]]
+        deadline = loop.time() + self.batch_window
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already waiting, highest priority first,
+            # before considering the window
+            if self._queue:
+                batch.append(heapq.heappop(self._queue)[2])
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            self._queued.clear()
+            try:
+                await asyncio.wait_for(self._queued.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    def _servable(self, batch: list) -> list:
+        """
+        Leave out callers that gave up (e.g. client disconnected) while
+        queued, and fail images that would miss their deadline.
+        """
+        now = time.monotonic()
+        servable = []
+        for item in batch:
+            future, schedule = item[1], item[4]
+            # Read at dispatch, a shared schedule may have been extended
+            deadline = schedule.deadline if schedule is not None else None
+            if future.cancelled():
+                continue
+            if deadline is not None and now >= deadline:
+                self._drop("expired")
+                future.set_exception(DeadlineExceededError())
+            elif deadline is not None and DEADLINE_SHEDDING and now + self._batch_seconds > deadline:
+                self._drop("shed")
+                future.set_exception(DeadlineExceededError(
+                    "Request deadline would pass before inference finishes"))
+            else:
+                servable.append(item)
+        return servable
+
+    def _drop(self, reason: str):
+        self._dropped[reason] += 1
+        DEADLINE_DROPS.labels(self.name, reason).inc()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Only collect a batch once it can start right away
+            await self._slots.acquire()
+            batch = self._servable(await self._collect_batch())
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = loop.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _run_batch(self, batch: list):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _, _, queued_at, _, _ in batch:
+            BATCH_QUEUE_SECONDS.labels(self.name).observe(started - queued_at)
+
+        images = [image for image, _, _, _, _ in batch]
+        self._record_batch(len(images))
+
+        try:
+            results, stage_seconds = await self.run(self.predict_batch, images)
+        except Exception as e:
+            logger.error(f"Batched inference failed for {self.name}: {e}")
+            for _, future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        finished = loop.time()
+        duration = finished - started
+        self._batch_seconds = duration if not self._batch_seconds else 0.8 * self._batch_seconds + 0.2 * duration
+        for (_, future, _, batch_timing, _), result in zip(batch, results):
+            batch_timing.update(started=started, finished=finished, stages=stage_seconds)
+            if not future.done():
+                future.set_result(result)
+
+    def _record_batch(self, size: int):
+        self._batches += 1
+        self._images += size
+        self._max_batch_seen = max(self._max_batch_seen, size)
+        self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._queue) if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "batch_window_ms": self.batch_window * 1000,
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "batches": self._batches,
+            "images": self._images,
+            "avg_batch_size": self._images / self._batches if self._batches else 0.0,
+            "max_batch_size_seen": self._max_batch_seen,
+            "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+            "expected_batch_seconds": self._batch_seconds,
+            "expired": self._dropped["expired"],
+            "shed": self._dropped["shed"],
+        }
 
 
 class ModelManager:
-    def __init__(self):
+    """
+    Own the detectors and their batching schedulers.
+
+    Creating the manager is cheap: models are only loaded by `load()` (called
+    from the application lifespan) or, for models listed in `LAZY_MODELS`, on
+    their first inference. `ready` turns true once every eagerly loaded model
+    has been loaded and warmed up.
+
+    In "process" mode the models are loaded and run by inference worker
+    processes instead, each holding its own "thread" mode manager.
+    """
+
+    MODEL_NAMES = ("vehicle_licence_plate", "vehicle_damage")
+    MODES = ("thread", "process")
+
+    def __init__(self, mode: str = INFERENCE_MODE, replicas: int = MODEL_REPLICAS):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown INFERENCE_MODE: {mode}, expected: {', '.join(self.MODES)}")
+        self.mode = mode
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-        self.vehicle_licence_plate_model = YOLOLicensePlateDetector(
-            device=self.device)
-        self.vehicle_damage_model = YOLOVehicleDamageDetector(
-            device=self.device)
+        # Precision is chosen per model, e.g. an INT8 damage model next to an
+        # FP32 plate detector
+        self._factories = {
+            "vehicle_licence_plate": (YOLOLicensePlateDetector, get_backend(
+                precision=LICENCE_PLATE_MODEL_PRECISION), LICENCE_PLATE_MODEL_PATH),
+            "vehicle_damage": (YOLOVehicleDamageDetector, get_backend(
+                precision=VEHICLE_DAMAGE_MODEL_PRECISION), VEHICLE_DAMAGE_MODEL_PATH),
+        }
+        unknown = set(LAZY_MODELS) - set(self._factories)
+        if unknown:
+            raise ValueError(
+                f"Unknown model(s) in LAZY_MODELS: {', '.join(sorted(unknown))}, "
+                f"expected: {', '.join(self._factories)}")
+        self.lazy_models = set(LAZY_MODELS)
+
+        # MODEL_REPLICAS instances of each detector, created when the model is loaded
+        self._replica_pools = {
+            name: ReplicaPool(name, functools.partial(detector_cls, device=self.device, backend=backend),
+                              size=replicas)
+            for name, (detector_cls, backend, _) in self._factories.items()
+        }
+        # Worker processes running the models (started by `start()`)
+        self.inference_workers = InferenceWorkerPool() if mode == "process" else None
+        self._lock = threading.Lock()
+        self._timings = {name: {} for name in self._factories}
+        self.ready = False
+        self.error = None
+
+        # Reusable preprocessing input buffers of each model
+        self._buffer_pools = {name: LetterboxBufferPool() for name in self._factories}
+
+        # Micro-batching schedulers in front of each model
+        self.vehicle_licence_plate_scheduler = self._create_scheduler("vehicle_licence_plate")
+        self.vehicle_damage_scheduler = self._create_scheduler("vehicle_damage")
 
         # Initialize the Runway model
         # self.runway_model = RunwayModel(device=self.device)
 
+    def _create_scheduler(self, name: str) -> BatchScheduler:
+        _, backend, model_path = self._factories[name]
+        model_id = f"{name}:{backend.variant}:{model_path}"
+        if self.inference_workers is not None:
+            return self._create_worker_scheduler(name, model_id)
+
+        pool = self._replica_pools[name]
+
+        def predict_batch(detector, images):
+            arrays, stage_seconds = self.predict(name, images, detector)
+            observe_batch(name, len(images), stage_seconds)
+            return arrays, stage_seconds
+
+        async def run(func, images):
+            if not pool.replicas:
+                # Lazily loaded model: load it off the event loop first
+                await inference_executor.run(self.get_model, name)
+            return await pool.run(func, images)
+
+        return BatchScheduler(predict_batch, name=name, model_id=model_id, run=run, concurrency=pool.size)
+
+    def _create_worker_scheduler(self, name: str, model_id: str) -> BatchScheduler:
+        workers = self.inference_workers
+
+        async def run(_, images):
+            # The detector is picked by the worker pool
+            arrays, stage_seconds = await workers.predict(name, images)
+            observe_batch(name, len(images), stage_seconds)
+            return arrays, stage_seconds
+
+        return BatchScheduler(None, name=name, model_id=model_id, run=run, concurrency=workers.size)
+
+    def get_model(self, name: str):
+        """
+        Return a detector (the first replica), loading the model first if needed. Blocking.
+        """
+        pool = self._replica_pools[name]
+        if pool.replicas:
+            return pool.replicas[0].detector
+
+        with self._lock:
+            if not pool.replicas:
+                start = time.perf_counter()
+                pool.load()
+                self._timings[name]["load_seconds"] = time.perf_counter() - start
+            return pool.replicas[0].detector
+
+    def predict(self, name: str, images: list, model=None) -> tuple:
+        """
+        Run a model on a batch of images. Blocking.
+        Args:
+            name (str): The model name.
+            images (list): RGB images, as returned by the decoders.
+            model: The detector (replica) to use, by default the first one.
+        Returns:
+            tuple: The detection arrays of each image, and the seconds spent
+            in each stage.
+        """
+        model = model or self.get_model(name)
+        if POOLED_PREPROCESSING:
+            return predict_pooled(model.model, images, self._buffer_pools[name])
+
+        results = model.predict(images)
+        # Hand back plain NumPy arrays so results can be cached and shared
+        start = time.perf_counter()
+        arrays = [result_to_arrays(result) for result in results]
+        stage_seconds = ultralytics_stage_seconds(results)
+        stage_seconds["to_arrays"] = time.perf_counter() - start
+        return arrays, stage_seconds
+
+    def load(self):
+        """
+        Load and warm up every model not marked as lazy. Blocking.
+        """
+        for name in self._factories:
+            if name in self.lazy_models:
+                logger.info(f"Deferring loading of {name} until first use")
+                continue
+            self.get_model(name)
+            # Already warm when the models were preloaded before forking
+            if MODEL_WARMUP and "warmup_seconds" not in self._timings[name]:
+                self.warmup(name)
+
+    def warmup(self, name: str):
+        """
+        Run the model on blank images so that the first real request does not
+        pay for lazy initialization (predictor setup, graph compilation,
+        allocator growth).
+        """
+        self.get_model(name)
+        start = time.perf_counter()
+        for replica in self._replica_pools[name].replicas:
+            for size in WARMUP_INPUT_SIZES:
+                blank = np.full((size, size, 3), 114, dtype=np.uint8)
+                for batch_size in sorted({1, max(1, BATCH_MAX_SIZE)}):
+                    for _ in range(WARMUP_ITERATIONS):
+                        self.predict(name, [blank] * batch_size, replica.detector)
+
+        self._timings[name]["warmup_seconds"] = time.perf_counter() - start
+        logger.info(f"Warmed up {name} in {self._timings[name]['warmup_seconds']:.2f}s")
+
+    async def start(self):
+        """
+        Load and warm up the models off the event loop, then mark the service ready.
+        """
+        try:
+            if self.inference_workers is not None:
+                await self.inference_workers.start()
+            else:
+                await inference_executor.run(self.load)
+        except Exception as e:
+            self.error = str(e)
+            logger.exception(f"Model loading failed: {e}")
+            raise
+        self.ready = True
+        logger.info("Model loading finished, service is ready")
+
+    def backends(self) -> dict:
+        return {name: backend for name, (_, backend, _) in self._factories.items()}
+
+    def status(self) -> dict:
+        if self.inference_workers is not None:
+            # Ready while at least one worker is
+            return {
+                "ready": self.ready and self.inference_workers.ready,
+                "error": self.error,
+                "models": {
+                    name: {
+                        "loaded": name in self.inference_workers.labels,
+                        "lazy": name in self.lazy_models,
+                        "replicas": self.inference_workers.size,
+                        **self.inference_workers.model_timings.get(name, {}),
+                    }
+                    for name in self._factories
+                },
+                "inference_workers": self.inference_workers.stats(),
+            }
+
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "models": {
+                name: {
+                    "loaded": bool(self._replica_pools[name].replicas),
+                    "lazy": name in self.lazy_models,
+                    "replicas": self._replica_pools[name].size,
+                    **self._timings[name],
+                }
+                for name in self._factories
+            },
+        }
+
     def get_vehicle_licence_model(self):
-        return self.vehicle_licence_plate_model
+        return self.get_model("vehicle_licence_plate")
 
     def get_vehicle_damage_model(self):
-        return self.vehicle_damage_model
+        return self.get_model("vehicle_damage")
+
+    def get_vehicle_damage_labels(self) -> dict:
+        if self.inference_workers is not None:
+            # Reported by the workers once the model is loaded, which it is
+            # after any inference with it (see `load_labels`)
+            try:
+                return self.inference_workers.labels["vehicle_damage"]
+            except KeyError:
+                raise RuntimeError("The vehicle damage model is not loaded yet") from None
+        return self.get_vehicle_damage_model().names
+
+    async def load_labels(self, name: str) -> dict:
+        """
+        Class names of a model, loading it first (off the event loop) if needed.
+        """
+        if self.inference_workers is not None:
+            return await self.inference_workers.load_labels(name)
+        return (await inference_executor.run(self.get_model, name)).model.names
+
+    def get_vehicle_licence_scheduler(self):
+        return self.vehicle_licence_plate_scheduler
+
+    def get_vehicle_damage_scheduler(self):
+        return self.vehicle_damage_scheduler
+
+    def scheduler_stats(self) -> dict:
+        stats = {
+            "vehicle_licence_plate": self.vehicle_licence_plate_scheduler.stats(),
+            "vehicle_damage": self.vehicle_damage_scheduler.stats(),
+        }
+        # In process mode the workers are the replicas, reported by `status()`
+        if self.inference_workers is None:
+            for name, model_stats in stats.items():
+                model_stats["replicas"] = self._replica_pools[name].stats()
+        return stats
+
+    def shutdown(self):
+        for pool in self._replica_pools.values():
+            pool.shutdown()
+        if self.inference_workers is not None:
+            self.inference_workers.shutdown()
+
+    def buffer_pool_stats(self) -> dict:
+        # In process mode the buffers are pooled in the workers, not here
+        if self.inference_workers is not None:
+            return {}
+        return {name: pool.stats() for name, pool in self._buffer_pools.items()}
 
     # def get_runway_model(self):
     #     return self.runway_model
 
 
-# Singleton instance of ModelManager
+# Singleton instance of ModelManager. Models are loaded by `start()`, not here.
 model_manager = ModelManager()
@@ -0,0 +1,269 @@
+# app/services/preprocessing.py
+# Letterboxing into pooled input buffers.
+#
+# Ultralytics preprocesses every call by letterboxing each image into a new
+# array, stacking them (another copy), then transposing, converting and
+# normalizing into a new float tensor. Here each image is resized straight
+# into its slot of a reusable uint8 staging buffer, and the staging buffer is
+# converted once into a reusable float input tensor, which goes to the model
+# as is. Boxes are mapped back to the input images after NMS, so the
+# predictor's own preprocessing and Results objects are bypassed entirely.
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import List, NamedTuple, Tuple
+import cv2
+import numpy as np
+import torch
+from ultralytics.utils.nms import non_max_suppression
+from app.core.config import BATCH_MAX_SIZE, PREPROCESS_POOL_SIZE
+from app.utils.detections import DetectionArrays
+
+# Ultralytics' letterbox padding value
+PAD_VALUE = 114
+
+
+class Letterbox(NamedTuple):
+    """
+    Placement of one image in the model input: resize factor and padding.
+    """
+    gain: float
+    left: int
+    top: int
+
+
+class InputBuffers:
+    """
+    A uint8 staging buffer (batch, height, width, 3) and, on CPU, the float32
+    input tensor (batch, 3, height, width) it is converted into. Both are
+    flat, so that any smaller batch or input shape is a contiguous view.
+    """
+
+    def __init__(self, capacity: int, pin_memory: bool):
+        self.capacity = capacity
+        # Pinned staging memory makes the host-to-device copy asynchronous
+        self.staging = torch.empty(capacity, dtype=torch.uint8, pin_memory=pin_memory)
+        # On GPU the conversion to float runs on the device instead
+        self.input = None if pin_memory else torch.empty(capacity, dtype=torch.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.staging.nbytes + (self.input.nbytes if self.input is not None else 0)
+
+    def staging_view(self, batch_size: int, height: int, width: int) -> np.ndarray:
+        return self.staging[:batch_size * height * width * 3].numpy().reshape(batch_size, height, width, 3)
+
+    def input_view(self, batch_size: int, height: int, width: int) -> torch.Tensor:
+        return self.input[:batch_size * 3 * height * width].view(batch_size, 3, height, width)
+
+
+class LetterboxBufferPool:
+    """
+    Pool of `InputBuffers` sized for `max_batch_size` images at the model
+    input size.
+
+    At most `max_buffers` are kept. A batch that finds every pooled buffer in
+    use (or needs a larger one) gets a temporary buffer, counted in
+    `unpooled`; a steadily growing count means PREPROCESS_POOL_SIZE is too
+    small for the number of batches running at once.
+    """
+
+    def __init__(self, max_buffers: int = PREPROCESS_POOL_SIZE, max_batch_size: int = BATCH_MAX_SIZE):
+        self.max_buffers = max(0, max_buffers)
+        self.max_batch_size = max(1, max_batch_size)
+        self._free = []
+        self._pooled = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._allocations = 0
+        self._unpooled = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, batch_size: int, height: int, width: int, imgsz: Tuple[int, int],
+                pin_memory: bool = False):
+        """
+        Borrow buffers holding at least `batch_size` images of `height` x
+        `width`. New pooled buffers are sized for full batches at the model
+        input size `imgsz`, so that they fit every later batch.
+        """
+        capacity = batch_size * height * width * 3
+        buffers, pooled = None, False
+        with self._lock:
+            self._acquired += 1
+            self._in_use += 1
+            while self._free:
+                candidate = self._free.pop()
+                if candidate.capacity >= capacity:
+                    buffers, pooled = candidate, True
+                    break
+                # Too small for this input size: replace it
+                self._pooled -= 1
+            if buffers is None and self._pooled < self.max_buffers:
+                self._pooled += 1
+                pooled = True
+            self._allocations += buffers is None
+            self._unpooled += not pooled
+
+        try:
+            if buffers is None:
+                size = max(capacity, self.max_batch_size * imgsz[0] * imgsz[1] * 3) if pooled else capacity
+                buffers = InputBuffers(size, pin_memory)
+            yield buffers
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                if pooled:
+                    self._free.append(buffers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_buffers": self.max_buffers,
+                "pooled": self._pooled,
+                "in_use": self._in_use,
+                "free": len(self._free),
+                "acquired": self._acquired,
+                "allocations": self._allocations,
+                "unpooled": self._unpooled,
+                "free_bytes": sum(buffers.nbytes for buffers in self._free),
+            }
+
+
+def letterbox_shape(shape: Tuple[int, int], imgsz: Tuple[int, int],
+                    stride: int) -> Tuple[float, Tuple[int, int], Tuple[int, int]]:
+    """
+    Resize factor, resized (height, width) and stride-aligned padded
+    (height, width) of an image, as ultralytics' minimum-rectangle letterbox.
+    """
+    height, width = shape
+    gain = min(imgsz[0] / height, imgsz[1] / width)
+    resized = (round(height * gain), round(width * gain))
+    padded = tuple(-(-size // stride) * stride for size in resized)
+    return gain, resized, padded
+
+
+def letterbox_into(image: np.ndarray, dst: np.ndarray, gain: float, resized: Tuple[int, int]) -> Letterbox:
+    """
+    Resize `image` into the center of `dst` (padded height, width, 3) and
+    fill the border with the padding value, writing nothing twice.
+    """
+    height, width = dst.shape[:2]
+    new_height, new_width = resized
+    top = round((height - new_height) / 2 - 0.1)
+    left = round((width - new_width) / 2 - 0.1)
+    bottom, right = top + new_height, left + new_width
+
+    region = dst[top:bottom, left:right]
+    if image.shape[:2] == resized:
+        region[...] = image
+    else:
+        cv2.resize(image, (new_width, new_height), dst=region, interpolation=cv2.INTER_LINEAR)
+
+    dst[:top] = PAD_VALUE
+    dst[bottom:] = PAD_VALUE
+    dst[top:bottom, :left] = PAD_VALUE
+    dst[top:bottom, right:] = PAD_VALUE
+    return Letterbox(gain, left, top)
+
+
+def to_model_input(staging: torch.Tensor, out: torch.Tensor) -> torch.Tensor:
+    """
+    Convert letterboxed uint8 images (batch, height, width, 3) into the float
+    model input `out` (batch, 3, height, width) in [0, 1], in one strided
+    pass per channel.
+
+    The channel order is reversed, as ultralytics does for the BGR arrays it
+    expects. The decoders produce RGB arrays, so the model receives them in
+    BGR order, exactly as it did through `model.predict`.
+    """
+    for channel in range(3):
+        out[:, channel].copy_(staging[..., 2 - channel])
+    return out.mul_(1 / 255)
+
+
+def unletterbox_boxes(boxes: np.ndarray, letterbox: Letterbox, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Map xyxy boxes from model input coordinates back to the (height, width) image.
+    """
+    x, y = boxes[:, 0::2], boxes[:, 1::2]
+    x -= letterbox.left
+    y -= letterbox.top
+    boxes /= letterbox.gain
+    np.clip(x, 0, shape[1], out=x)
+    np.clip(y, 0, shape[0], out=y)
+    return boxes
+
+
+def _predictor(model):
+    if model.predictor is None:
+        # The first predict call sets up the predictor: backend, fused
+        # layers, input size and stride
+        model.predict(np.full((64, 64, 3), PAD_VALUE, dtype=np.uint8), verbose=False)
+    return model.predictor
+
+
+def predict_pooled(model, images: List[np.ndarray],
+                   pool: LetterboxBufferPool) -> Tuple[List[DetectionArrays], dict]:
+    """
+    Run a YOLO model on decoded images through pooled input buffers.
+    Args:
+        model: The ultralytics YOLO model.
+        images (List[np.ndarray]): RGB images of any size, as returned by the
+            decoders in app/utils/helper.py.
+        pool (LetterboxBufferPool): Buffers of this model.
+    Returns:
+        Tuple[List[DetectionArrays], dict]: Detections per image in image
+        coordinates, and the seconds spent in each stage.
+    """
+    predictor = _predictor(model)
+    backend, args = predictor.model, predictor.args
+    imgsz = predictor.imgsz
+    stride = int(torch.as_tensor(backend.stride).max())
+    on_device = backend.device.type != "cpu"
+
+    start = time.perf_counter()
+    placements = [letterbox_shape(image.shape[:2], imgsz, stride) for image in images]
+    if backend.format == "pt" or getattr(backend, "dynamic", False):
+        # Smallest stride-aligned shape holding every image of the batch
+        height = max(padded[0] for _, _, padded in placements)
+        width = max(padded[1] for _, _, padded in placements)
+    else:
+        height, width = imgsz
+
+    with pool.acquire(len(images), height, width, imgsz, pin_memory=on_device) as buffers:
+        staging = buffers.staging_view(len(images), height, width)
+        letterboxes = [letterbox_into(image, slot, gain, resized)
+                       for image, slot, (gain, resized, _) in zip(images, staging, placements)]
+
+        source = torch.from_numpy(staging)
+        if on_device:
+            # Same channel reversal as `to_model_input`
+            batch = source.to(backend.device, non_blocking=True).permute(0, 3, 1, 2).flip(1)
+            batch = batch.half() if backend.fp16 else batch.float()
+            batch = batch.contiguous().div_(255)
+        else:
+            batch = to_model_input(source, buffers.input_view(len(images), height, width))
+
+        preprocessed = time.perf_counter()
+        autocast = torch.autocast("cuda") if backend.device.type == "cuda" else nullcontext()
+        with torch.inference_mode(), autocast:
+            preds = backend(batch)
+        forwarded = time.perf_counter()
+
+    detections = non_max_suppression(
+        preds, args.conf, args.iou, args.classes, args.agnostic_nms, max_det=args.max_det,
+        end2end=getattr(backend, "end2end", False))
+
+    arrays = []
+    for detection, letterbox, image in zip(detections, letterboxes, images):
+        detection = detection.float().cpu().numpy()
+        boxes = unletterbox_boxes(detection[:, :4].copy(), letterbox, image.shape[:2])
+        arrays.append((boxes, detection[:, 4].copy(), detection[:, 5].copy()))
+
+    stage_seconds = {
+        "preprocess": preprocessed - start,
+        "forward": forwarded - preprocessed,
+        "postprocess": time.perf_counter() - forwarded,
+    }
+    return arrays, stage_seconds
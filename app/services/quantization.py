@@ -0,0 +1,111 @@
+# app/services/quantization.py
+import glob
+import os
+import tempfile
+import numpy as np
+import onnx
+import torch
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from app.core.logging import logger
+from app.services.preprocessing import letterbox_into, letterbox_shape, to_model_input
+from app.utils.helper import decode_bytes_for_inference
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def list_calibration_images(images_dir: str) -> list:
+    paths = sorted(
+        path for path in glob.glob(os.path.join(images_dir, "*"))
+        if path.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found in: {images_dir}")
+    return paths
+
+
+def calibration_input(path: str, size: int) -> np.ndarray:
+    """
+    The 1x3xSIZExSIZE float32 model input of an image file, built exactly as
+    served: decoded by `decode_bytes_for_inference`, letterboxed and
+    converted like the pooled input buffers (see `predict_pooled`).
+    """
+    with open(path, "rb") as f:
+        image, _ = decode_bytes_for_inference(f.read())
+    gain, resized, _ = letterbox_shape(image.shape[:2], (size, size), stride=1)
+
+    staging = np.empty((1, size, size, 3), dtype=np.uint8)
+    letterbox_into(image, staging[0], gain, resized)
+    return to_model_input(torch.from_numpy(staging), torch.empty((1, 3, size, size))).numpy()
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """
+    Feeds sample images, preprocessed as in serving, to the ONNX Runtime
+    static quantizer.
+    """
+
+    def __init__(self, model_path: str, images_dir: str, size: int):
+        self.input_name = onnx.load(model_path, load_external_data=False).graph.input[0].name
+        self.paths = iter(list_calibration_images(images_dir))
+        self.size = size
+
+    def get_next(self):
+        for path in self.paths:
+            try:
+                return {self.input_name: calibration_input(path, self.size)}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping calibration image {path}: {e}")
+        return None
+
+
+def quantize_onnx(fp32_path: str, int8_path: str, mode: str, images_dir: str, size: int) -> str:
+    """
+    Quantize an exported FP32 ONNX model to INT8.
+    Args:
+        fp32_path (str): The FP32 ONNX model.
+        int8_path (str): Where to write the INT8 model.
+        mode (str): "dynamic" (weights only) or "static" (calibrated activations).
+        images_dir (str): Calibration images for static quantization.
+        size (int): Model input size used for calibration.
+    Returns:
+        str: The INT8 model path.
+    """
+    logger.info(f"Quantizing {fp32_path} to INT8 ({mode}) at {int8_path}")
+    if mode == "dynamic":
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    elif mode == "static":
+        # Shape inference and graph optimization first, so that the quantizer
+        # sees folded Conv/BatchNorm nodes
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            prepared_path = os.path.join(tmp_dir, "prepared.onnx")
+            quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+            quantize_static(
+                prepared_path, int8_path, ImageCalibrationReader(prepared_path, images_dir, size),
+                quant_format=QuantFormat.QDQ, per_channel=True,
+                activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        raise ValueError(f"Unknown quantization mode '{mode}', expected 'dynamic' or 'static'")
+
+    # ultralytics reads class names, stride and input size from the model
+    # metadata, which the quantizer does not carry over
+    fp32_model = onnx.load(fp32_path, load_external_data=False)
+    int8_model = onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+    return int8_path
+
+
+def calibration_dataset_yaml(images_dir: str, names: dict) -> str:
+    """
+    Write a minimal ultralytics dataset YAML pointing at the calibration images,
+    as required by the OpenVINO (NNCF) INT8 export.
+    """
+    lines = [f"path: {os.path.abspath(images_dir)}", "train: .", "val: .", "names:"]
+    lines += [f"  {class_id}: {name}" for class_id, name in names.items()]
+
+    handle, path = tempfile.mkstemp(suffix=".yaml", prefix="calibration_")
+    with os.fdopen(handle, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
@@ -0,0 +1,151 @@
+# app/services/replicas.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+import time
+from typing import Callable, List
+import torch
+from app.core.config import MODEL_REPLICAS, PIN_REPLICA_CORES, TORCH_THREADS_PER_REPLICA
+from app.core.logging import logger
+
+
+def available_cores() -> List[int]:
+    """
+    CPU cores this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(count: int, cores: List[int] = None) -> List[List[int]]:
+    """
+    Split `cores` (default: the cores available to this process) into
+    `count` contiguous, disjoint slices. With fewer cores than slices, slices
+    wrap around and share cores.
+    """
+    cores = cores or available_cores()
+    size = max(1, len(cores) // max(1, count))
+    return [[cores[(index * size + offset) % len(cores)] for offset in range(size)]
+            for index in range(count)]
+
+
+class ModelReplica:
+    """
+    One of `replicas` instances of a detector, with its own single-thread executor.
+
+    The executor thread is pinned to the replica's slice of the cores and
+    sets its own torch intra-op thread count, which applies to the calls made
+    from that thread only. Intra-op threads it starts inherit the pinning, so
+    replicas do not compete for the same cores.
+    """
+
+    def __init__(self, name: str, index: int, detector, replicas: int, threads: int, pin_cores: bool):
+        self.name = name
+        self.index = index
+        self.detector = detector
+        self.replicas = replicas
+        self.pin_cores = pin_cores
+        self.configured_threads = threads
+        self.threads = None
+        self.cores = None
+        self.in_flight = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self._executor = None
+        self._pid = None
+
+    def executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive a fork: with the preload launcher, replicas
+        # are loaded in the parent and each worker starts its own executors
+        if self._executor is None or self._pid != os.getpid():
+            # Threads and cores are resolved in the process that runs
+            # inference, as the launcher sets those of each worker after the
+            # models were loaded. By default the replicas share the process'
+            # intra-op threads, so a single replica keeps torch's setting.
+            self.threads = self.configured_threads or max(1, torch.get_num_threads() // self.replicas)
+            self.cores = split_cores(self.replicas)[self.index] if self.pin_cores else None
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"{self.name}-replica-{self.index}",
+                initializer=self._configure_thread)
+            self._pid = os.getpid()
+        return self._executor
+
+    def _configure_thread(self):
+        if self.cores is not None:
+            try:
+                os.sched_setaffinity(0, self.cores)
+            except OSError as e:
+                logger.warning(f"Could not pin {self.name} replica {self.index} to cores {self.cores}: {e}")
+        torch.set_num_threads(self.threads)
+
+    def stats(self) -> dict:
+        return {
+            "threads": self.threads,
+            "cores": self.cores,
+            "in_flight": self.in_flight,
+            "batches": self.batches,
+            "busy_seconds": self.busy_seconds,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ReplicaPool:
+    """
+    `size` instances of one detector, run in parallel.
+
+    Work is dispatched to the replica with the fewest batches in flight (the
+    least used one among equals), on that replica's own thread. Replicas are
+    created by `load()`; until then the pool is empty.
+    """
+
+    def __init__(self, name: str, factory: Callable, size: int = MODEL_REPLICAS,
+                 threads: int = TORCH_THREADS_PER_REPLICA, pin_cores: bool = PIN_REPLICA_CORES):
+        self.name = name
+        self.factory = factory
+        self.size = max(1, size)
+        self.threads = threads
+        self.pin_cores = pin_cores and hasattr(os, "sched_setaffinity")
+        self.replicas = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Create the replicas. Blocking.
+        """
+        with self._lock:
+            if self.replicas:
+                return
+            self.replicas = [ModelReplica(self.name, index, self.factory(), self.size, self.threads, self.pin_cores)
+                             for index in range(self.size)]
+            if self.size > 1:
+                logger.info(f"Loaded {self.size} replicas of {self.name}")
+
+    async def run(self, func, *args):
+        """
+        Run `func(detector, *args)` on the least loaded replica.
+        Only ever called from the event loop thread, so no lock is needed.
+        """
+        replica = min(self.replicas, key=lambda r: (r.in_flight, r.batches))
+        replica.in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                replica.executor(), functools.partial(func, replica.detector, *args))
+        finally:
+            replica.in_flight -= 1
+            replica.batches += 1
+            replica.busy_seconds += time.perf_counter() - start
+
+    def stats(self) -> list:
+        return [replica.stats() for replica in self.replicas]
+
+    def shutdown(self):
+        for replica in self.replicas:
+            replica.shutdown()
@@ -0,0 +1,117 @@
+# app/services/tiling.py
+import asyncio
+import numpy as np
+from app.core.config import (
+    MODEL_INPUT_SIZE, TILE_FULL_IMAGE_PASS, TILE_MAX_IN_FLIGHT, TILE_MERGE, TILE_MERGE_IOU,
+    TILE_OVERLAP, TILE_SIZE)
+from app.services.inference_executor import inference_executor
+from app.utils.detections import (
+    DetectionArrays, box_iou, concat_arrays, fuse_boxes, non_max_suppression, scale_boxes)
+from app.utils.helper import resize_long_side
+
+MERGE_FUNCTIONS = {
+    "nms": non_max_suppression,
+    "fusion": fuse_boxes,
+}
+
+
+def tile_starts(length: int, tile_size: int, overlap: float) -> np.ndarray:
+    """
+    Start offsets of the tiles covering `length` pixels along one axis.
+
+    Tiles advance by `tile_size * (1 - overlap)`, and the last tile is aligned
+    with the image edge so that no tile is padded.
+    """
+    if length <= tile_size:
+        return np.zeros(1, dtype=np.intp)
+    stride = max(1, int(tile_size * (1 - overlap)))
+    count = int(np.ceil((length - tile_size) / stride)) + 1
+    starts = np.arange(count) * stride
+    starts[-1] = length - tile_size
+    return starts.astype(np.intp)
+
+
+def seam_mask(boxes: np.ndarray, starts: np.ndarray, tile_size: int, axis: int) -> np.ndarray:
+    """
+    Mask of the boxes that reach into an area covered by two tiles along `axis`.
+
+    Only these boxes can have been detected twice; the rest were seen by a
+    single tile and need no merging.
+    """
+    # Overlap band between tile k and tile k + 1: [starts[k + 1], starts[k] + tile_size)
+    band_starts = starts[1:]
+    band_ends = starts[:-1] + tile_size
+    if not len(band_starts):
+        return np.zeros(len(boxes), dtype=bool)
+    low, high = boxes[:, axis], boxes[:, axis + 2]
+    # First band ending after the box start; the box hits it if that band starts before the box end
+    index = np.searchsorted(band_ends, low, side="right")
+    hit = index < len(band_ends)
+    hit[hit] = band_starts[index[hit]] < high[hit]
+    return hit
+
+
+async def run_tiled(image: np.ndarray, scheduler, tile_size: int = TILE_SIZE,
+                    overlap: float = TILE_OVERLAP, merge: str = TILE_MERGE,
+                    merge_iou: float = TILE_MERGE_IOU, max_in_flight: int = TILE_MAX_IN_FLIGHT,
+                    full_image_pass: bool = TILE_FULL_IMAGE_PASS) -> DetectionArrays:
+    """
+    Detect objects on a large image tile by tile, at native resolution.
+
+    Tiles are views into the image and are submitted to the batching
+    scheduler, so they run as model batches. At most `max_in_flight` tiles are
+    waiting on the model at a time, which bounds the memory taken by model
+    inputs regardless of the image size. Duplicates are only looked for among
+    detections touching the overlap between tiles or a detection of the
+    whole-image pass, which keeps the merge small even for hundreds of tiles.
+    Args:
+        image (np.ndarray): The full-resolution RGB image.
+        scheduler: Batching scheduler of the model.
+        tile_size (int): Tile width and height, in image pixels.
+        overlap (float): Fraction of a tile shared with its neighbour.
+        merge (str): "nms" or "fusion".
+        merge_iou (float): IoU above which detections of the same class are merged.
+        max_in_flight (int): Maximum tiles submitted to the model at once.
+        full_image_pass (bool): Also detect on the whole image downscaled to
+            the model input size.
+    Returns:
+        DetectionArrays: Detections in full-resolution coordinates.
+    """
+    merge_function = MERGE_FUNCTIONS.get(merge)
+    if merge_function is None:
+        raise ValueError(f"Unknown tile merge method: {merge}")
+
+    height, width = image.shape[:2]
+    x_starts = tile_starts(width, tile_size, overlap)
+    y_starts = tile_starts(height, tile_size, overlap)
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def detect_tile(x: int, y: int) -> DetectionArrays:
+        async with semaphore:
+            boxes, confs, labels = await scheduler.submit(
+                image[y:y + tile_size, x:x + tile_size])
+        offset = np.array([x, y, x, y], dtype=boxes.dtype)
+        return boxes + offset, confs, labels
+
+    async def detect_full() -> DetectionArrays:
+        small, scale = await inference_executor.run(resize_long_side, image, MODEL_INPUT_SIZE)
+        async with semaphore:
+            return scale_boxes(await scheduler.submit(small), scale)
+
+    tiles = [detect_tile(int(x), int(y)) for y in y_starts for x in x_starts]
+    results = await asyncio.gather(*tiles, *([detect_full()] if full_image_pass else []))
+
+    boxes, confs, labels = concat_arrays(*results[:len(tiles)])
+    merging = (seam_mask(boxes, x_starts, tile_size, 0)
+               | seam_mask(boxes, y_starts, tile_size, 1))
+    candidates = []
+    if full_image_pass:
+        full = results[-1]
+        # The whole-image pass can repeat any tile detection, not only those at seams
+        if len(full[0]) and len(boxes):
+            merging |= (box_iou(boxes, full[0]) > merge_iou).any(axis=1)
+        candidates.append(full)
+    candidates.append((boxes[merging], confs[merging], labels[merging]))
+
+    merged = await inference_executor.run(merge_function, concat_arrays(*candidates), merge_iou)
+    return concat_arrays((boxes[~merging], confs[~merging], labels[~merging]), merged)
@@ -0,0 +1,117 @@
+# app/services/tracking.py
+import numpy as np
+from app.core.config import TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED
+from app.utils.detections import DetectionArrays, box_iou
+
+
+class Track:
+    """
+    One object followed across video frames, with its aggregated detections.
+    """
+
+    def __init__(self, track_id: int, label: int, box: np.ndarray, confidence: float,
+                 timestamp: float):
+        self.track_id = track_id
+        self.label = label
+        self.box = box
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.missed = 0
+        # Best (most confident) observation, e.g. the sharpest view of a plate
+        self.best_confidence = confidence
+        self.best_box = box
+        self.best_timestamp = timestamp
+
+    def update(self, box: np.ndarray, confidence: float, timestamp: float):
+        self.box = box
+        self.last_seen = timestamp
+        self.hits += 1
+        self.missed = 0
+        if confidence > self.best_confidence:
+            self.best_confidence = confidence
+            self.best_box = box
+            self.best_timestamp = timestamp
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker.
+
+    Each analyzed frame's detections are matched to the active tracks of the
+    same class by descending IoU; unmatched detections start new tracks, and
+    tracks unmatched for more than `max_missed` analyzed frames are closed.
+    Cheap enough to run on every analyzed frame, and sufficient for the slow
+    camera motion of walk-around and gate videos.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD,
+                 max_missed: int = TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.active = []
+        self.finished = []
+        self._next_id = 1
+
+    def update(self, arrays: DetectionArrays, timestamp: float):
+        boxes, confs, labels = arrays
+        matched_tracks, matched_detections = set(), set()
+
+        if self.active and len(boxes):
+            track_boxes = np.stack([track.box for track in self.active])
+            track_labels = np.array([track.label for track in self.active])
+            ious = box_iou(track_boxes, boxes)
+            # Only link detections of the same class
+            ious[track_labels[:, None] != labels[None, :]] = 0
+
+            for flat_index in np.argsort(-ious, axis=None):
+                t, d = (int(i) for i in np.unravel_index(flat_index, ious.shape))
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                self.active[t].update(boxes[d], float(confs[d]), timestamp)
+                matched_tracks.add(t)
+                matched_detections.add(d)
+
+        still_active = []
+        for t, track in enumerate(self.active):
+            if t not in matched_tracks:
+                track.missed += 1
+            if track.missed > self.max_missed:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+
+        for d in range(len(boxes)):
+            if d not in matched_detections:
+                self.active.append(Track(
+                    self._next_id, int(labels[d]), boxes[d], float(confs[d]), timestamp))
+                self._next_id += 1
+
+    def tracks(self, min_hits: int = 1) -> list:
+        """
+        All tracks seen so far, ordered by first appearance.
+        """
+        tracks = [track for track in self.finished + self.active if track.hits >= min_hits]
+        return sorted(tracks, key=lambda track: track.track_id)
+
+
+def tracks_to_results(tracks: list, label_mapping: dict) -> list:
+    """
+    Format tracks as the per-object results returned by the API.
+    """
+    return [
+        {
+            "track_id": track.track_id,
+            "label": label_mapping.get(track.label, "Unknown"),
+            "first_seen": round(track.first_seen, 3),
+            "last_seen": round(track.last_seen, 3),
+            "frames": track.hits,
+            "confidence": track.best_confidence,
+            "box": track.best_box.tolist(),
+            "best_frame_time": round(track.best_timestamp, 3),
+        }
+        for track in tracks
+    ]
@@ -1,13 +1,17 @@
 import torch
 from ultralytics import YOLO
 import os
+from app.core.config import VEHICLE_DAMAGE_MODEL_PATH
 from app.core.logging import logger
+from app.services.backends import InferenceBackend, get_backend
 
 
 class YOLOVehicleDamageDetector:
-    def __init__(self, device: str = 'cuda' if torch.cuda.is_available() else 'cpu'):
+    def __init__(self, device: str = 'cuda' if torch.cuda.is_available() else 'cpu',
+                 backend: InferenceBackend = None):
         self.device = torch.device(device)
-        self.model_path = "app/models/vehicle_damage_best.pt"  # Path to your YOLO model
+        self.backend = backend or get_backend()
+        self.model_path = VEHICLE_DAMAGE_MODEL_PATH  # Path to your YOLO model
         self.model = self._load_model()
 
     def _load_model(self) -> YOLO:
@@ -17,11 +21,10 @@ class YOLOVehicleDamageDetector:
 
         abs_model_path = os.path.abspath(self.model_path)
         logger.info(
-            f"INFO: Attempting to load vehicle_damage_best model from {abs_model_path}")
+            f"INFO: Attempting to load vehicle_damage_best model from {abs_model_path} ({self.backend.variant} backend)")
 
         try:
-            model_instance = YOLO(self.model_path)
-            model_instance.to(self.device)
+            model_instance = self.backend.load(self.model_path, self.device)
             logger.info(
                 f"INFO: vehicle_damage_best model successfully loaded from {abs_model_path}")
         except Exception as e:
@@ -0,0 +1,117 @@
+# app/services/video.py
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from app.core.config import (
+    MODEL_INPUT_SIZE, VIDEO_DIFF_THRESHOLD, VIDEO_MAX_SKIP_SECONDS, VIDEO_SAMPLE_FPS)
+from app.utils.helper import resize_long_side
+
+# Width of the grayscale thumbnails compared to detect near-identical frames
+DIFF_THUMBNAIL_WIDTH = 64
+
+
+class VideoFrame:
+    def __init__(self, index: int, timestamp: float, image: np.ndarray,
+                 scale: Tuple[float, float]):
+        self.index = index
+        self.timestamp = timestamp
+        self.image = image
+        self.scale = scale
+
+
+class VideoFrameSampler:
+    """
+    Read a video file frame by frame and return only the frames worth running
+    the detectors on.
+
+    Frames between samples are skipped with `grab()`, which advances the
+    stream without converting the frame to an image. A sampled frame is also
+    skipped when it barely differs from the last analyzed frame (a parked car,
+    a camera standing still), but at least one frame is analyzed every
+    `max_skip_seconds`. The cost therefore follows scene changes rather than
+    frame count. Not thread-safe: call `next_frame` from one thread at a time.
+    """
+
+    def __init__(self, path: str, sample_fps: float = VIDEO_SAMPLE_FPS,
+                 diff_threshold: float = VIDEO_DIFF_THRESHOLD,
+                 max_skip_seconds: float = VIDEO_MAX_SKIP_SECONDS,
+                 target_size: int = MODEL_INPUT_SIZE):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Unable to open the video file")
+
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.step = max(1, round(self.fps / sample_fps)) if sample_fps > 0 else 1
+        self.diff_threshold = diff_threshold
+        self.max_skip_seconds = max_skip_seconds
+        self.target_size = target_size
+
+        self.frames_read = 0
+        self.sampled_frames = 0
+        self.analyzed_frames = 0
+        self.similar_frames = 0
+        self._last_thumbnail = None
+        self._last_timestamp = None
+
+    def next_frame(self) -> Optional[VideoFrame]:
+        """
+        Return the next frame to analyze, or None at the end of the video.
+        """
+        while True:
+            index = self.frames_read
+            if not self.capture.grab():
+                return None
+            self.frames_read += 1
+            if index % self.step:
+                continue
+
+            ok, frame = self.capture.retrieve()
+            if not ok:
+                return None
+            self.sampled_frames += 1
+            timestamp = index / self.fps
+
+            thumbnail = self._thumbnail(frame)
+            if self._is_similar(thumbnail, timestamp):
+                self.similar_frames += 1
+                continue
+
+            self._last_thumbnail = thumbnail
+            self._last_timestamp = timestamp
+            self.analyzed_frames += 1
+            image, scale = self._prepare(frame)
+            return VideoFrame(index, timestamp, image, scale)
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (DIFF_THUMBNAIL_WIDTH, max(1, round(height * DIFF_THUMBNAIL_WIDTH / width)))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def _is_similar(self, thumbnail: np.ndarray, timestamp: float) -> bool:
+        if self._last_thumbnail is None or self.diff_threshold <= 0:
+            return False
+        if timestamp - self._last_timestamp >= self.max_skip_seconds:
+            return False
+        difference = cv2.absdiff(thumbnail, self._last_thumbnail).mean() / 255
+        return difference < self.diff_threshold
+
+    def _prepare(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[float, float]]:
+        # Shrink large frames to about the model input size, as the image
+        # decoder does, and keep the same RGB channel order
+        frame, scale = resize_long_side(frame, self.target_size)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), scale
+
+    def stats(self) -> dict:
+        return {
+            "fps": self.fps,
+            "frames": self.frames_read,
+            "duration_seconds": round(self.frames_read / self.fps, 3),
+            "sampled_frames": self.sampled_frames,
+            "analyzed_frames": self.analyzed_frames,
+            "skipped_similar_frames": self.similar_frames,
+        }
+
+    def close(self):
+        self.capture.release()
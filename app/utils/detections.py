@@ -0,0 +1,220 @@
+# app/utils/detections.py
+from typing import Tuple
+import numpy as np
+
+# Detections for one image as parallel arrays: boxes (N, 4) in xyxy pixel
+# coordinates, confidences (N,) and class ids (N,)
+DetectionArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def result_to_arrays(result) -> DetectionArrays:
+    """
+    Extract the boxes, confidences and class ids of a YOLO result as NumPy arrays.
+    Args:
+        result: The YOLO result for one image.
+    Returns:
+        DetectionArrays: Boxes, confidences and class ids.
+    """
+    # Extract bounding box coordinates, confidences, and labels
+    boxes = result.boxes.xyxy
+    confs = result.boxes.conf
+    labels = result.boxes.cls
+
+    # Move the results to CPU if they are on GPU
+    if boxes.is_cuda:
+        boxes = boxes.cpu()
+    if confs.is_cuda:
+        confs = confs.cpu()
+    if labels.is_cuda:
+        labels = labels.cpu()
+
+    # Convert to numpy arrays
+    return boxes.numpy(), confs.numpy(), labels.numpy()
+
+
+def freeze_arrays(arrays: DetectionArrays) -> DetectionArrays:
+    """
+    Mark detection arrays read-only so they can be shared between requests.
+    """
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
+
+
+def arrays_nbytes(arrays: DetectionArrays) -> int:
+    return sum(array.nbytes for array in arrays)
+
+
+def scale_boxes(arrays: DetectionArrays, scale: Tuple[float, float]) -> DetectionArrays:
+    """
+    Map boxes from a resized image back to the original resolution.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids.
+        scale (Tuple[float, float]): The (x, y) factors from resized to original coordinates.
+    Returns:
+        DetectionArrays: The arrays with rescaled boxes.
+    """
+    boxes, confs, labels = arrays
+    if scale == (1.0, 1.0):
+        return arrays
+
+    scale_x, scale_y = scale
+    factors = np.array([scale_x, scale_y, scale_x, scale_y], dtype=boxes.dtype)
+    return boxes * factors, confs, labels
+
+
+def arrays_to_detections(arrays: DetectionArrays, label_mapping: dict) -> list:
+    """
+    Format detection arrays as the list of detection dicts returned by the API.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids.
+        label_mapping (dict): Class id to label name.
+    Returns:
+        list: [{"label": ..., "confidence": ..., "box": [x1, y1, x2, y2]}, ...]
+    """
+    boxes, confs, labels = arrays
+
+    # Format bounding boxes into a JSON-compatible format
+    return [
+        {
+            "label": label_mapping.get(int(labels[i]), "Unknown"),
+            "confidence": float(confs[i]),
+            "box": boxes[i].tolist()  # Convert to list for JSON serialization
+        }
+        for i in range(len(boxes))
+    ]
+
+
+def select_labels(arrays: DetectionArrays, class_ids) -> DetectionArrays:
+    """
+    Keep only the detections whose class id is in `class_ids`.
+    """
+    boxes, confs, labels = arrays
+    mask = np.isin(labels, list(class_ids))
+    return boxes[mask], confs[mask], labels[mask]
+
+
+def arrays_to_compact(arrays: DetectionArrays, label_mapping: dict, precision: int) -> dict:
+    """
+    Build the compact, columnar representation of detections.
+
+    Labels, confidences and boxes are returned as parallel arrays. Boxes and
+    confidences stay NumPy arrays so that an orjson-backed response can
+    serialize them without a per-detection Python loop.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids.
+        label_mapping (dict): Class id to label name.
+        precision (int): Number of decimals kept for box coordinates.
+    Returns:
+        dict: {"labels": [...], "confidences": [...], "boxes": [[x1, y1, x2, y2], ...]}
+    """
+    boxes, confs, labels = arrays
+
+    # Vectorized label lookup; ids outside the mapping become "Unknown"
+    names = np.array(
+        [label_mapping.get(i, "Unknown") for i in range(max(label_mapping, default=-1) + 2)],
+        dtype=object)
+    ids = labels.astype(np.intp)
+    ids[(ids < 0) | (ids >= len(names))] = len(names) - 1
+
+    return {
+        "labels": names[ids].tolist(),
+        "confidences": np.round(confs, 4),
+        "boxes": np.round(boxes, precision),
+    }
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise intersection over union of two sets of xyxy boxes.
+    Args:
+        boxes_a (np.ndarray): (N, 4) boxes.
+        boxes_b (np.ndarray): (M, 4) boxes.
+    Returns:
+        np.ndarray: (N, M) IoU matrix.
+    """
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+
+def non_max_suppression(arrays: DetectionArrays, iou_threshold: float) -> DetectionArrays:
+    """
+    Class-aware non-maximum suppression.
+
+    Boxes of different classes are shifted apart so that one IoU matrix
+    covers every class, then detections are kept greedily by confidence.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids.
+        iou_threshold (float): Detections overlapping a more confident one of
+            the same class by more than this are dropped.
+    Returns:
+        DetectionArrays: The kept detections, most confident first.
+    """
+    if len(arrays[0]) < 2:
+        return arrays
+
+    (boxes, confs, labels), clusters = _greedy_clusters(arrays, iou_threshold)
+    keep = clusters == np.arange(len(boxes))
+    return boxes[keep], confs[keep], labels[keep]
+
+
+def fuse_boxes(arrays: DetectionArrays, iou_threshold: float) -> DetectionArrays:
+    """
+    Class-aware weighted box fusion.
+
+    Detections are grouped as non-maximum suppression would group them, but
+    each group is replaced by the confidence-weighted mean of its boxes
+    instead of only its best box. Objects cut by a tile seam then get a box
+    that spans both halves.
+    Args:
+        arrays (DetectionArrays): Boxes, confidences and class ids.
+        iou_threshold (float): Detections overlapping a more confident one of
+            the same class by more than this are fused into it.
+    Returns:
+        DetectionArrays: One detection per group, most confident first, with
+        the confidence of the group's best detection.
+    """
+    if len(arrays[0]) < 2:
+        return arrays
+
+    (boxes, confs, labels), clusters = _greedy_clusters(arrays, iou_threshold)
+    heads, groups = np.unique(clusters, return_inverse=True)
+
+    weights = confs.astype(np.float64)
+    fused = np.zeros((len(heads), 4))
+    np.add.at(fused, groups, boxes * weights[:, None])
+    fused /= np.bincount(groups, weights=weights)[:, None]
+    return fused.astype(boxes.dtype), confs[heads], labels[heads]
+
+
+def _greedy_clusters(arrays: DetectionArrays, iou_threshold: float):
+    # Sort by confidence and assign every detection to the first (most
+    # confident) unassigned detection of its class that it overlaps
+    boxes, confs, labels = arrays
+    order = np.argsort(-confs, kind="stable")
+    boxes, confs, labels = boxes[order], confs[order], labels[order]
+
+    offsets = labels.astype(boxes.dtype)[:, None] * (boxes.max() + 1)
+    ious = box_iou(boxes + offsets, boxes + offsets)
+
+    clusters = np.full(len(boxes), -1)
+    for i in range(len(boxes)):
+        if clusters[i] < 0:
+            clusters[i] = i
+            members = np.flatnonzero((clusters[i + 1:] < 0) & (ious[i, i + 1:] > iou_threshold))
+            clusters[members + i + 1] = i
+    return (boxes, confs, labels), clusters
+
+
+def concat_arrays(*arrays_list: DetectionArrays) -> DetectionArrays:
+    """
+    Concatenate the detections of several images or regions.
+    """
+    boxes, confs, labels = zip(*arrays_list)
+    return np.concatenate(boxes), np.concatenate(confs), np.concatenate(labels)
@@ -2,16 +2,19 @@
 import random
 from PIL import Image
 import base64
+import binascii
 import gc
 import io
 import os
+import sys
 from typing import Optional, Dict, Tuple
 import cv2
-from PIL import Image, ImageOps, PngImagePlugin
+from PIL import Image, ImageOps, PngImagePlugin, UnidentifiedImageError
 from loguru import logger
 import numpy as np
 import requests
 import torch
+from app.core.config import FAST_IMAGE_DECODE, MODEL_INPUT_SIZE
 
 
 def torch_gc():
@@ -197,10 +200,59 @@ def compress_image_png(image_np, target_size_mb=1):
     return compressed_image_np
 
 
+# ultralytics replaces PIL.Image.open with a wrapper that, when opening fails,
+# installs and registers a HEIF plugin and retries. Uploads are opened with
+# PIL's own function, so that undecodable data fails fast as ImageDecodeError.
+_open_image = getattr(sys.modules.get("ultralytics.utils.patches"), "_image_open", Image.open)
+
+
+class ImageDecodeError(ValueError):
+    """
+    The uploaded data is not a decodable image: invalid base64, an unknown
+    format or corrupt image data. A client error, answered with 422.
+    """
+
+
+def decode_base64_to_bytes(encoding: str) -> bytes:
+    try:
+        data = memoryview(encoding.encode("ascii"))
+    except UnicodeEncodeError:
+        raise ImageDecodeError("Invalid base64: non-ASCII characters") from None
+
+    # Skip a data-URL header such as "data:image/jpeg;base64," by slicing the
+    # buffer instead of copying the payload. Base64 never contains a comma, so
+    # only the start of the string needs to be searched.
+    header_end = encoding.find(",", 0, 128)
+    if header_end != -1:
+        data = data[header_end + 1:]
+    try:
+        # Strict, so that garbage is rejected instead of silently dropped
+        return binascii.a2b_base64(data, strict_mode=True)
+    except binascii.Error as e:
+        raise ImageDecodeError(f"Invalid base64: {e}") from None
+
+
 def decode_base64_to_image(encoding: str, gray: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray], Dict]:
-    if encoding.startswith("data:image/") or encoding.startswith("data:application/octet-stream;base64,"):
-        encoding = encoding.split(";")[1].split(",")[1]
-    image = Image.open(io.BytesIO(base64.b64decode(encoding)))
+    return decode_bytes_to_image(decode_base64_to_bytes(encoding), gray=gray)
+
+
+def decode_bytes_to_image(image_bytes, gray: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray], Dict]:
+    try:
+        return _decode_bytes_to_image(image_bytes, gray)
+    except (OSError, SyntaxError, cv2.error) as e:
+        raise _image_decode_error(e) from None
+
+
+def _image_decode_error(error: Exception) -> ImageDecodeError:
+    # PIL reports an unknown format as UnidentifiedImageError, whose message
+    # holds the repr of the buffer, and corrupt data as OSError or SyntaxError
+    if isinstance(error, UnidentifiedImageError):
+        return ImageDecodeError("Cannot decode image: unknown or unsupported format")
+    return ImageDecodeError(f"Cannot decode image: {error}")
+
+
+def _decode_bytes_to_image(image_bytes, gray: bool) -> Tuple[np.ndarray, Optional[np.ndarray], Dict]:
+    image = _open_image(io.BytesIO(image_bytes))
 
     alpha_channel = None
     try:
@@ -224,6 +276,106 @@ def decode_base64_to_image(encoding: str, gray: bool = False) -> Tuple[np.ndarra
     return np_img, alpha_channel, infos
 
 
+# EXIF orientation tag and the OpenCV operation that undoes each orientation
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_ORIENTATION_OPS = {
+    2: lambda img: cv2.flip(img, 1),
+    3: lambda img: cv2.rotate(img, cv2.ROTATE_180),
+    4: lambda img: cv2.flip(img, 0),
+    5: lambda img: cv2.transpose(img),
+    6: lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
+    7: lambda img: cv2.flip(cv2.transpose(img), -1),
+    8: lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
+}
+
+# libjpeg-turbo can decode directly at 1/2, 1/4 and 1/8 scale in the DCT domain
+JPEG_REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+
+def decode_bytes_to_image_fast(image_bytes, target_size: int) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    Decode an image at roughly the model input size.
+
+    JPEGs are decoded by OpenCV at the largest DCT reduction (1/2, 1/4, 1/8) that
+    keeps the long side at or above `target_size`, and the EXIF orientation is
+    applied to the small image. Other formats fall back to `decode_bytes_to_image`.
+    Args:
+        image_bytes: The encoded image.
+        target_size (int): The model input size (long side) in pixels.
+    Returns:
+        Tuple[np.ndarray, Tuple[float, float]]: The RGB image and the (x, y) factors
+        that map coordinates in the decoded image back to the original resolution.
+    """
+    # Opening with PIL only parses the header, the pixels are not decoded here
+    try:
+        with _open_image(io.BytesIO(image_bytes)) as header:
+            image_format = header.format
+            width, height = header.size
+            orientation = header.getexif().get(EXIF_ORIENTATION_TAG, 1) \
+                if image_format in ("JPEG", "MPO") else 1
+    except (OSError, SyntaxError) as e:
+        raise _image_decode_error(e) from None
+
+    if image_format not in ("JPEG", "MPO"):
+        np_img, _, _ = decode_bytes_to_image(image_bytes)
+        return np_img, (1.0, 1.0)
+
+    reduction = next(factor for factor in JPEG_REDUCED_DECODE_FLAGS
+                     if factor == 1 or max(width, height) / factor >= target_size)
+    np_img = cv2.imdecode(
+        np.frombuffer(image_bytes, dtype=np.uint8),
+        JPEG_REDUCED_DECODE_FLAGS[reduction] | cv2.IMREAD_IGNORE_ORIENTATION)
+    if np_img is None:
+        np_img, _, _ = decode_bytes_to_image(image_bytes)
+        return np_img, (1.0, 1.0)
+
+    if orientation in EXIF_ORIENTATION_OPS:
+        np_img = EXIF_ORIENTATION_OPS[orientation](np_img)
+        if orientation >= 5:
+            width, height = height, width
+
+    # Keep the RGB channel order produced by the PIL decoder
+    np_img = cv2.cvtColor(np_img, cv2.COLOR_BGR2RGB, dst=np_img)
+
+    return np_img, (width / np_img.shape[1], height / np_img.shape[0])
+
+
+def decode_bytes_for_inference(image_bytes) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    Decode an image for the detectors, using the fast reduced-scale decoder when enabled.
+    Returns:
+        Tuple[np.ndarray, Tuple[float, float]]: The RGB image and the (x, y) factors
+        that map box coordinates back to the original resolution.
+    """
+    if FAST_IMAGE_DECODE:
+        return decode_bytes_to_image_fast(image_bytes, MODEL_INPUT_SIZE)
+
+    np_img, _, _ = decode_bytes_to_image(image_bytes)
+    return np_img, (1.0, 1.0)
+
+
+def resize_long_side(image: np.ndarray, size: int) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    Shrink an image so that its long side is at most `size` pixels.
+    Returns:
+        Tuple[np.ndarray, Tuple[float, float]]: The (possibly unchanged) image and the
+        (x, y) factors that map box coordinates back to the original resolution.
+    """
+    height, width = image.shape[:2]
+    factor = max(height, width) / size
+    if factor <= 1:
+        return image, (1.0, 1.0)
+
+    resized = cv2.resize(image, (round(width / factor), round(height / factor)),
+                         interpolation=cv2.INTER_AREA)
+    return resized, (width / resized.shape[1], height / resized.shape[0])
+
+
 def concat_alpha_channel(rgb_np_img: np.ndarray, alpha_channel: Optional[np.ndarray]) -> np.ndarray:
     if alpha_channel is not None:
         if alpha_channel.shape[:2] != rgb_np_img.shape[:2]:
@@ -0,0 +1,49 @@
+# testing/benchmarks/decode_benchmark.py
+# Compare the PIL decoder with the reduced-scale OpenCV decoder.
+#
+# Usage (from the repository root):
+#   python -m testing.benchmarks.decode_benchmark [--images testing/images] [--repeat 10]
+import argparse
+import glob
+import os
+import statistics
+import time
+from app.utils.helper import decode_bytes_to_image, decode_bytes_to_image_fast
+
+
+def time_decoder(decoder, image_bytes: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoder(image_bytes)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PIL and reduced-scale image decoders")
+    parser.add_argument("--images", default=os.path.join("testing", "images"))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--target-size", type=int, default=640)
+    args = parser.parse_args()
+
+    print(f"{'image':<28} {'original':>11} {'decoded':>11} {'PIL ms':>9} {'fast ms':>9} {'speedup':>8}")
+    for path in sorted(glob.glob(os.path.join(args.images, "*"))):
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+
+        original, _, _ = decode_bytes_to_image(image_bytes)
+        decoded, _ = decode_bytes_to_image_fast(image_bytes, args.target_size)
+
+        pil_ms = time_decoder(decode_bytes_to_image, image_bytes, args.repeat)
+        fast_ms = time_decoder(
+            lambda data: decode_bytes_to_image_fast(data, args.target_size), image_bytes, args.repeat)
+
+        print(f"{os.path.basename(path):<28} "
+              f"{original.shape[1]:>5}x{original.shape[0]:<5} "
+              f"{decoded.shape[1]:>5}x{decoded.shape[0]:<5} "
+              f"{pil_ms:>9.1f} {fast_ms:>9.1f} {pil_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
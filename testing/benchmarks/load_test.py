@@ -0,0 +1,208 @@
+# testing/benchmarks/load_test.py
+# Async HTTP load generator for the detection endpoints.
+#
+# Two modes:
+#   - closed loop (default): `--concurrency` clients send requests back to back,
+#     which measures the maximum throughput and the latency at that load.
+#   - open loop (`--rps N`): requests start on a fixed schedule whether or not
+#     earlier ones have finished, with at most `--concurrency` in flight.
+#     Latency is measured from the scheduled start, so time spent waiting for
+#     a free connection counts (no coordinated omission).
+#
+# Every request carries a few random bytes after the end of the image, which
+# decoders ignore but which change its hash, so the inference cache misses as
+# it would with distinct photos. Pass --allow-cache to resend identical images.
+#
+# 2xx and 404 (nothing detected) responses count as successful. 429 and 503
+# are reported separately: start the server with a high rate limit (e.g.
+# RATE_LIMIT_RATE=100000 RATE_LIMIT_BURST=100000) unless the limiter is what
+# you want to measure.
+#
+# Usage (from the repository root, with the API running):
+#   python -m testing.benchmarks.load_test --endpoint analyze --concurrency 16 --duration 30 \
+#       --output results.json [--baseline baseline.json]
+import argparse
+import asyncio
+import base64
+import collections
+import glob
+import os
+import sys
+import time
+import httpx
+from testing.benchmarks.results import compare_to_baseline, save_results, summarize
+
+ENDPOINTS = {
+    "license-plate-detector": "/api/v1/license-plate-detector",
+    "vehicle-detector": "/api/v1/vehicle-detector",
+    "vehicle-damage-detector": "/api/v1/vehicle-damage-detector",
+    "analyze": "/api/v1/analyze",
+}
+UPLOAD_MODES = ("json", "raw", "multipart")
+SUCCESS_STATUSES = {404}
+
+
+def load_images(images_dir: str) -> list:
+    paths = sorted(glob.glob(os.path.join(images_dir, "*.jp*g")) + glob.glob(os.path.join(images_dir, "*.png")))
+    if not paths:
+        raise SystemExit(f"No images found in {images_dir}")
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+class RequestFactory:
+    """
+    Build the keyword arguments of `httpx.AsyncClient.post`, cycling through the images.
+    """
+
+    def __init__(self, path: str, images: list, upload: str, origin: str, unique: bool):
+        self.path = path
+        self.upload = upload
+        self.origin = origin
+        self.unique = unique
+        # Pad to a multiple of 3 bytes so that the base64 of a suffix can be
+        # appended to the precomputed base64 of the image
+        self.images = [image + b"\0" * (-len(image) % 3) for image in images]
+        self.encoded = [base64.b64encode(image).decode() for image in self.images]
+        self._next = 0
+
+    def build(self) -> dict:
+        index = self._next % len(self.images)
+        self._next += 1
+        suffix = os.urandom(6) if self.unique else b""
+        if self.upload == "json":
+            image = self.encoded[index] + base64.b64encode(suffix).decode()
+            return {"url": self.path, "json": {"origin": self.origin, "image": image}}
+
+        image = self.images[index] + suffix
+        if self.upload == "raw":
+            return {"url": self.path, "params": {"origin": self.origin}, "content": image,
+                    "headers": {"Content-Type": "application/octet-stream"}}
+        return {"url": self.path, "data": {"origin": self.origin},
+                "files": {"image": ("image.jpg", image, "image/jpeg")}}
+
+
+class LoadRun:
+    def __init__(self, client: httpx.AsyncClient, requests: RequestFactory):
+        self.client = client
+        self.requests = requests
+        self.latencies = []
+        self.statuses = collections.Counter()
+
+    async def send(self, started: float, record: bool):
+        request = self.requests.build()
+        try:
+            response = await self.client.post(**request)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if record:
+            self.statuses[status] += 1
+            if isinstance(status, int) and (status < 300 or status in SUCCESS_STATUSES):
+                self.latencies.append(time.perf_counter() - started)
+
+    async def closed_loop(self, concurrency: int, duration: float, warmup: float):
+        record_from = time.perf_counter() + warmup
+        deadline = record_from + duration
+
+        async def client_loop():
+            while True:
+                started = time.perf_counter()
+                if started >= deadline:
+                    return
+                await self.send(started, started >= record_from)
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    async def open_loop(self, rps: float, concurrency: int, duration: float, warmup: float):
+        slots = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        tasks = []
+
+        async def scheduled(at: float, record: bool):
+            async with slots:
+                await self.send(at, record)
+
+        for i in range(int((warmup + duration) * rps)):
+            at = start + i / rps
+            delay = at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(scheduled(at, at - start >= warmup)))
+        await asyncio.gather(*tasks)
+
+
+async def run_endpoint(args, name: str, images: list) -> dict:
+    path = ENDPOINTS.get(name, name)
+    requests = RequestFactory(path, images, args.upload, args.origin, unique=not args.allow_cache)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        run = LoadRun(client, requests)
+        started = time.perf_counter()
+        if args.rps:
+            await run.open_loop(args.rps, args.concurrency, args.duration, args.warmup)
+        else:
+            await run.closed_loop(args.concurrency, args.duration, args.warmup)
+        elapsed = time.perf_counter() - started - args.warmup
+
+    summary = summarize(run.latencies)
+    summary["throughput_rps"] = len(run.latencies) / elapsed if elapsed > 0 else 0.0
+    summary["statuses"] = {str(status): count for status, count in sorted(run.statuses.items(), key=str)}
+    return summary
+
+
+def print_summary(name: str, summary: dict):
+    if not summary["count"]:
+        print(f"{name:<28} no successful requests, statuses: {summary['statuses']}")
+        return
+    print(f"{name:<28} {summary['count']:>7} {summary['throughput_rps']:>9.1f} "
+          f"{summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f}  "
+          f"{summary['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the detection endpoints")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", action="append",
+                        help=f"One of {', '.join(ENDPOINTS)} or a path; repeatable (default: all)")
+    parser.add_argument("--images", default=os.path.join("testing", "images"))
+    parser.add_argument("--upload", choices=UPLOAD_MODES, default="json")
+    parser.add_argument("--origin", default="load-test")
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="Resend identical images, so that repeats are inference cache hits")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=0, help="Open-loop request rate (0: closed loop)")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=3, help="Unrecorded seconds before measuring")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed regression against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    endpoints = args.endpoint or list(ENDPOINTS)
+    mode = f"{args.rps:g} rps" if args.rps else "closed loop"
+    print(f"{len(images)} images, {args.upload} upload, concurrency {args.concurrency}, {mode}, "
+          f"{args.duration:g}s per endpoint")
+    print(f"{'endpoint':<28} {'ok':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+
+    results = {}
+    for name in endpoints:
+        results[name] = asyncio.run(run_endpoint(args, name, images))
+        print_summary(name, results[name])
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    if args.output:
+        save_results(args.output, "load_test", config, results)
+    if args.baseline and not compare_to_baseline(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# testing/benchmarks/micro_benchmarks.py
+# Micro-benchmarks of the per-request CPU work around the model:
+#   - decode:       base64 -> image (decode_base64_to_image) and the
+#                   reduced-scale inference decode, per sample image
+#   - postprocess:  YOLO result -> arrays -> response content (default and
+#                   compact format) for a few detection counts
+#   - middleware:   the full ASGI middleware stack on a no-op endpoint
+#
+# No model is needed: postprocessing runs on synthetic ultralytics Results.
+#
+# Usage (from the repository root):
+#   python -m testing.benchmarks.micro_benchmarks [--output micro.json] [--baseline base.json]
+import argparse
+import asyncio
+import base64
+import glob
+import os
+import sys
+import time
+import numpy as np
+import orjson
+import torch
+from ultralytics.engine.results import Results
+from app.api.v1.license_plate_detector.utils import format_result, format_result_compact
+from app.core.logging import logger
+from app.utils.detections import result_to_arrays
+from app.utils.helper import decode_base64_to_image, decode_bytes_for_inference
+from testing.benchmarks.middleware_benchmark import build_app, time_requests
+from testing.benchmarks.results import compare_to_baseline, save_results, summarize
+
+DETECTION_COUNTS = (1, 10, 100)
+
+
+def time_calls(func, repeat: int) -> list:
+    func()  # warm up caches and lazy imports
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def synthetic_result(count: int, width: int = 1920, height: int = 1080) -> Results:
+    """
+    A YOLO result with `count` random detections of the plate model classes.
+    """
+    rng = np.random.default_rng(count)
+    xy = rng.uniform(0, [width - 100, height - 100], size=(count, 2))
+    wh = rng.uniform(20, 100, size=(count, 2))
+    boxes = np.concatenate([xy, xy + wh, rng.uniform(0.25, 1, (count, 1)),
+                            rng.integers(0, 2, (count, 1))], axis=1)
+    return Results(np.zeros((height, width, 3), dtype=np.uint8), path="", names={0: "Vehicle Plate", 1: "Vehicle"},
+                   boxes=torch.from_numpy(boxes.astype(np.float32)))
+
+
+def decode_cases(images_dir: str, repeat: int) -> dict:
+    results = {}
+    for path in sorted(glob.glob(os.path.join(images_dir, "*")))[:4]:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        encoded = base64.b64encode(image_bytes).decode()
+        name = os.path.basename(path)
+        results[f"decode_base64_to_image[{name}]"] = summarize(
+            time_calls(lambda: decode_base64_to_image(encoded), repeat))
+        results[f"decode_bytes_for_inference[{name}]"] = summarize(
+            time_calls(lambda: decode_bytes_for_inference(image_bytes), repeat))
+    return results
+
+
+def postprocess_cases(repeat: int) -> dict:
+    results = {}
+    for count in DETECTION_COUNTS:
+        result = synthetic_result(count)
+        results[f"postprocess_default[{count}]"] = summarize(
+            time_calls(lambda: format_result(result_to_arrays(result)), repeat * 10))
+        results[f"postprocess_compact[{count}]"] = summarize(time_calls(
+            lambda: orjson.dumps(format_result_compact(result_to_arrays(result), 2),
+                                 option=orjson.OPT_SERIALIZE_NUMPY), repeat * 10))
+    return results
+
+
+def middleware_cases(repeat: int) -> dict:
+    async def measure(stack: str) -> list:
+        app = build_app(stack)
+        await time_requests(app, min(1000, repeat))
+        return await time_requests(app, repeat * 100)
+
+    return {f"middleware[{stack}]": summarize(asyncio.run(measure(stack)))
+            for stack in ("none", "asgi")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of decoding, postprocessing and middleware")
+    parser.add_argument("--images", default=os.path.join("testing", "images"))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed regression against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    # Keep log formatting cost in the middleware numbers, without the output
+    logger.remove()
+    logger.add(lambda message: None, level="DEBUG")
+
+    results = {}
+    results.update(decode_cases(args.images, args.repeat))
+    results.update(postprocess_cases(args.repeat))
+    results.update(middleware_cases(args.repeat))
+
+    print(f"{'case':<56} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for case, summary in results.items():
+        print(f"{case:<56} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f}")
+
+    config = {"images": args.images, "repeat": args.repeat}
+    if args.output:
+        save_results(args.output, "micro_benchmarks", config, results)
+    if args.baseline and not compare_to_baseline(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
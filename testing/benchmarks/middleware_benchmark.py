@@ -0,0 +1,125 @@
+# testing/benchmarks/middleware_benchmark.py
+# Per-request overhead of the middleware stack on a no-op endpoint.
+#
+# Requests are driven straight through the ASGI interface (no sockets), so the
+# numbers isolate the middleware cost. Three stacks are compared:
+#   - none:      the bare app
+#   - basehttp:  the previous BaseHTTPMiddleware implementation (reference copy)
+#   - asgi:      the pure ASGI middleware from app.core.middleware
+#
+# Usage (from the repository root):
+#   python -m testing.benchmarks.middleware_benchmark [--requests 20000]
+import argparse
+import asyncio
+import math
+import statistics
+import time
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from app.core.logging import logger
+from app.core.middleware import setup_middleware
+from app.core.rate_limit import MemoryRateLimitStore, RateLimiter, RateLimitRule, request_origin
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, limiter: RateLimiter = None):
+        super().__init__(app)
+        self.limiter = limiter or RateLimiter()
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host if request.client else "unknown"
+        origin = request_origin(request.headers, request.scope.get("query_string", b""))
+
+        retry_after = self.limiter.check(client_ip, request.url.path, origin)
+        if retry_after:
+            logger.warning(f"Rate limit exceeded for IP: {client_ip} (origin: {origin})")
+            return JSONResponse({"detail": "Rate limit exceeded"}, status_code=429,
+                                headers={"Retry-After": str(math.ceil(retry_after))})
+
+        logger.info(f"Request allowed for IP: {client_ip} at time: {time.time()}")
+        return await call_next(request)
+
+
+class BaseHTTPSecurityHeaderMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        return response
+
+
+def unlimited() -> RateLimiter:
+    # Admit everything: the benchmark measures overhead, not rejections
+    return RateLimiter(MemoryRateLimitStore(), rules=[], default_rule=RateLimitRule(1e9, 1e9))
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/noop")
+    async def noop():
+        return {}
+
+    if stack == "basehttp":
+        app.add_middleware(CORSMiddleware, allow_methods=["*"], allow_headers=["*"],
+                           allow_origins=["*"], allow_credentials=True)
+        app.add_middleware(BaseHTTPRateLimitMiddleware, limiter=unlimited())
+        app.add_middleware(BaseHTTPSecurityHeaderMiddleware)
+    elif stack == "asgi":
+        setup_middleware(app, limiter=unlimited())
+    return app
+
+
+async def time_requests(app, count: int) -> list:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/noop", "raw_path": b"/noop",
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 12345), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await app(dict(scope), receive, send)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def run(count: int):
+    results = {}
+    for stack in ("none", "basehttp", "asgi"):
+        app = build_app(stack)
+        await time_requests(app, min(1000, count))  # warm up
+        timings = await time_requests(app, count)
+        results[stack] = (statistics.median(timings) * 1e6, statistics.mean(timings) * 1e6)
+
+    base_median = results["none"][0]
+    print(f"{'stack':<10} {'median us':>10} {'mean us':>10} {'overhead us':>12}")
+    for stack, (median, mean) in results.items():
+        print(f"{stack:<10} {median:>10.1f} {mean:>10.1f} {median - base_median:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-request middleware overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Keep formatting cost but do not flood the terminal
+    logger.remove()
+    logger.add(lambda message: None, level="DEBUG")
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# testing/benchmarks/quantization_report.py
+# Accuracy/latency report for the FP32 and INT8 model variants.
+#
+# Every variant is loaded in its own process so that the memory figures are not
+# polluted by the other variants. Accuracy is reported as mAP@0.5 against the
+# YOLO-format labels in --labels when given, otherwise against the FP32
+# predictions of the same backend (i.e. the drift introduced by quantization).
+#
+# Usage (from the repository root):
+#   python -m testing.benchmarks.quantization_report [--images testing/images]
+#       [--labels path/to/labels] [--backend onnx] [--mode dynamic --mode static]
+#       [--output quantization_report.json]
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+import cv2
+import numpy as np
+from app.core.config import LICENCE_PLATE_MODEL_PATH, MODEL_INPUT_SIZE, VEHICLE_DAMAGE_MODEL_PATH
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+MODELS = {
+    "licence_plate": LICENCE_PLATE_MODEL_PATH,
+    "vehicle_damage": VEHICLE_DAMAGE_MODEL_PATH,
+}
+# Low threshold for the evaluated predictions, as is usual for mAP
+EVAL_CONF = 0.001
+
+
+def measure_variant(backend_name: str, precision: str, quantization: str, weights_path: str,
+                    image_paths: list, repeat: int) -> dict:
+    """
+    Load one model variant and time it on every image. Runs in a child process.
+    """
+    from app.services.backends import get_backend
+    from app.utils.helper import decode_bytes_to_image
+
+    backend = get_backend(backend_name, precision=precision, quantization=quantization)
+    model = backend.load(weights_path, "cpu")
+    # Full-resolution RGB arrays, as the API passes them to the models
+    images = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            images.append(decode_bytes_to_image(f.read())[0])
+
+    # Warm up (graph compilation, allocator pools)
+    model.predict(images[0], conf=EVAL_CONF, imgsz=MODEL_INPUT_SIZE, verbose=False)
+
+    timings, predictions = [], []
+    for image in images:
+        for i in range(repeat):
+            start = time.perf_counter()
+            result = model.predict(image, conf=EVAL_CONF, imgsz=MODEL_INPUT_SIZE, verbose=False)[0]
+            timings.append(time.perf_counter() - start)
+        boxes = result.boxes
+        predictions.append({
+            "boxes": boxes.xyxy.cpu().numpy().tolist(),
+            "confs": boxes.conf.cpu().numpy().tolist(),
+            "labels": boxes.cls.cpu().numpy().astype(int).tolist(),
+        })
+
+    artifact = backend.artifact_path(weights_path)
+    return {
+        "variant": backend.variant,
+        "artifact": artifact,
+        "artifact_mb": artifact_size(artifact) / (1024 * 1024),
+        "latency_ms_median": statistics.median(timings) * 1000,
+        "latency_ms_p95": float(np.percentile(timings, 95)) * 1000,
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "names": {int(k): v for k, v in model.names.items()},
+        "predictions": predictions,
+    }
+
+
+def artifact_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def load_labels(labels_dir: str, image_path: str) -> dict:
+    """
+    Read YOLO-format labels (class cx cy w h, normalized) as pixel xyxy boxes.
+    """
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    label_path = os.path.join(labels_dir, stem + ".txt")
+    rows = np.loadtxt(label_path, ndmin=2) if os.path.exists(label_path) else np.zeros((0, 5))
+
+    height, width = cv2.imread(image_path, cv2.IMREAD_COLOR).shape[:2]
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return {"boxes": boxes.tolist(), "labels": rows[:, 0].astype(int).tolist()}
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def average_precision(predictions: list, references: list, class_id: int,
+                      iou_threshold: float = 0.5):
+    """
+    All-point interpolated AP for one class, or None if the class never occurs
+    in the references.
+    """
+    scores, matched, total = [], [], 0
+    for prediction, reference in zip(predictions, references):
+        ref_mask = np.asarray(reference["labels"], dtype=int) == class_id
+        ref_boxes = np.asarray(reference["boxes"], dtype=float).reshape(-1, 4)[ref_mask]
+        total += len(ref_boxes)
+
+        pred_mask = np.asarray(prediction["labels"], dtype=int) == class_id
+        pred_boxes = np.asarray(prediction["boxes"], dtype=float).reshape(-1, 4)[pred_mask]
+        pred_confs = np.asarray(prediction["confs"], dtype=float)[pred_mask]
+        order = np.argsort(-pred_confs)
+        pred_boxes, pred_confs = pred_boxes[order], pred_confs[order]
+
+        ious = box_iou(pred_boxes, ref_boxes) if len(ref_boxes) else np.zeros((len(pred_boxes), 0))
+        taken = np.zeros(len(ref_boxes), dtype=bool)
+        for i, conf in enumerate(pred_confs):
+            candidates = np.where(~taken & (ious[i] >= iou_threshold))[0] if ious.shape[1] else []
+            hit = len(candidates) > 0
+            if hit:
+                taken[candidates[np.argmax(ious[i, candidates])]] = True
+            scores.append(conf)
+            matched.append(hit)
+
+    if total == 0:
+        return None
+    order = np.argsort(-np.asarray(scores))
+    hits = np.asarray(matched, dtype=float)[order]
+    tp, fp = np.cumsum(hits), np.cumsum(1 - hits)
+    recall = np.concatenate([[0.0], tp / total, [1.0]])
+    precision = np.concatenate([[1.0], tp / np.maximum(tp + fp, 1e-9), [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+
+def mean_average_precision(predictions: list, references: list, class_ids) -> float:
+    aps = [average_precision(predictions, references, class_id) for class_id in class_ids]
+    aps = [ap for ap in aps if ap is not None]
+    return float(np.mean(aps)) if aps else float("nan")
+
+
+def pseudo_references(predictions: list, conf: float) -> list:
+    """
+    Confident FP32 predictions, used as ground truth when no labels are given.
+    """
+    references = []
+    for prediction in predictions:
+        keep = np.asarray(prediction["confs"], dtype=float) >= conf
+        references.append({
+            "boxes": np.asarray(prediction["boxes"], dtype=float).reshape(-1, 4)[keep].tolist(),
+            "labels": np.asarray(prediction["labels"], dtype=int)[keep].tolist(),
+        })
+    return references
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FP32 and INT8 model variants")
+    parser.add_argument("--images", default=os.path.join("testing", "images"))
+    parser.add_argument("--labels", help="Directory of YOLO-format .txt labels (optional)")
+    parser.add_argument("--backend", default="onnx", choices=("onnx", "openvino"))
+    parser.add_argument("--mode", action="append", choices=("dynamic", "static"),
+                        help="Quantization mode (repeatable, default: dynamic and static)")
+    parser.add_argument("--model", action="append", choices=sorted(MODELS),
+                        help="Model to report on (repeatable, default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--conf", type=float, default=0.25,
+                        help="Confidence threshold for FP32 pseudo ground truth")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    image_paths = sorted(path for path in glob.glob(os.path.join(args.images, "*"))
+                         if path.lower().endswith(IMAGE_EXTENSIONS))
+    modes = args.mode or ["dynamic", "static"]
+    if args.backend == "openvino":
+        # NNCF only does calibrated (static) quantization
+        modes = [mode for mode in modes if mode == "static"]
+
+    # A fresh interpreter per variant keeps the RSS figures independent
+    context = multiprocessing.get_context("spawn")
+    report = {}
+    for model_name in args.model or sorted(MODELS):
+        weights_path = MODELS[model_name]
+        variants = [("fp32", "static")] + [("int8", mode) for mode in modes]
+
+        measurements = []
+        for precision, quantization in variants:
+            with context.Pool(1) as pool:
+                measurements.append(pool.apply(measure_variant, (
+                    args.backend, precision, quantization, weights_path, image_paths, args.repeat)))
+
+        baseline = measurements[0]
+        if args.labels:
+            references = [load_labels(args.labels, path) for path in image_paths]
+        else:
+            references = pseudo_references(baseline["predictions"], args.conf)
+
+        for measurement in measurements:
+            measurement["map50"] = mean_average_precision(
+                measurement["predictions"], references, baseline["names"])
+            measurement["speedup"] = (baseline["latency_ms_median"]
+                                      / measurement["latency_ms_median"])
+        report[model_name] = measurements
+
+    reference_name = "labels" if args.labels else "FP32 predictions"
+    print(f"{len(image_paths)} images, mAP@0.5 against {reference_name}\n")
+    print(f"{'model':<16} {'variant':<20} {'size MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'speedup':>8} {'RSS MB':>8} {'mAP@0.5':>8}")
+    for model_name, measurements in report.items():
+        for m in measurements:
+            print(f"{model_name:<16} {m['variant']:<20} {m['artifact_mb']:>8.1f} "
+                  f"{m['latency_ms_median']:>8.1f} {m['latency_ms_p95']:>8.1f} "
+                  f"{m['speedup']:>7.2f}x {m['peak_rss_mb']:>8.0f} {m['map50']:>8.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "images": image_paths,
+                "reference": reference_name,
+                "models": {
+                    name: [{k: v for k, v in m.items() if k != "predictions"}
+                           for m in measurements]
+                    for name, measurements in report.items()
+                },
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
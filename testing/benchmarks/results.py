@@ -0,0 +1,79 @@
+# testing/benchmarks/results.py
+# Latency summaries, JSON result files and baseline comparison shared by the
+# load test and the micro-benchmarks.
+#
+# A result file looks like:
+#   {"benchmark": "load_test", "created": "...", "config": {...},
+#    "results": {"<case>": {"p50_ms": ..., "p95_ms": ..., "throughput_rps": ...}}}
+import datetime
+import json
+import platform
+import numpy as np
+
+# Metrics compared against the baseline, and whether higher is better
+COMPARED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "throughput_rps": True,
+}
+
+
+def summarize(latencies: list) -> dict:
+    """
+    Percentiles of a list of latencies in seconds, in milliseconds.
+    """
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def save_results(path: str, benchmark: str, config: dict, results: dict):
+    report = {
+        "benchmark": benchmark,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(),
+                 "processor": platform.processor()},
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def compare_to_baseline(results: dict, baseline_path: str, tolerance: float) -> bool:
+    """
+    Print the change of every compared metric against a stored result file.
+    Returns:
+        bool: False if any metric regressed by more than `tolerance` (a fraction).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    ok = True
+    print(f"\nCompared with {baseline_path} (tolerance {tolerance:.0%}):")
+    print(f"{'case':<40} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for case, metrics in results.items():
+        if case not in baseline:
+            print(f"{case:<40} (not in baseline)")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = baseline[case].get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            ok &= not regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{case:<40} {metric:<15} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+    return ok
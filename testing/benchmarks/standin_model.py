@@ -0,0 +1,101 @@
+# testing/benchmarks/standin_model.py
+# Build randomly initialized stand-ins for the two detectors.
+#
+# The benchmarks must not depend on the trained weights. The stand-ins have
+# the same architecture (YOLOv8n), input size and class names as the real
+# models, so load, batching, inference and serialization cost the same, and
+# the benchmarks run anywhere without a GPU or proprietary weights. Their
+# detections are meaningless.
+#
+# A freshly initialized network shrinks its activations layer after layer and
+# scores every anchor alike (either nothing or everything passes the
+# confidence threshold). Therefore the BatchNorm statistics are recalibrated
+# on sample images and the class bias is lowered, so that each image gives a
+# varying, realistic number of detections.
+#
+# Usage (from the repository root):
+#   python -m testing.benchmarks.standin_model --output-dir testing/benchmarks/models
+#   LICENCE_PLATE_MODEL_PATH=testing/benchmarks/models/licence_plate_standin.pt \
+#   VEHICLE_DAMAGE_MODEL_PATH=testing/benchmarks/models/vehicle_damage_standin.pt \
+#       uvicorn app.main:app
+import argparse
+import glob
+import os
+import cv2
+import numpy as np
+import torch
+from ultralytics.nn.tasks import DetectionModel
+from app.api.v1.license_plate_detector.utils import LABEL_MAPPING
+
+# Same ids and order as app/models/vehicle_damage_best.pt
+DAMAGE_LABELS = {
+    0: "damaged door",
+    1: "damaged bumper",
+    2: "damaged hood",
+}
+
+STANDINS = {
+    "licence_plate_standin.pt": LABEL_MAPPING,
+    "vehicle_damage_standin.pt": DAMAGE_LABELS,
+}
+
+
+def calibration_batch(images_dir: str, size: int, count: int = 16) -> torch.Tensor:
+    """
+    Up to `count` sample images as a normalized NCHW batch, or noise if there are none.
+    """
+    paths = sorted(glob.glob(os.path.join(images_dir, "*")))[:count]
+    images = [cv2.imread(path) for path in paths]
+    images = [cv2.resize(image, (size, size))[:, :, ::-1] for image in images if image is not None]
+    if not images:
+        return torch.rand(count, 3, size, size)
+    batch = np.ascontiguousarray(np.stack(images).transpose(0, 3, 1, 2))
+    return torch.from_numpy(batch).float() / 255
+
+
+def build_standin(names: dict, calibration: torch.Tensor, class_bias: float,
+                  seed: int) -> DetectionModel:
+    torch.manual_seed(seed)
+    model = DetectionModel("yolov8n.yaml", nc=len(names), verbose=False)
+
+    # Running statistics computed as a plain average over the calibration batch
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.momentum = None
+            module.reset_running_stats()
+    model.train()
+    with torch.no_grad():
+        model(calibration)
+
+    for branch in model.model[-1].cv3:
+        torch.nn.init.constant_(branch[-1].bias, class_bias)
+
+    model.eval()
+    model.names = dict(names)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build randomly initialized stand-in detectors")
+    parser.add_argument("--output-dir", default=os.path.join("testing", "benchmarks", "models"))
+    parser.add_argument("--images", default=os.path.join("testing", "images"),
+                        help="Images used to calibrate the BatchNorm statistics")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--class-bias", type=float, default=-4.0,
+                        help="Class logit bias: higher gives more detections per image")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    calibration = calibration_batch(args.images, args.imgsz)
+    for filename, names in STANDINS.items():
+        model = build_standin(names, calibration, args.class_bias, args.seed)
+        path = os.path.join(args.output_dir, filename)
+        # The checkpoint layout ultralytics expects from a trained model
+        torch.save({"model": model, "train_args": {"imgsz": args.imgsz}, "date": None,
+                    "version": "standin"}, path)
+        print(f"{path}: {len(names)} classes ({', '.join(names.values())})")
+
+
+if __name__ == "__main__":
+    main()
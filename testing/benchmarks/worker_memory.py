@@ -0,0 +1,124 @@
+# testing/benchmarks/worker_memory.py
+# Measure per-worker memory of a multi-worker deployment.
+#
+# Starts the API with N workers, either with plain `uvicorn --workers` (every
+# worker loads its own models) or with the preload-and-fork launcher, waits for
+# /ready, sends a few requests so that every worker has run inference, and then
+# reads /proc/<pid>/smaps_rollup for the server and all its workers.
+#
+# RSS counts shared pages in full for every process, so it overstates the real
+# footprint of forked workers; PSS splits shared pages between the processes
+# sharing them, and the PSS total is the memory the deployment actually uses.
+#
+# Usage (from the repository root, Linux only):
+#   python -m testing.benchmarks.worker_memory --mode uvicorn --workers 4
+#   python -m testing.benchmarks.worker_memory --mode preload --workers 4
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_smaps_rollup(pid: int) -> dict:
+    """
+    Memory counters of a process in MiB.
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in SMAPS_FIELDS:
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+def descendants(pid: int) -> list:
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children += [int(child) for child in f.read().split()]
+    return children + [grandchild for child in children for grandchild in descendants(child)]
+
+
+def wait_until_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/ready") as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        # Stay below the rate limit
+        time.sleep(1)
+    raise TimeoutError(f"{url} was not ready after {timeout}s")
+
+
+def send_requests(url: str, image_path: str, count: int):
+    with open(image_path, "rb") as f:
+        body = json.dumps({"image": base64.b64encode(f.read()).decode(), "origin": "benchmark"})
+    for _ in range(count):
+        request = urllib.request.Request(
+            f"{url}/api/v1/analyze", data=body.encode(),
+            headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request).read()
+        except urllib.error.HTTPError:
+            # 404 (nothing detected) still exercised the models
+            pass
+        time.sleep(0.6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure RSS/PSS per API worker")
+    parser.add_argument("--mode", choices=("uvicorn", "preload"), default="preload")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--image", default=os.path.join("testing", "images", "vehicle_001.jpg"))
+    parser.add_argument("--requests", type=int, default=0,
+                        help="Requests to send before measuring (default: 4 per worker)")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    if args.mode == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "app.main:app",
+                   "--port", str(args.port), "--workers", str(args.workers)]
+    else:
+        command = [sys.executable, "-m", "app.launcher",
+                   "--port", str(args.port), "--workers", str(args.workers)]
+
+    url = f"http://127.0.0.1:{args.port}"
+    start = time.monotonic()
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, args.timeout)
+        startup_seconds = time.monotonic() - start
+        send_requests(url, args.image, args.requests or 4 * args.workers)
+
+        processes = {"server": read_smaps_rollup(server.pid)}
+        for pid in descendants(server.pid):
+            try:
+                processes[f"worker {pid}"] = read_smaps_rollup(pid)
+            except FileNotFoundError:
+                pass
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(f"mode={args.mode} workers={args.workers} ready after {startup_seconds:.1f}s\n")
+    print(f"{'process':<16}" + "".join(f"{field:>15}" for field in SMAPS_FIELDS))
+    for name, values in processes.items():
+        print(f"{name:<16}" + "".join(f"{values.get(field, 0):>12.1f} MB" for field in SMAPS_FIELDS))
+    totals = {field: sum(v.get(field, 0) for v in processes.values()) for field in SMAPS_FIELDS}
+    print(f"{'total':<16}" + "".join(f"{totals[field]:>12.1f} MB" for field in SMAPS_FIELDS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# tests/test_batch.py
+import asyncio
+import base64
+import pytest
+from loguru import logger
+from app.api.v1.batch import BatchImage, _detect_item
+from app.services.inference_executor import inference_executor
+from app.utils.helper import decode_bytes_for_inference
+
+
+async def detect(image_bytes: bytes, precision):
+    # Decodes like the detectors, no model needed for malformed images
+    image, _ = await inference_executor.run(decode_bytes_for_inference, image_bytes)
+    return {"shape": list(image.shape)}
+
+
+@pytest.fixture
+def errors():
+    records = []
+    sink = logger.add(records.append, level="ERROR")
+    yield records
+    logger.remove(sink)
+
+
+@pytest.mark.parametrize("encoding", ["!!!", base64.b64encode(b"not an image").decode()])
+def test_malformed_item_is_a_client_error(encoding, errors):
+    item = BatchImage(id="front", image=encoding)
+    result = asyncio.run(_detect_item(item, detect, None, "test detection"))
+
+    assert result["id"] == "front"
+    assert result["status"] == 422
+    assert result["detail"].startswith(("Invalid base64", "Cannot decode image"))
+    assert errors == []
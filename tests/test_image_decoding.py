@@ -0,0 +1,34 @@
+# tests/test_image_decoding.py
+import base64
+import cv2
+import numpy as np
+import pytest
+from app.utils.helper import (
+    ImageDecodeError, decode_base64_to_bytes, decode_bytes_to_image, decode_bytes_to_image_fast)
+
+
+def jpeg_bytes() -> bytes:
+    ok, encoded = cv2.imencode(".jpg", np.full((64, 96, 3), 128, np.uint8))
+    return encoded.tobytes()
+
+
+def test_decode_base64_accepts_a_data_url():
+    image_bytes = jpeg_bytes()
+    encoding = "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode()
+    assert decode_base64_to_bytes(encoding) == image_bytes
+
+
+@pytest.mark.parametrize("encoding", ["!!!", "aGVsbG8=garbage", "aGVs bG8=", "ÿØÿ"])
+def test_decode_base64_rejects_malformed_data(encoding):
+    with pytest.raises(ImageDecodeError, match="Invalid base64"):
+        decode_base64_to_bytes(encoding)
+
+
+@pytest.mark.parametrize("decode", [
+    decode_bytes_to_image,
+    lambda image_bytes: decode_bytes_to_image_fast(image_bytes, 640),
+])
+@pytest.mark.parametrize("image_bytes", [b"", b"not an image", jpeg_bytes()[:40]])
+def test_undecodable_bytes_raise_image_decode_error(decode, image_bytes):
+    with pytest.raises(ImageDecodeError, match="Cannot decode image"):
+        decode(image_bytes)
@@ -0,0 +1,156 @@
+# tests/test_inference_cache.py
+import asyncio
+import numpy as np
+import pytest
+from app.services import inference_cache as inference_cache_module
+from app.services.inference_cache import ENTRY_OVERHEAD_BYTES, InferenceCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(inference_cache_module, "time", clock)
+    return clock
+
+
+def arrays(nbytes: int = 0):
+    return np.zeros(nbytes, np.uint8), np.zeros(0, np.float32), np.zeros(0, np.float32)
+
+
+def cache_of(entries: int = 8, max_bytes: int = 1 << 20, ttl: float = 60) -> InferenceCache:
+    return InferenceCache(max_entries=entries, max_mb=max_bytes / (1 << 20), ttl_seconds=ttl)
+
+
+def get(cache: InferenceCache, key: str, value=None, calls: list = None):
+    async def compute():
+        if calls is not None:
+            calls.append(key)
+        return value if value is not None else arrays()
+    return asyncio.run(cache.get_or_compute(key, compute))
+
+
+def test_make_cache_key_separates_models():
+    assert make_cache_key("digest", "plates") != make_cache_key("digest", "damage")
+
+
+def test_hit_returns_cached_arrays_read_only():
+    cache, calls = cache_of(), []
+    first = get(cache, "a", calls=calls)
+    second = get(cache, "a", calls=calls)
+
+    assert calls == ["a"]
+    assert second is first
+    assert not first[0].flags.writeable
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, calls = cache_of(entries=2), []
+    get(cache, "a", calls=calls)
+    get(cache, "b", calls=calls)
+    get(cache, "a", calls=calls)
+    get(cache, "c", calls=calls)
+
+    calls.clear()
+    get(cache, "a", calls=calls)
+    get(cache, "b", calls=calls)
+    assert calls == ["b"]
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_expired_entry_is_computed_again(clock):
+    cache, calls = cache_of(ttl=10), []
+    get(cache, "a", calls=calls)
+    clock.now += 9
+    get(cache, "a", calls=calls)
+    clock.now += 2
+    get(cache, "a", calls=calls)
+
+    assert calls == ["a", "a"]
+    assert cache.stats()["expirations"] == 1
+
+
+def test_memory_cap_evicts_oldest_entries():
+    # Room for two entries of 1000 bytes
+    cache, calls = cache_of(entries=100, max_bytes=2 * (1000 + ENTRY_OVERHEAD_BYTES)), []
+    for key in "abc":
+        get(cache, key, arrays(1000))
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= cache.max_bytes
+    get(cache, "a", calls=calls)
+    assert calls == ["a"]
+
+
+def test_entry_larger_than_the_cap_is_not_stored():
+    cache, calls = cache_of(max_bytes=1000), []
+    get(cache, "big", arrays(10_000), calls=calls)
+    get(cache, "big", arrays(10_000), calls=calls)
+
+    assert calls == ["big", "big"]
+    assert cache.stats()["entries"] == 0
+
+
+def test_concurrent_lookups_share_one_computation():
+    cache = cache_of()
+    calls = []
+    release = None
+
+    async def compute():
+        calls.append(1)
+        await release.wait()
+        return arrays()
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        waiters = [asyncio.ensure_future(cache.get_or_compute("a", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert cache.stats()["in_flight"] == 1
+        release.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_computation():
+    cache = cache_of()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return arrays()
+
+    async def main():
+        first = asyncio.ensure_future(cache.get_or_compute("a", compute))
+        second = asyncio.ensure_future(cache.get_or_compute("a", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_failed_computation_is_not_cached():
+    cache = cache_of()
+
+    async def fail():
+        raise RuntimeError("model failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute("a", fail))
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["in_flight"] == 0
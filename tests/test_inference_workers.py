@@ -0,0 +1,112 @@
+# tests/test_inference_workers.py
+import asyncio
+import os
+import signal
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import pytest
+from app.services.inference_workers import (
+    InferenceWorkerError, InferenceWorkerPool, InferenceWorkersUnavailableError, read_images)
+
+IMAGE = np.ones((4, 4, 3), np.uint8)
+
+
+def fake_worker_main(conn, index: int, threads: int, cores: list = None):
+    """
+    Worker speaking the protocol of `worker_main` without loading models:
+    a "sum" model returns the pixel sum of each image, a "hang" model never
+    answers.
+    """
+    conn.send(("ready",))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        kind, job_id, name, *args = message
+        if kind == "load":
+            conn.send(("result", job_id, {0: name}))
+            continue
+        segment_name, layout = args
+        segment = shared_memory.SharedMemory(name=segment_name)
+        images = read_images(segment.buf, layout)
+        if name == "hang":
+            time.sleep(60)
+        sums = [int(image.sum()) for image in images]
+        del images
+        segment.close()
+        conn.send(("result", job_id, (sums, {"forward": 0.0})))
+
+
+async def wait_until(condition, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.05)
+
+
+def test_killed_worker_fails_its_batches_and_is_restarted():
+    async def main():
+        pool = InferenceWorkerPool(size=1, threads=1, restart_seconds=0.05, pin_cores=False,
+                                   target=fake_worker_main)
+        await pool.start()
+        worker = pool.workers[0]
+        try:
+            assert await pool.predict("sum", [IMAGE, IMAGE]) == ([48, 48], {"forward": 0.0})
+
+            hanging = asyncio.ensure_future(pool.predict("hang", [IMAGE]))
+            await wait_until(lambda: worker.pending)
+            first_pid = worker.process.pid
+            os.kill(first_pid, signal.SIGKILL)
+            with pytest.raises(InferenceWorkerError):
+                await hanging
+
+            await wait_until(lambda: worker.ready)
+            assert worker.process.pid != first_pid
+            assert worker.restarts == 1
+            assert await pool.predict("sum", [IMAGE]) == ([48], {"forward": 0.0})
+        finally:
+            pool.shutdown()
+        return pool
+
+    pool = asyncio.run(main())
+    assert pool.workers[0].process is None
+    assert pool.buffers.stats()["segments"] == 0
+
+
+def test_predict_without_running_worker_fails():
+    async def main():
+        pool = InferenceWorkerPool(size=1, threads=1, pin_cores=False, target=fake_worker_main)
+        pool._loop = asyncio.get_running_loop()
+        with pytest.raises(InferenceWorkersUnavailableError) as unavailable:
+            await pool.predict("sum", [IMAGE])
+        assert unavailable.value.retry_after >= 1
+        return pool
+
+    pool = asyncio.run(main())
+    # The segment of the failed batch was handed back
+    assert pool.buffers.stats()["free"] == pool.buffers.stats()["segments"]
+    pool.buffers.close()
+
+
+def test_predict_while_restarting_asks_to_retry_after_the_restart():
+    async def main():
+        pool = InferenceWorkerPool(size=1, threads=1, restart_seconds=3, pin_cores=False,
+                                   target=fake_worker_main)
+        await pool.start()
+        worker = pool.workers[0]
+        try:
+            os.kill(worker.process.pid, signal.SIGKILL)
+            await wait_until(lambda: worker.process is None)
+            with pytest.raises(InferenceWorkersUnavailableError) as unavailable:
+                await pool.predict("sum", [IMAGE])
+            # The worker is started again 3s after it exited
+            assert 1 <= unavailable.value.retry_after <= 3
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
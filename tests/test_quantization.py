@@ -0,0 +1,49 @@
+# tests/test_quantization.py
+import cv2
+import numpy as np
+import torch
+from app.services.preprocessing import LetterboxBufferPool, letterbox_into, letterbox_shape, to_model_input
+from app.services.quantization import calibration_input
+from app.utils.helper import decode_bytes_for_inference
+
+SIZE = 640
+
+
+def write_photo(path) -> bytes:
+    # Landscape photo with a distinct value in each channel
+    image = np.zeros((480, 800, 3), np.uint8)
+    image[...] = (30, 120, 220)
+    ok, encoded = cv2.imencode(".jpg", image)
+    path.write_bytes(encoded.tobytes())
+    return encoded.tobytes()
+
+
+def pooled_input(image_bytes: bytes) -> np.ndarray:
+    # The CPU path of predict_pooled for a fixed input shape
+    image, _ = decode_bytes_for_inference(image_bytes)
+    gain, resized, _ = letterbox_shape(image.shape[:2], (SIZE, SIZE), stride=32)
+    with LetterboxBufferPool(max_buffers=1, max_batch_size=1).acquire(1, SIZE, SIZE, (SIZE, SIZE)) as buffers:
+        staging = buffers.staging_view(1, SIZE, SIZE)
+        letterbox_into(image, staging[0], gain, resized)
+        batch = to_model_input(torch.from_numpy(staging), buffers.input_view(1, SIZE, SIZE))
+        return batch.numpy().copy()
+
+
+def test_calibration_input_matches_the_served_input(tmp_path):
+    path = tmp_path / "photo.jpg"
+    image_bytes = write_photo(path)
+
+    calibration = calibration_input(str(path), SIZE)
+    assert calibration.shape == (1, 3, SIZE, SIZE)
+    assert calibration.dtype == np.float32
+    np.testing.assert_array_equal(calibration, pooled_input(image_bytes))
+
+
+def test_model_receives_the_decoded_channels_reversed(tmp_path):
+    path = tmp_path / "photo.jpg"
+    image_bytes = write_photo(path)
+    decoded, _ = decode_bytes_for_inference(image_bytes)
+
+    calibration = calibration_input(str(path), SIZE)
+    center = calibration[0, :, SIZE // 2, SIZE // 2] * 255
+    np.testing.assert_allclose(center, decoded[decoded.shape[0] // 2, decoded.shape[1] // 2, ::-1], atol=1)
@@ -0,0 +1,103 @@
+# tests/test_rate_limit.py
+import sqlite3
+import pytest
+from app.core import rate_limit as rate_limit_module
+from app.core.rate_limit import MemoryRateLimitStore, RateLimiter, RateLimitRule, SQLiteRateLimitStore
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return str(tmp_path / "buckets.sqlite3")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, sqlite_path):
+    if request.param == "memory":
+        return MemoryRateLimitStore()
+    return SQLiteRateLimitStore(path=sqlite_path)
+
+
+def test_burst_then_refill(store):
+    now = 100.0
+    assert store.consume("k", rate=2, burst=3, now=now) == 0
+    assert store.consume("k", rate=2, burst=3, now=now) == 0
+    assert store.consume("k", rate=2, burst=3, now=now) == 0
+    assert store.consume("k", rate=2, burst=3, now=now) == pytest.approx(0.5)
+
+    # Half a second refills one token
+    assert store.consume("k", rate=2, burst=3, now=now + 0.5) == 0
+    assert store.consume("k", rate=2, burst=3, now=now + 0.5) > 0
+
+
+def test_refill_is_capped_at_burst(store):
+    store.consume("k", rate=1, burst=2, now=0.0)
+    allowed = [store.consume("k", rate=1, burst=2, now=1000.0) == 0 for _ in range(3)]
+    assert allowed == [True, True, False]
+
+
+def test_buckets_are_independent(store):
+    assert store.consume("a", rate=1, burst=1, now=0.0) == 0
+    assert store.consume("a", rate=1, burst=1, now=0.0) > 0
+    assert store.consume("b", rate=1, burst=1, now=0.0) == 0
+
+
+def test_memory_store_is_bounded_by_max_keys():
+    store = MemoryRateLimitStore(max_keys=3, idle_seconds=1000)
+    for index in range(10):
+        store.consume(f"k{index}", rate=1, burst=1, now=float(index))
+    assert len(store) <= 3
+
+
+def test_memory_store_evicts_idle_buckets():
+    store = MemoryRateLimitStore(max_keys=100, idle_seconds=10)
+    store.consume("old", rate=1, burst=1, now=0.0)
+    store.consume("recent", rate=1, burst=1, now=15.0)
+    store.consume("new", rate=1, burst=1, now=20.0)
+    store.consume("new", rate=1, burst=1, now=20.0)
+    assert len(store) == 2
+
+
+def test_evicted_bucket_starts_full():
+    store = MemoryRateLimitStore(max_keys=1, idle_seconds=1000)
+    store.consume("a", rate=1, burst=1, now=0.0)
+    store.consume("b", rate=1, burst=1, now=0.0)
+    assert store.consume("a", rate=1, burst=1, now=0.0) == 0
+
+
+def test_sqlite_store_fails_open_when_locked(sqlite_path):
+    store = SQLiteRateLimitStore(path=sqlite_path, busy_ms=1)
+    store.consume("k", rate=1, burst=1, now=0.0)
+
+    other = sqlite3.connect(sqlite_path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        assert store.consume("k", rate=1, burst=1, now=0.0) == 0
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    assert store.consume("k", rate=1, burst=1, now=0.0) > 0
+
+
+def test_rules_pick_the_bucket():
+    limiter = RateLimiter(
+        store=MemoryRateLimitStore(),
+        rules=[{"rate": 1, "burst": 1, "origin": "mobile", "per": "origin"}],
+        default_rule=RateLimitRule(rate=100, burst=100))
+
+    assert limiter.check("1.1.1.1", "/api/v1/analyze", "mobile") == 0
+    # Same origin from another IP shares the origin's bucket
+    assert limiter.check("2.2.2.2", "/api/v1/analyze", "mobile") > 0
+    assert limiter.check("2.2.2.2", "/api/v1/analyze", "web") == 0
+
+
+def test_invalid_rule_is_rejected():
+    with pytest.raises(ValueError):
+        RateLimiter(store=MemoryRateLimitStore(), rules=[{"rate": 1, "burst": 1, "per": "user"}])
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 10), (-1, 10), (2, 0)])
+def test_invalid_default_rule_is_rejected(monkeypatch, rate, burst):
+    monkeypatch.setattr(rate_limit_module, "RATE_LIMIT_RATE", rate)
+    monkeypatch.setattr(rate_limit_module, "RATE_LIMIT_BURST", burst)
+    with pytest.raises(ValueError):
+        RateLimiter(store=MemoryRateLimitStore(), rules=[])
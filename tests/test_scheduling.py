@@ -0,0 +1,170 @@
+# tests/test_scheduling.py
+import asyncio
+import numpy as np
+import pytest
+from app.core.scheduling import DeadlineExceededError, RequestSchedule, set_request_schedule
+from app.services.inference_cache import InferenceCache
+from app.services.model_manager import BatchScheduler
+
+
+class GatedModel:
+    """
+    Fake model for the scheduler: returns empty detection arrays and records
+    the order images ran in. Batches wait for `gate`.
+    """
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.ran = []
+
+    def predict_batch(self, images):
+        self.ran.extend(images)
+        arrays = [(np.zeros((0, 4)), np.zeros(0), np.zeros(0)) for _ in images]
+        return arrays, {"preprocess": 0.001, "forward": 0.002, "postprocess": 0.003}
+
+    async def run(self, func, images):
+        await self.gate.wait()
+        return func(images)
+
+
+def scheduler_for(model: GatedModel) -> BatchScheduler:
+    # One image per batch, so the run order is the queue order
+    return BatchScheduler(model.predict_batch, max_batch_size=1, batch_window_ms=0,
+                          name="test", run=model.run)
+
+
+def schedule(priority: int = 0, deadline_ms: float = None) -> RequestSchedule:
+    request_schedule = RequestSchedule()
+    request_schedule.priority = priority
+    if deadline_ms is not None:
+        request_schedule.set_deadline_ms(deadline_ms)
+    return request_schedule
+
+
+async def submit(scheduler: BatchScheduler, image, request_schedule: RequestSchedule = None):
+    # Runs as its own task, so the schedule only applies to this request
+    set_request_schedule(request_schedule)
+    return await scheduler.submit(image)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_higher_priority_is_served_first():
+    async def main():
+        model = GatedModel()
+        scheduler = scheduler_for(model)
+        # Occupies the scheduler while the others queue
+        blocker = asyncio.ensure_future(submit(scheduler, "blocker"))
+        await settle()
+        low = [asyncio.ensure_future(submit(scheduler, f"low{i}", schedule(0))) for i in range(2)]
+        high = asyncio.ensure_future(submit(scheduler, "high", schedule(5)))
+        await settle()
+        model.gate.set()
+        await asyncio.gather(blocker, high, *low)
+        return model.ran
+
+    assert asyncio.run(main()) == ["blocker", "high", "low0", "low1"]
+
+
+def test_expired_request_is_rejected_on_submit():
+    async def main():
+        scheduler = scheduler_for(GatedModel())
+        expired = schedule(deadline_ms=1)
+        expired.deadline -= 1
+        with pytest.raises(DeadlineExceededError):
+            await submit(scheduler, "late", expired)
+        return scheduler.stats()
+
+    assert asyncio.run(main())["expired"] == 1
+
+
+def test_deadline_passing_in_the_queue_drops_the_image():
+    async def main():
+        model = GatedModel()
+        scheduler = scheduler_for(model)
+        blocker = asyncio.ensure_future(submit(scheduler, "blocker"))
+        await settle()
+        late = asyncio.ensure_future(submit(scheduler, "late", schedule(deadline_ms=20)))
+        await asyncio.sleep(0.05)
+        model.gate.set()
+        await blocker
+        with pytest.raises(DeadlineExceededError):
+            await late
+        return model.ran, scheduler.stats()
+
+    ran, stats = asyncio.run(main())
+    assert ran == ["blocker"]
+    assert stats["expired"] == 1
+
+
+def test_image_that_would_miss_its_deadline_is_shed():
+    async def main():
+        model = GatedModel()
+        model.gate.set()
+        scheduler = scheduler_for(model)
+        # Batches are known to take about 10 seconds
+        scheduler._batch_seconds = 10.0
+        with pytest.raises(DeadlineExceededError):
+            await submit(scheduler, "hopeless", schedule(deadline_ms=1000))
+        await submit(scheduler, "patient", schedule())
+        return model.ran, scheduler.stats()
+
+    ran, stats = asyncio.run(main())
+    assert ran == ["patient"]
+    assert stats["shed"] == 1
+
+
+def cached_submit(cache: InferenceCache, scheduler: BatchScheduler, request_schedule: RequestSchedule):
+    async def request():
+        set_request_schedule(request_schedule)
+        return await cache.get_or_compute("image", lambda: scheduler.submit("image"))
+    return asyncio.ensure_future(request())
+
+
+def test_shared_inference_is_not_dropped_at_the_first_waiters_deadline():
+    async def main():
+        model = GatedModel()
+        scheduler = scheduler_for(model)
+        cache = InferenceCache(max_entries=8, max_mb=1, ttl_seconds=60)
+        blocker = asyncio.ensure_future(submit(scheduler, "blocker"))
+        await settle()
+
+        # The first request has a short deadline, the second none
+        hurried = cached_submit(cache, scheduler, schedule(deadline_ms=20))
+        patient = cached_submit(cache, scheduler, schedule())
+        await asyncio.sleep(0.05)
+        model.gate.set()
+        await blocker
+
+        with pytest.raises(DeadlineExceededError):
+            await hurried
+        return await patient, model.ran, scheduler.stats()
+
+    result, ran, stats = asyncio.run(main())
+    assert len(result) == 3
+    assert ran == ["blocker", "image"]
+    assert stats["expired"] == stats["shed"] == 0
+
+
+def test_shared_inference_takes_the_highest_priority_of_its_waiters():
+    async def main():
+        model = GatedModel()
+        scheduler = scheduler_for(model)
+        cache = InferenceCache(max_entries=8, max_mb=1, ttl_seconds=60)
+        blocker = asyncio.ensure_future(submit(scheduler, "blocker"))
+        await settle()
+
+        earlier = asyncio.ensure_future(submit(scheduler, "earlier", schedule(1)))
+        shared_low = cached_submit(cache, scheduler, schedule(0))
+        await settle()
+        # Joins the queued shared inference and raises its priority above "earlier"
+        shared_high = cached_submit(cache, scheduler, schedule(5))
+        await settle()
+        model.gate.set()
+        await asyncio.gather(blocker, earlier, shared_low, shared_high)
+        return model.ran
+
+    assert asyncio.run(main()) == ["blocker", "image", "earlier"]